@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BlastLocal(AppConfig):
     name = 'blast_local'
+
+    def ready(self):
+        from . import signals  # noqa
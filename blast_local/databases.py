@@ -0,0 +1,144 @@
+"""BLAST databases of each gene, kept up to date in the background.
+
+Saving or deleting a sequence marks the database of its gene as dirty (see
+``BlastDatabase``) and schedules ``rebuild_blast_databases``, which rebuilds
+only the dirty genes. Local blasts use the database as it is, and build it
+only if it does not exist yet.
+
+Bulk updates of sequences do not send signals. Use
+``mark_all_dirty`` after them, or the periodic rebuild will not see them.
+"""
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from subprocess import CalledProcessError
+from typing import List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from core.utils import BLAST
+from public_interface.models import Genes
+from .models import BlastDatabase
+
+
+log = logging.getLogger(__name__)
+
+
+BUILD_LOCK_TIMEOUT = 10 * 60
+REBUILD_SCHEDULED_KEY = 'blast_local:rebuild_scheduled'
+
+
+def get_build_lock_key(gene_code) -> str:
+    return f'blast_local:build:{gene_code}'
+
+
+@contextmanager
+def build_lock(gene_code, wait=0):
+    """Lock to build the database of one gene. Yields whether it was acquired.
+
+    ``cache.add`` is atomic in Redis, so only one web or celery process
+    builds a database at a time.
+    """
+    lock_key = get_build_lock_key(gene_code)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    acquired = cache.add(lock_key, token, BUILD_LOCK_TIMEOUT)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.1)
+        acquired = cache.add(lock_key, token, BUILD_LOCK_TIMEOUT)
+
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def mark_dirty(gene_id) -> None:
+    BlastDatabase.objects.mark_dirty(gene_id)
+    transaction.on_commit(schedule_rebuild)
+
+
+def mark_all_dirty() -> None:
+    for gene_id in Genes.objects.values_list('id', flat=True):
+        BlastDatabase.objects.mark_dirty(gene_id)
+    transaction.on_commit(schedule_rebuild)
+
+
+def schedule_rebuild() -> None:
+    """Schedules one rebuild for the edits of the next
+    ``settings.BLAST_DB_REBUILD_DELAY`` seconds.
+    """
+    delay = settings.BLAST_DB_REBUILD_DELAY
+    if cache.add(REBUILD_SCHEDULED_KEY, True, delay):
+        from .tasks import rebuild_blast_databases
+        try:
+            rebuild_blast_databases.apply_async(countdown=delay)
+        except OperationalError:
+            # eg. when importing sequences without celery running
+            log.warning("could not schedule the rebuild of blast databases, "
+                        "they will be rebuilt by the periodic task")
+
+
+def build_database(gene_code, wait=0, if_missing=False) -> bool:
+    """Writes the sequences of a gene to disk and runs makeblastdb.
+
+    Returns False if the database was being built by somebody else. With
+    ``if_missing``, a database built while waiting for the lock is kept.
+    """
+    gene = Genes.objects.get(gene_code=gene_code)
+    database, _ = BlastDatabase.objects.get_or_create(gene=gene)
+
+    with build_lock(gene_code, wait=wait) as acquired:
+        if not acquired:
+            log.info("blast database of %s is already being built", gene_code)
+            return False
+
+        blast = BLAST('local', None, gene_code)
+        if if_missing and blast.have_blast_db():
+            return True
+
+        # edits from now on mark the database dirty again
+        version = BlastDatabase.objects.filter(id=database.id).values_list(
+            'version', flat=True,
+        ).get()
+        blast.save_seqs_to_file()
+        try:
+            blast.create_blast_db()
+        except CalledProcessError:
+            log.warning("there are no sequences for gene %s", gene_code)
+
+        BlastDatabase.objects.filter(id=database.id).update(
+            built_version=version, time_built=timezone.now(),
+        )
+    log.debug("built blast database of %s at version %s", gene_code, version)
+    return True
+
+
+def rebuild_dirty_databases() -> List[str]:
+    """Rebuilds the databases of genes with edited sequences.
+
+    Returns the gene codes rebuilt.
+    """
+    gene_codes = list(
+        BlastDatabase.objects.dirty().order_by('gene__gene_code').values_list(
+            'gene__gene_code', flat=True,
+        )
+    )
+    return [gene_code for gene_code in gene_codes if build_database(gene_code)]
+
+
+def get_blast(voucher_code, gene_code) -> BLAST:
+    """Local BLAST of a voucher against the database of its gene.
+
+    The database is built now only if there is none yet.
+    """
+    blast = BLAST('local', voucher_code, gene_code)
+    if not blast.have_blast_db():
+        build_database(gene_code, wait=BUILD_LOCK_TIMEOUT, if_missing=True)
+    return blast
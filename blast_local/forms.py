@@ -0,0 +1,35 @@
+from django import forms
+
+from public_interface.models import Genes, TaxonSets
+
+
+class BatchBlastForm(forms.Form):
+    taxonset = forms.ModelChoiceField(
+        TaxonSets.objects.all(),
+        label='Choose taxonset',
+        required=False,
+        empty_label='Choose taxonset',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    voucher_codes = forms.CharField(
+        widget=forms.Textarea,
+        label='... and/or a list of voucher codes',
+        required=False,
+    )
+    gene_code = forms.ModelChoiceField(
+        Genes.objects.all().order_by('gene_code'),
+        label='Gene',
+        required=True,
+        to_field_name='gene_code',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+    def clean(self):
+        cleaned_data = super(BatchBlastForm, self).clean()
+        taxonset = cleaned_data.get("taxonset")
+        voucher_codes = cleaned_data.get("voucher_codes")
+
+        if taxonset is None and not voucher_codes.strip():
+            raise forms.ValidationError("You need to enter at least some "
+                                        "voucher codes or select a taxonset.")
+        return cleaned_data
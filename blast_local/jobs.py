@@ -0,0 +1,192 @@
+"""BLAST runs as celery jobs, instead of in the web request.
+
+Views call ``schedule_blast``, which creates a ``BlastJob`` and runs
+``run_blast_job`` in a celery task, and send the user to the page of the
+job. That page polls the status of the job until its results are saved.
+
+An identical request (same blast type, parameters and query sequence) gets
+the job already made if it is still running, or if it is finished and the
+BLAST database it searched has not changed since. Results from NCBI are
+reused for ``settings.BLAST_NCBI_RESULTS_MAX_AGE`` seconds.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from celery import uuid
+from django.conf import settings
+from django.utils import timezone
+
+from blast_local_full.utils import BLASTFull
+from blast_ncbi.utils import BLASTNcbi
+from blast_new.utils import BLASTNew
+from core import exceptions
+from core.utils import BLAST
+from public_interface.models import Genes, Sequences
+from .databases import get_blast
+from .models import BlastJob
+from .utils import BLASTBatch
+
+
+log = logging.getLogger(__name__)
+
+
+# longer than the time limit of the run_blast task
+IN_FLIGHT_TIMEOUT = 2 * 60 * 60
+
+NO_VALID_QUERY = "Query sequence has no valid codons, only question marks"
+
+
+def get_query_sequence(blast_type, parameters):
+    if blast_type == 'new':
+        return parameters['sequence']
+    if blast_type == 'batch':
+        blast = make_blast(blast_type, parameters)
+        return blast.get_query_sequences()
+    sequence = Sequences.objects.filter(
+        code_id=parameters['voucher_code'], gene__gene_code=parameters['gene_code'],
+    ).values_list('sequences', flat=True).first()
+    return sequence or ''
+
+
+def make_query_key(blast_type, parameters) -> str:
+    """Hash of what is blasted. The query sequences are part of it, so that
+    editing the sequence of a voucher gives a new blast.
+    """
+    data = {
+        'blast_type': blast_type,
+        'parameters': parameters,
+        'sequence': get_query_sequence(blast_type, parameters),
+    }
+    encoded = json.dumps(data, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def make_blast(blast_type, parameters) -> BLAST:
+    if blast_type == 'local':
+        return BLAST('local', parameters['voucher_code'], parameters['gene_code'])
+    elif blast_type == 'full':
+        return BLASTFull('full', parameters['voucher_code'], parameters['gene_code'])
+    elif blast_type == 'remote':
+        return BLASTNcbi('remote', parameters['voucher_code'], parameters['gene_code'])
+    elif blast_type == 'new':
+        return BLASTNew(
+            blast_type='new',
+            name=parameters['name'],
+            sequence=parameters['sequence'],
+            gene_codes=Genes.objects.filter(gene_code__in=parameters['gene_codes']),
+        )
+    elif blast_type == 'batch':
+        return BLASTBatch(parameters['voucher_codes'], parameters['gene_code'])
+    raise ValueError(f'unknown blast type {blast_type}')
+
+
+def is_reusable(job: BlastJob) -> bool:
+    now = timezone.now()
+    if not job.is_finished():
+        return job.created > now - timedelta(seconds=IN_FLIGHT_TIMEOUT)
+    if job.error:
+        return False
+    if job.blast_type == 'remote':
+        max_age = timedelta(seconds=settings.BLAST_NCBI_RESULTS_MAX_AGE)
+        return job.completed > now - max_age
+    blast = make_blast(job.blast_type, job.parameters)
+    return job.database_manifest == blast.make_manifest()
+
+
+def find_reusable_job(query_key) -> Optional[BlastJob]:
+    job = BlastJob.objects.filter(query_key=query_key).order_by('-created').first()
+    if job and is_reusable(job):
+        return job
+    return None
+
+
+def schedule_blast(blast_type, parameters: Dict[str, Any], user) -> BlastJob:
+    """Returns the job of an identical blast, or queues a new one."""
+    query_key = make_query_key(blast_type, parameters)
+    job = find_reusable_job(query_key)
+    if job:
+        log.debug("reusing blast job %s", job.id)
+        return job
+
+    from .tasks import run_blast
+
+    task_id = uuid()
+    job = BlastJob.objects.create(
+        user=user,
+        blast_type=blast_type,
+        parameters=parameters,
+        query_key=query_key,
+        task_uuid=task_id,
+    )
+    run_blast.apply_async((job.id,), task_id=task_id)
+    return job
+
+
+def set_status(job: BlastJob, status) -> None:
+    job.status = status
+    BlastJob.objects.filter(id=job.id).update(status=status)
+
+
+def update_blast_db(job: BlastJob, blast: BLAST) -> None:
+    """Databases of one gene are kept up to date by ``databases``, the
+    others are rebuilt here when their sequences changed.
+    """
+    if job.blast_type in ('local', 'batch'):
+        if not blast.have_blast_db():
+            set_status(job, 'building database')
+            get_blast(blast.voucher_code, blast.gene_code)
+    elif not blast.is_blast_db_up_to_date():
+        set_status(job, 'building database')
+        blast.save_seqs_to_file()
+        blast.create_blast_db()
+
+
+def save_query(blast: BLAST) -> bool:
+    """Whether the query sequence had something to blast."""
+    saved = blast.save_query_to_file()
+    if saved is None:
+        # BLASTNew does not tell
+        saved = os.path.isfile(blast.query_file)
+    return saved
+
+
+def do_blast(job: BlastJob) -> List[Dict[str, Any]]:
+    blast = make_blast(job.blast_type, job.parameters)
+    if job.blast_type != 'remote':
+        update_blast_db(job, blast)
+        job.database_manifest = blast.read_manifest()
+
+    if not save_query(blast):
+        raise exceptions.InvalidBlastQuery(NO_VALID_QUERY)
+
+    set_status(job, 'blasting')
+    try:
+        blast.do_blast()
+        return blast.parse_blast_output()
+    finally:
+        blast.delete_query_output_files()
+
+
+def run_blast_job(job_id) -> None:
+    """Runs the blast of a job and saves its results or error."""
+    job = BlastJob.objects.get(id=job_id)
+    try:
+        job.results = do_blast(job)
+    except exceptions.InvalidBlastQuery as e:
+        job.error = str(e)
+        job.status = 'failed'
+    except Exception:
+        BlastJob.objects.filter(id=job.id).update(
+            status='failed',
+            error='BLAST could not be run',
+            completed=timezone.now(),
+        )
+        raise
+    else:
+        job.status = 'done'
+    job.completed = timezone.now()
+    job.save()
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('public_interface', '0007_alter_sequences_genbank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlastDatabase',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('built_version', models.PositiveIntegerField(default=0)),
+                ('time_built', models.DateTimeField(blank=True, null=True)),
+                ('gene', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='blast_database', to='public_interface.genes')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 19:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blast_local', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlastJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blast_type', models.CharField(choices=[('local', 'local'), ('full', 'full'), ('new', 'new'), ('remote', 'remote')], max_length=10)),
+                ('parameters', models.JSONField(default=dict)),
+                ('query_key', models.CharField(db_index=True, max_length=64)),
+                ('task_uuid', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(default='queued', max_length=20)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('completed', models.DateTimeField(blank=True, null=True)),
+                ('results', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('database_manifest', models.JSONField(blank=True, null=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
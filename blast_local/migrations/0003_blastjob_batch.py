@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blast_local', '0002_blastjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blastjob',
+            name='blast_type',
+            field=models.CharField(choices=[('local', 'local'), ('full', 'full'), ('new', 'new'), ('remote', 'remote'), ('batch', 'batch')], max_length=10),
+        ),
+    ]
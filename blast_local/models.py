@@ -0,0 +1,78 @@
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import F, JSONField
+
+from public_interface.models import Genes
+
+
+class BlastDatabaseManager(models.Manager):
+    def mark_dirty(self, gene_id) -> None:
+        """Records that the sequences of a gene changed since its database
+        was built.
+        """
+        updated = self.filter(gene_id=gene_id).update(version=F('version') + 1)
+        if not updated:
+            # new rows have version 1 and are built at version 0
+            self.get_or_create(gene_id=gene_id)
+
+    def dirty(self):
+        return self.filter(version__gt=F('built_version'))
+
+
+class BlastDatabase(models.Model):
+    """BLAST database of the sequences of one gene.
+
+    ``version`` goes up each time sequences of the gene are saved or
+    deleted. The database is up to date while ``built_version`` equals it.
+    """
+    gene = models.OneToOneField(Genes, on_delete=models.CASCADE, related_name='blast_database')
+    version = models.PositiveIntegerField(default=1)
+    built_version = models.PositiveIntegerField(default=0)
+    time_built = models.DateTimeField(null=True, blank=True)
+
+    objects = BlastDatabaseManager()
+
+    class Meta:
+        app_label = 'blast_local'
+
+    def is_dirty(self) -> bool:
+        return self.version > self.built_version
+
+
+class BlastJob(models.Model):
+    """BLAST run in a celery task, see ``blast_local.jobs``.
+
+    Finished jobs are shown again to identical requests (same ``query_key``)
+    while the BLAST database they searched has not changed.
+    """
+    BLAST_TYPES = (
+        ('local', 'local'),
+        ('full', 'full'),
+        ('new', 'new'),
+        ('remote', 'remote'),
+        ('batch', 'batch'),
+    )
+
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    blast_type = models.CharField(max_length=10, choices=BLAST_TYPES)
+    # voucher_code and gene_code, name, sequence and gene_codes for new blasts,
+    # or voucher_codes and gene_code for batch blasts
+    parameters = JSONField(default=dict)
+    # hash of the blast type, parameters and query sequence
+    query_key = models.CharField(max_length=64, db_index=True)
+    task_uuid = models.TextField(null=True, blank=True)
+    status = models.CharField(max_length=20, default='queued')
+    created = models.DateTimeField(auto_now_add=True)
+    completed = models.DateTimeField(null=True, blank=True)
+    # list of hits, as returned by BLAST.parse_blast_output, or hits grouped
+    # by voucher for batch blasts
+    results = JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # manifest of the blast database searched, see BLAST.make_manifest
+    database_manifest = JSONField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'blast_local'
+
+    def is_finished(self) -> bool:
+        return self.completed is not None
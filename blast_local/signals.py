@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from public_interface.models import Sequences
+from .databases import mark_dirty
+
+
+@receiver(post_save, sender=Sequences, dispatch_uid='blast_local_sequence_saved')
+@receiver(post_delete, sender=Sequences, dispatch_uid='blast_local_sequence_deleted')
+def mark_blast_database_dirty(sender, instance, **kwargs):
+    if instance.gene_id is not None:
+        mark_dirty(instance.gene_id)
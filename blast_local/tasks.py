@@ -0,0 +1,22 @@
+import logging
+
+from voseq.celery import app
+from .databases import rebuild_dirty_databases
+from .jobs import run_blast_job
+
+
+log = logging.getLogger(__name__)
+
+
+@app.task
+def rebuild_blast_databases():
+    """Rebuilds the BLAST databases of genes with edited sequences."""
+    gene_codes = rebuild_dirty_databases()
+    log.info("rebuilt blast databases of %s", gene_codes)
+    return gene_codes
+
+
+@app.task(time_limit=3600, soft_time_limit=3550)
+def run_blast(blast_job_id):
+    """Runs a blast job, see ``blast_local.jobs``."""
+    run_blast_job(blast_job_id)
@@ -0,0 +1,176 @@
+import glob
+import os
+from unittest.mock import patch
+
+from Bio import SeqIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.client import Client
+
+from blast_local.jobs import run_blast_job, schedule_blast
+from blast_local.models import BlastJob
+from blast_local.utils import REPORT_FIELDS, BLASTBatch
+from core.utils import BLAST
+from public_interface.models import Sequences
+
+
+TABULAR_OUTPUT = (
+    '# BLASTN 2.12.0+\n'
+    'CP100-10|COI-begin\tgnl|BL_ORD_ID|1\t1000\t900.0\t0.0\t600\t600\t590\tCP100-11|COI-begin\n'
+    'CP100-10|COI-begin\tgnl|BL_ORD_ID|2\t500\t450.0\t1e-50\t600\t300\t280\tCP100-12|COI-begin\n'
+    'CP100-11|COI-begin\tgnl|BL_ORD_ID|0\t1000\t900.0\t0.0\t600\t600\t590\tCP100-10|COI-begin\n'
+    # not significant
+    'CP100-11|COI-begin\tgnl|BL_ORD_ID|2\t10\t9.0\t1.0\t600\t20\t18\tCP100-12|COI-begin\n'
+)
+
+
+def write_output(blast):
+    with open(blast.output_file, 'w') as handle:
+        handle.write(TABULAR_OUTPUT)
+
+
+class BLASTBatchTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.voucher_codes = ['CP100-10', 'CP100-11', 'CP100-12', 'CP100-99']
+        self.blast = BLASTBatch(self.voucher_codes, 'COI-begin')
+
+    def tearDown(self):
+        self.blast.delete_query_output_files()
+
+    def test_save_query_to_file(self):
+        Sequences.objects.filter(code_id='CP100-12', gene__gene_code='COI-begin').update(
+            sequences='???',
+        )
+        self.assertTrue(self.blast.save_query_to_file())
+        ids = [record.id for record in SeqIO.parse(self.blast.query_file, 'fasta')]
+        self.assertEqual(['CP100-10|COI-begin', 'CP100-11|COI-begin'], ids)
+        self.assertEqual(['CP100-12', 'CP100-99'], self.blast.skipped)
+
+    def test_save_query_to_file__no_sequences(self):
+        blast = BLASTBatch(['CP100-99'], 'COI-begin')
+        self.assertFalse(blast.save_query_to_file())
+        self.assertEqual(['CP100-99'], blast.skipped)
+
+    def test_parse_blast_output(self):
+        self.blast.save_query_to_file()
+        write_output(self.blast)
+        result = self.blast.parse_blast_output()
+        self.assertEqual(self.voucher_codes, [query['voucher_code'] for query in result])
+        self.assertEqual(
+            ['CP100-11', 'CP100-12'], [hit['voucher_code'] for hit in result[0]['hits']],
+        )
+        self.assertEqual(1, len(result[1]['hits']))
+        self.assertEqual(98.3, result[1]['hits'][0]['ident'])
+        self.assertEqual([], result[3]['hits'])
+        self.assertTrue(result[3]['skipped'])
+        self.assertFalse(result[0]['skipped'])
+
+    @patch('core.utils.NcbiblastnCommandline')
+    def test_do_blast__threads(self, mock_cline):
+        with self.settings(BLAST_NUM_THREADS=8):
+            self.blast.do_blast()
+        self.assertEqual(8, mock_cline.call_args.kwargs['num_threads'])
+        mock_cline.return_value.assert_called_once_with()
+
+
+class BatchBlastJobTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.user = User.objects.get(username='admin')
+        self.user.set_password('pass')
+        self.user.save()
+        self.c = Client()
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+
+        self.parameters = {
+            'voucher_codes': ['CP100-10', 'CP100-11', 'CP100-99'], 'gene_code': 'COI-begin',
+        }
+        patcher = patch('blast_local.tasks.run_blast.apply_async')
+        self.mock_apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for file in glob.glob(os.path.join(settings.MEDIA_ROOT, 'db', 'COI-begin_seqs.fas*')):
+            os.remove(file)
+
+    def run_job(self):
+        # as if the database had been built
+        blast = BLAST('local', None, 'COI-begin')
+        blast.save_seqs_to_file()
+        blast.save_manifest()
+
+        job = schedule_blast('batch', self.parameters, self.user)
+        with patch.object(BLAST, 'have_blast_db', return_value=True), \
+                patch.object(BLASTBatch, 'do_blast', autospec=True, side_effect=write_output):
+            run_blast_job(job.id)
+        job.refresh_from_db()
+        return job
+
+    def test_run_blast_job(self):
+        job = self.run_job()
+        self.assertEqual('done', job.status)
+        self.assertEqual(3, len(job.results))
+        self.assertEqual(2, len(job.results[0]['hits']))
+        self.assertTrue(job.results[2]['skipped'])
+        self.assertIsNotNone(job.database_manifest)
+        self.assertEqual(job, schedule_blast('batch', self.parameters, self.user))
+
+    def test_run_blast_job__edited_query(self):
+        job = self.run_job()
+        sequence = Sequences.objects.get(code_id='CP100-11', gene__gene_code='COI-begin')
+        sequence.sequences = 'ACGT' + sequence.sequences
+        sequence.save()
+        self.assertNotEqual(job, schedule_blast('batch', self.parameters, self.user))
+
+    def test_batch(self):
+        res = self.c.post('/blast_local/batch/', {
+            'voucher_codes': 'CP100-11\r\nCP100-10\r\n--CP100-10',
+            'gene_code': 'COI-begin',
+        })
+        job = BlastJob.objects.get()
+        self.assertRedirects(res, f'/blast_local/job/{job.id}/', fetch_redirect_response=False)
+        self.assertEqual('batch', job.blast_type)
+        self.assertEqual({'voucher_codes': ['CP100-11'], 'gene_code': 'COI-begin'},
+                         job.parameters)
+
+    def test_batch__invalid(self):
+        res = self.c.post('/blast_local/batch/', {'voucher_codes': '', 'gene_code': 'COI-begin'})
+        self.assertContains(res, 'You need to enter at least some voucher codes')
+        self.assertFalse(BlastJob.objects.exists())
+
+    def test_job(self):
+        job = self.run_job()
+        res = self.c.get(f'/blast_local/job/{job.id}/')
+        self.assertContains(res, 'Blast results of CP100-11 COI-begin')
+        self.assertContains(res, 'There is no sequence of this voucher to blast')
+        self.assertContains(res, f'/blast_local/job/{job.id}/report.csv')
+
+    def test_job_report(self):
+        job = self.run_job()
+        res = self.c.get(f'/blast_local/job/{job.id}/report.csv')
+        self.assertEqual('text/csv', res['Content-Type'])
+        self.assertIn('attachment', res['Content-Disposition'])
+        lines = res.content.decode('utf-8').splitlines()
+        self.assertEqual(','.join(REPORT_FIELDS), lines[0])
+        # one row per hit
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[1].startswith('CP100-10,COI-begin,CP100-11,COI-begin,'))
+
+        res = self.c.get(f'/blast_local/job/{job.id}/report.json')
+        self.assertEqual(job.results, res.json())
+
+    def test_job_report__not_batch(self):
+        job = BlastJob.objects.create(blast_type='local', query_key='key', task_uuid='task')
+        res = self.c.get(f'/blast_local/job/{job.id}/report.csv')
+        self.assertEqual(404, res.status_code)
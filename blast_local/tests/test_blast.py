@@ -1,12 +1,17 @@
 import datetime
 import glob
 import os
+import re
+import shlex
+from unittest.mock import patch
 
+from Bio.Blast import NCBIXML
+from Bio.Blast.Applications import NcbiblastnCommandline
 from django.core.management import call_command
 from django.test import TestCase
 from django.conf import settings
 
-from core.utils import BLAST
+from core.utils import BLAST, TABULAR_COLUMNS
 from public_interface.models import Vouchers
 from public_interface.models import Sequences
 
@@ -140,3 +145,110 @@ class BlastLocalTest(TestCase):
         expected = 'GGAAGAATTAGGTAACCCAGGATCTTTAATTGGAGATGATCAAATTTATAATACTATTGTAACTGCTCATGCATTTATTATAATTTTTTTTATAGTTATACCTATTATAATTGGAGGATTTGGTAATTGATTAATTCCTTTAATACTTGGAGCTCCTGATATAGCTTTCCCTCGAATAAATAATATAAGATTTTGACTTCTCCCCCCCTCTTTAATTTTATTAATTTCTAGAAGAATTGTAGAAACTGGGGCCGGAACAGGCTGAACAGTATACCCTCCTTTATCTTCAAATATTGCTCATGGGGGAGCTTCTGTAGATTTAGCTATTTTTTCTTTACATTTAGCAGGTATTTCCTCTATTTTAGGAGCAATTAATTTTATTACAACTATTATTAATATACGAATTAGTAATATATCATTTGATCAAATACCTTTATTTGTTTGATCAGTAGGAATTACAGCTTTATTATTACTTTTATCTTTACCTGTATTAGCTGGAGCTATTACCATATTATTAACGGATCGAAATTTAAATACTTCATTTTTTGACCCTGCTGGAGGAGGAGATCCCATTCTTTATCAACATCTATTTTGATTTTTTGG'
         result = self.blast.strip_question_marks(seq)
         self.assertEqual(expected, result)
+
+
+class BlastManifestTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_db_dump.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.blast = BLAST('local', 'CP100-10', 'COI')
+        # as if makeblastdb had been run
+        self.blast.save_seqs_to_file()
+        self.blast.save_manifest()
+        patcher = patch.object(BLAST, 'have_blast_db', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for file in glob.glob(self.blast.db + '*'):
+            os.remove(file)
+
+    def test_manifest(self):
+        manifest = self.blast.read_manifest()
+        self.assertEqual(['COI'], manifest['genes'])
+        self.assertEqual(Sequences.objects.filter(gene__gene_code='COI').count(), manifest['count'])
+        self.assertTrue(self.blast.is_blast_db_up_to_date())
+
+    def test_edit_other_gene(self):
+        Sequences.objects.filter(gene__gene_code='EF1a').first().save()
+        self.assertTrue(self.blast.is_blast_db_up_to_date())
+
+    def test_edit_gene(self):
+        Sequences.objects.filter(gene__gene_code='COI').first().save()
+        self.assertFalse(self.blast.is_blast_db_up_to_date())
+
+    def test_delete_sequence(self):
+        # the latest time_edited stays the same
+        Sequences.objects.filter(gene__gene_code='COI').order_by('time_edited').first().delete()
+        self.assertFalse(self.blast.is_blast_db_up_to_date())
+
+    def test_without_manifest(self):
+        os.remove(self.blast.get_manifest_file())
+        self.assertFalse(self.blast.is_blast_db_up_to_date())
+
+
+class BlastTabularOutputTest(TestCase):
+    """Tabular output of local blasts gives the same hits as XML output."""
+    def setUp(self):
+        xml_file = os.path.join(settings.BASE_DIR, '..', 'blast_ncbi', 'tests',
+                                'CP100-10_COI-begin.xml')
+        with open(xml_file) as handle:
+            xml = handle.read()
+        # hits as in databases made by makeblastdb from our sequences
+        self.number_hits = 0
+
+        def replace_hit(match):
+            self.number_hits += 1
+            return (f'<Hit_id>gnl|BL_ORD_ID|{self.number_hits}</Hit_id>\n'
+                    f'  <Hit_def>CP100-{self.number_hits}|COI-begin</Hit_def>')
+
+        xml = re.sub(r'<Hit_id>.*</Hit_id>\s*<Hit_def>.*</Hit_def>', replace_hit, xml)
+
+        self.xml_blast = BLAST('local', 'CP100-10', 'COI-begin')
+        self.xml_blast.output_format = 'xml'
+        with open(self.xml_blast.output_file, 'w') as handle:
+            handle.write(xml)
+
+        self.blast = BLAST('local', 'CP100-10', 'COI-begin')
+        with open(self.blast.output_file, 'w') as handle:
+            handle.write(self.make_tabular_output(self.xml_blast.output_file))
+
+    def tearDown(self):
+        self.xml_blast.delete_query_output_files()
+        self.blast.delete_query_output_files()
+
+    def make_tabular_output(self, xml_file):
+        lines = ['# BLASTN 2.12.0+\n', '# Query: CP100-10|COI-begin\n']
+        with open(xml_file) as handle:
+            record = NCBIXML.read(handle)
+        for alignment in record.alignments:
+            for hsp in alignment.hsps:
+                values = [
+                    'CP100-10|COI-begin', alignment.hit_id, int(hsp.score), hsp.bits,
+                    hsp.expect, record.query_length, hsp.align_length, hsp.identities,
+                    alignment.hit_def,
+                ]
+                lines.append('\t'.join(str(value) for value in values) + '\n')
+        return ''.join(lines)
+
+    def test_tabular_output_as_xml(self):
+        expected = self.xml_blast.parse_blast_output()
+        self.assertEqual(self.number_hits, len(expected))
+        self.assertEqual(expected, self.blast.parse_blast_output())
+        self.assertEqual('CP100-1', expected[0]['voucher_code'])
+
+    def test_iter_tabular_hits(self):
+        with open(self.blast.output_file) as handle:
+            hits = list(self.blast.iter_tabular_hits(handle))
+        self.assertEqual({'CP100-10|COI-begin'}, {query_id for query_id, _ in hits})
+
+    def test_do_blast(self):
+        with patch.object(NcbiblastnCommandline, '__call__', autospec=True) as mock_call:
+            self.blast.do_blast()
+        argv = shlex.split(str(mock_call.call_args[0][0]))
+        outfmt = argv[argv.index('-outfmt') + 1]
+        self.assertEqual('6 ' + ' '.join(TABULAR_COLUMNS), outfmt)
+        self.assertTrue(self.blast.output_file.endswith('.tsv'))
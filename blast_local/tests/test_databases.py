@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from blast_local.databases import build_database, get_blast, rebuild_dirty_databases
+from blast_local.models import BlastDatabase
+from core.utils import BLAST
+from public_interface.models import Genes, Sequences
+
+
+class BlastDatabaseTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_db_dump.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        # as if all databases had been built after loading the sequences
+        BlastDatabase.objects.update(built_version=F('version'))
+        self.gene = Genes.objects.get(gene_code='COI')
+        self.sequence = Sequences.objects.filter(gene=self.gene).first()
+        cache.clear()
+
+    def test_save_sequence_marks_gene_dirty(self):
+        self.assertEqual([], list(BlastDatabase.objects.dirty()))
+        self.sequence.save()
+        self.sequence.save()
+        database = BlastDatabase.objects.get(gene=self.gene)
+        self.assertTrue(database.is_dirty())
+        self.assertEqual(database.built_version + 2, database.version)
+        self.assertEqual([database], list(BlastDatabase.objects.dirty()))
+
+    def test_delete_sequence_marks_gene_dirty(self):
+        self.sequence.delete()
+        self.assertTrue(BlastDatabase.objects.get(gene=self.gene).is_dirty())
+
+    def test_rebuild_is_scheduled_once(self):
+        with patch('blast_local.tasks.rebuild_blast_databases.apply_async') as mock_apply, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.sequence.save()
+            self.sequence.save()
+        mock_apply.assert_called_once_with(countdown=settings.BLAST_DB_REBUILD_DELAY)
+
+    @patch.object(BLAST, 'create_blast_db')
+    def test_rebuild_dirty_databases(self, mock_create_blast_db):
+        self.sequence.save()
+        with patch.object(BLAST, 'save_seqs_to_file'):
+            self.assertEqual(['COI'], rebuild_dirty_databases())
+        mock_create_blast_db.assert_called_once()
+        self.assertEqual([], list(BlastDatabase.objects.dirty()))
+        self.assertIsNotNone(BlastDatabase.objects.get(gene=self.gene).time_built)
+
+    def test_rebuild_dirty_databases__edit_while_building(self):
+        self.sequence.save()
+
+        def edit_sequence():
+            self.sequence.save()
+
+        with patch.object(BLAST, 'save_seqs_to_file'), \
+                patch.object(BLAST, 'create_blast_db', side_effect=edit_sequence):
+            rebuild_dirty_databases()
+        self.assertTrue(BlastDatabase.objects.get(gene=self.gene).is_dirty())
+
+    @patch.object(BLAST, 'create_blast_db')
+    def test_build_database__locked(self, mock_create_blast_db):
+        cache.add('blast_local:build:COI', 'token')
+        self.assertFalse(build_database('COI'))
+        mock_create_blast_db.assert_not_called()
+
+    @patch('blast_local.databases.build_database')
+    def test_get_blast(self, mock_build_database):
+        with patch.object(BLAST, 'have_blast_db', return_value=True):
+            get_blast('CP100-10', 'COI')
+        mock_build_database.assert_not_called()
+
+        with patch.object(BLAST, 'have_blast_db', return_value=False):
+            blast = get_blast('CP100-10', 'COI')
+        mock_build_database.assert_called_once()
+        self.assertEqual('CP100-10', blast.voucher_code)
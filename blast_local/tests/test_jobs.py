@@ -0,0 +1,185 @@
+import copy
+import glob
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.client import Client
+
+from blast_local.jobs import run_blast_job, schedule_blast
+from blast_local.models import BlastJob
+from core.utils import BLAST
+from public_interface.models import Sequences
+
+
+NCBI_OUTPUT = os.path.join(
+    settings.BASE_DIR, '..', 'blast_ncbi', 'tests', 'CP100-10_COI-begin.xml',
+)
+
+HITS = [{
+    'description': 'CP100-11|COI-begin', 'voucher_code': 'CP100-11', 'gene_code': 'COI-begin',
+    'score': 1000.0, 'bits': 900.0, 'e_value': 0.0, 'query_length': 600,
+    'align_length': 600, 'identities': 590, 'query_cover': 100.0, 'ident': 98.3,
+}]
+
+
+def make_ncbi_handle():
+    with open(NCBI_OUTPUT) as handle:
+        return StringIO(handle.read())
+
+
+class BlastJobTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.user = User.objects.get(username='admin')
+        self.parameters = {'voucher_code': 'CP100-10', 'gene_code': 'COI-begin'}
+        patcher = patch('blast_local.tasks.run_blast.apply_async')
+        self.mock_apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for file in glob.glob(os.path.join(settings.MEDIA_ROOT, 'db', 'COI-begin_seqs.fas*')):
+            os.remove(file)
+
+    def test_schedule_blast(self):
+        job = schedule_blast('remote', self.parameters, self.user)
+        self.assertEqual('queued', job.status)
+        self.mock_apply_async.assert_called_once_with((job.id,), task_id=job.task_uuid)
+
+        # identical requests get the job running
+        self.assertEqual(job, schedule_blast('remote', self.parameters, self.user))
+        self.mock_apply_async.assert_called_once()
+        other_job = schedule_blast('full', self.parameters, self.user)
+        self.assertNotEqual(job, other_job)
+
+    @patch('Bio.Blast.NCBIWWW.qblast', side_effect=lambda *args: make_ncbi_handle())
+    def test_run_blast_job__remote(self, mock_qblast):
+        job = schedule_blast('remote', self.parameters, self.user)
+        run_blast_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual('done', job.status)
+        self.assertIsNotNone(job.completed)
+        self.assertTrue(len(job.results) > 0)
+        self.assertIn('query_cover', job.results[0])
+
+        self.assertEqual(job, schedule_blast('remote', self.parameters, self.user))
+        BlastJob.objects.filter(id=job.id).update(
+            completed=job.completed - timedelta(seconds=settings.BLAST_NCBI_RESULTS_MAX_AGE + 1),
+        )
+        self.assertNotEqual(job, schedule_blast('remote', self.parameters, self.user))
+
+    def test_run_blast_job__remote_edited_query(self):
+        job = schedule_blast('remote', self.parameters, self.user)
+        BlastJob.objects.filter(id=job.id).update(results=[], status='done', completed=job.created)
+        sequence = Sequences.objects.get(code_id='CP100-10', gene__gene_code='COI-begin')
+        sequence.sequences = 'ACGT' + sequence.sequences
+        sequence.save()
+        self.assertNotEqual(job, schedule_blast('remote', self.parameters, self.user))
+
+    @patch.object(BLAST, 'do_blast')
+    @patch.object(BLAST, 'parse_blast_output', return_value=HITS)
+    def test_run_blast_job__local(self, mock_parse, mock_do_blast):
+        # as if the database had been built
+        blast = BLAST('local', 'CP100-10', 'COI-begin')
+        blast.save_seqs_to_file()
+        blast.save_manifest()
+
+        job = schedule_blast('local', self.parameters, self.user)
+        with patch.object(BLAST, 'have_blast_db', return_value=True):
+            run_blast_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual('done', job.status)
+        self.assertEqual(HITS, job.results)
+        self.assertEqual(blast.manifest, job.database_manifest)
+
+        self.assertEqual(job, schedule_blast('local', self.parameters, self.user))
+        # the database changes with edits of the gene
+        Sequences.objects.filter(code_id='CP100-11', gene__gene_code='COI-begin').first().save()
+        self.assertNotEqual(job, schedule_blast('local', self.parameters, self.user))
+
+    def test_run_blast_job__invalid_query(self):
+        Sequences.objects.filter(code_id='CP100-10', gene__gene_code='COI-begin').update(
+            sequences='?????',
+        )
+        job = schedule_blast('remote', self.parameters, self.user)
+        run_blast_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual('failed', job.status)
+        self.assertIn('only question marks', job.error)
+        # failed jobs are not reused
+        self.assertNotEqual(job, schedule_blast('remote', self.parameters, self.user))
+
+    @patch('Bio.Blast.NCBIWWW.qblast', side_effect=OSError('network is unreachable'))
+    def test_run_blast_job__error(self, mock_qblast):
+        job = schedule_blast('remote', self.parameters, self.user)
+        with self.assertRaises(OSError):
+            run_blast_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual('failed', job.status)
+        self.assertIsNotNone(job.completed)
+
+
+class BlastJobViewsTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.user = User.objects.get(username='admin')
+        self.user.set_password('pass')
+        self.user.save()
+        self.c = Client()
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+
+    @patch('blast_local.tasks.run_blast.apply_async')
+    def test_index(self, mock_apply_async):
+        res = self.c.get('/blast_ncbi/CP100-10/COI-begin/')
+        job = BlastJob.objects.get()
+        self.assertEqual('remote', job.blast_type)
+        self.assertRedirects(res, f'/blast_local/job/{job.id}/', fetch_redirect_response=False)
+        mock_apply_async.assert_called_once()
+
+    @patch('blast_local.tasks.run_blast.apply_async')
+    def test_index__blast_new(self, mock_apply_async):
+        res = self.c.post('/blast_new/results/', {
+            'name': 'aaaa',
+            'sequence': 'ATCGATCGGCTA',
+            'gene_codes': ['wingless', 'COI-begin'],
+        })
+        job = BlastJob.objects.get()
+        self.assertRedirects(res, f'/blast_local/job/{job.id}/', fetch_redirect_response=False)
+        self.assertEqual(['COI-begin', 'wingless'], job.parameters['gene_codes'])
+
+    @patch('blast_local.views.AsyncResult')
+    def test_job(self, mock_async_result):
+        mock_async_result.return_value.state = 'STARTED'
+        job = BlastJob.objects.create(blast_type='local', query_key='key', task_uuid='task')
+        res = self.c.get(f'/blast_local/job/{job.id}/')
+        self.assertContains(res, 'Task status STARTED')
+
+        res = self.c.get(f'/blast_local/job/{job.id}/status/')
+        self.assertEqual(
+            {'completed': False, 'status': 'queued', 'task_status': 'STARTED'}, res.json(),
+        )
+
+        job.results = copy.deepcopy(HITS)
+        job.status = 'done'
+        job.completed = job.created
+        job.save()
+        res = self.c.get(f'/blast_local/job/{job.id}/')
+        self.assertContains(res, '/p/CP100-11')
+        self.assertContains(res, '98.3%')
+
+    def test_job__not_found(self):
+        res = self.c.get('/blast_local/job/1/')
+        self.assertEqual(404, res.status_code)
@@ -6,5 +6,12 @@ from . import views
 app_name = 'blast_local'
 
 urlpatterns = [
+    path('batch/', views.batch, name='blast-batch'),
+    path('job/<int:job_id>/', views.job, name='blast-job'),
+    path('job/<int:job_id>/status/', views.job_status, name='blast-job-status'),
+    path('job/<int:job_id>/report.csv', views.job_report, {'report_format': 'csv'},
+         name='blast-job-report-csv'),
+    path('job/<int:job_id>/report.json', views.job_report, {'report_format': 'json'},
+         name='blast-job-report-json'),
     path('<voucher_code>/<gene_code>/', views.index, name='index'),
 ]
@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Tuple
+
+from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from core.utils import BLAST
+from public_interface.models import Sequences
+
+
+# columns of batch blast reports
+REPORT_FIELDS = (
+    'query_voucher_code', 'gene_code', 'voucher_code', 'hit_gene_code', 'description',
+    'ident', 'query_cover', 'score', 'bits', 'e_value', 'query_length', 'align_length',
+    'identities',
+)
+
+
+class BLASTBatch(BLAST):
+    """Blasts the sequences of many vouchers for one gene at once.
+
+    All sequences go in one query file and are blasted against the
+    database of the gene by one blastn, using
+    ``settings.BLAST_NUM_THREADS`` threads.
+    """
+    def __init__(self, voucher_codes: List[str], gene_code: str, *args, **kwargs):
+        super(BLASTBatch, self).__init__('batch', None, gene_code, *args, **kwargs)
+        self.voucher_codes = voucher_codes
+        # vouchers without a sequence to blast
+        self.skipped = []
+
+    def get_query_sequences(self) -> List[Tuple[str, str]]:
+        """(voucher code, sequence) in the order of the voucher codes."""
+        sequences = dict(
+            Sequences.objects.filter(
+                code_id__in=self.voucher_codes, gene__gene_code=self.gene_code,
+            ).values_list('code_id', 'sequences')
+        )
+        return [
+            (voucher_code, sequences[voucher_code])
+            for voucher_code in self.voucher_codes
+            if voucher_code in sequences
+        ]
+
+    def save_query_to_file(self) -> bool:
+        """Writes all sequences to one FASTA file. Returns whether there was
+        any sequence to blast.
+        """
+        query_sequences = dict(self.get_query_sequences())
+        my_records = []
+        self.skipped = []
+        for voucher_code in self.voucher_codes:
+            seq = self.strip_question_marks(query_sequences.get(voucher_code, ''))
+            if seq:
+                this_id = '{0}|{1}'.format(voucher_code, self.gene_code)
+                my_records.append(SeqRecord(Seq(seq), id=this_id))
+            else:
+                self.skipped.append(voucher_code)
+        SeqIO.write(my_records, self.query_file, "fasta")
+        return bool(my_records)
+
+    def parse_blast_output(self) -> List[Dict[str, Any]]:
+        """Hits grouped by query, one item for each voucher code:
+
+        voucher_code, gene_code, skipped (True for vouchers without a
+        sequence to blast) and the list of hits.
+        """
+        hits = {voucher_code: [] for voucher_code in self.voucher_codes}
+        with open(self.output_file) as handle:
+            for query_id, hit in self.iter_tabular_hits(handle):
+                hits[query_id.split('|')[0]].append(hit)
+        return [
+            {
+                'voucher_code': voucher_code,
+                'gene_code': self.gene_code,
+                'skipped': voucher_code in self.skipped,
+                'hits': hits[voucher_code],
+            }
+            for voucher_code in self.voucher_codes
+        ]
+
+
+def make_report_rows(results) -> List[Dict[str, Any]]:
+    """One row per hit of the results of a batch blast, see REPORT_FIELDS."""
+    rows = []
+    for query in results:
+        for hit in query['hits']:
+            rows.append({
+                'query_voucher_code': query['voucher_code'],
+                'gene_code': query['gene_code'],
+                'voucher_code': hit.get('voucher_code', ''),
+                'hit_gene_code': hit.get('gene_code', ''),
+                'description': hit['description'],
+                'ident': hit['ident'],
+                'query_cover': hit['query_cover'],
+                'score': hit['score'],
+                'bits': hit['bits'],
+                'e_value': hit['e_value'],
+                'query_length': hit['query_length'],
+                'align_length': hit['align_length'],
+                'identities': hit['identities'],
+            })
+    return rows
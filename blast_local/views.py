@@ -1,11 +1,18 @@
+import csv
+import json
 import logging
-from subprocess import CalledProcessError
 
+from celery.result import AsyncResult
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
 
-from core.utils import BLAST, get_context
+from core.utils import get_context, get_voucher_codes
+from .forms import BatchBlastForm
+from .jobs import schedule_blast
+from .models import BlastJob
+from .utils import REPORT_FIELDS, make_report_rows
 
 
 log = logging.getLogger(__name__)
@@ -17,24 +24,88 @@ def index(request: HttpRequest, voucher_code: str, gene_code: str) -> HttpRespon
 
     Show results to user in a table
     """
-    blast = BLAST('local', voucher_code, gene_code)
-    blast.save_seqs_to_file()
-
-    if not blast.is_blast_db_up_to_date():
-        try:
-            blast.create_blast_db()
-        except CalledProcessError:
-            log.warning("there are no sequences for gene %s", gene_code)
-
-    was_sequence_saved = blast.save_query_to_file()
-    if was_sequence_saved:
-        blast.do_blast()
-        result = blast.parse_blast_output()
-        blast.delete_query_output_files()
+    parameters = {'voucher_code': voucher_code, 'gene_code': gene_code}
+    job = schedule_blast('local', parameters, request.user)
+    return redirect_to_job(job)
+
+
+@login_required
+def batch(request: HttpRequest) -> HttpResponse:
+    """Blasts the sequences of a gene for many vouchers at once."""
+    context = get_context(request)
+    if request.method == 'POST':
+        form = BatchBlastForm(request.POST)
+        if form.is_valid():
+            parameters = {
+                'voucher_codes': list(get_voucher_codes(form.cleaned_data)),
+                'gene_code': form.cleaned_data['gene_code'].gene_code,
+            }
+            job = schedule_blast('batch', parameters, request.user)
+            return redirect_to_job(job)
     else:
-        result = {
-            "error": "Query sequence has no valid codons, only question marks",
-        }
+        form = BatchBlastForm()
+    context['form'] = form
+    return render(request, 'blast_local/batch.html', context)
+
+
+def redirect_to_job(job: BlastJob) -> HttpResponseRedirect:
+    return HttpResponseRedirect(reverse('blast-job', kwargs={'job_id': job.id}))
+
+
+def get_job(job_id) -> BlastJob:
+    try:
+        return BlastJob.objects.get(id=job_id)
+    except BlastJob.DoesNotExist:
+        raise Http404(f'such blast job {job_id} does not exist')
+
+
+def get_task_status(job: BlastJob) -> str:
+    if job.task_uuid and not job.is_finished():
+        return AsyncResult(job.task_uuid).state
+    return ''
+
+
+@login_required
+def job(request: HttpRequest, job_id) -> HttpResponse:
+    """Results of a blast job, or its status while it runs."""
+    blast_job = get_job(job_id)
     context = get_context(request)
-    context["result"] = result
+    context['job'] = blast_job
+    context['task_status'] = get_task_status(blast_job)
+    context['result'] = blast_job.results
+    if blast_job.blast_type == 'batch':
+        return render(request, 'blast_local/batch_results.html', context)
     return render(request, 'blast_local/index.html', context)
+
+
+@login_required
+def job_status(request: HttpRequest, job_id) -> JsonResponse:
+    """Status of a blast job as JSON, for polling from its page."""
+    blast_job = get_job(job_id)
+    data = {
+        'completed': blast_job.is_finished(),
+        'status': blast_job.status,
+        'task_status': get_task_status(blast_job),
+    }
+    return JsonResponse(data)
+
+
+@login_required
+def job_report(request: HttpRequest, job_id, report_format: str) -> HttpResponse:
+    """Hits of a finished batch blast as a CSV or JSON file."""
+    blast_job = get_job(job_id)
+    if blast_job.blast_type != 'batch' or not blast_job.is_finished() or blast_job.error:
+        raise Http404(f'blast job {job_id} has no report')
+
+    file_name = f'blast_{blast_job.parameters["gene_code"]}_{blast_job.id}.{report_format}'
+    if report_format == 'json':
+        response = HttpResponse(
+            json.dumps(blast_job.results, indent=2), content_type='application/json',
+        )
+    else:
+        response = HttpResponse(content_type='text/csv')
+        writer = csv.DictWriter(response, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(make_report_rows(blast_job.results))
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
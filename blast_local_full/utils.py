@@ -1,9 +1,8 @@
 import os
+from typing import List, Optional
 
-from Bio import SeqIO
-from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
 from django.conf import settings
+from django.db.models import QuerySet
 
 from core.utils import BLAST
 from public_interface.models import Sequences
@@ -23,22 +22,8 @@ class BLASTFull(BLAST):
         self.path = os.path.join(settings.MEDIA_ROOT, 'db', 'full_db_seqs.fas.n*')
         self.db = os.path.join(settings.MEDIA_ROOT, 'db', 'full_db_seqs.fas')
 
-    def save_seqs_to_file(self) -> None:
-        """Query all sequences from our database and save them to local disk.
-
-        Sets attribute `self.seq_file` containing necessary sequences from our
-        database.
-
-        """
-        if self.blast_type == 'full':
-            self.seq_file = os.path.join(settings.MEDIA_ROOT, 'db', 'full_db_seqs.fas')
-            queryset = Sequences.objects.all()
-
-            my_records = []
-            for seq_obj in queryset:
-                item_id = seq_obj.code_id + '|' + seq_obj.gene.gene_code
-                seq_string = self.strip_question_marks(seq_obj.sequences)
-                if seq_string != '':
-                    seq_record = SeqRecord(Seq(seq_string), id=item_id)
-                    my_records.append(seq_record)
-            SeqIO.write(my_records, self.seq_file, "fasta")
+    def get_sequences(self) -> QuerySet:
+        return Sequences.objects.filter(gene__isnull=False)
+
+    def get_manifest_genes(self) -> Optional[List[str]]:
+        return None
@@ -5,6 +5,8 @@ from core.utils import BLAST
 
 class BLASTNcbi(BLAST):
     """Handles duties related to blast against sequences in NCBI GenBank."""
+    output_format = 'xml'
+
     def do_blast(self) -> None:
         """Blasts against NCBI and saves returned XML file to local disk."""
         with open(self.query_file) as handle:
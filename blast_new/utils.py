@@ -1,10 +1,11 @@
 import logging
 import os
+from typing import List, Optional
 
 from Bio import SeqIO
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
-from django.db.models import Q, QuerySet
+from django.db.models import QuerySet
 from django.conf import settings
 
 from core.utils import BLAST
@@ -37,40 +38,14 @@ class BLASTNew(BLAST):
         self.path = os.path.join(settings.MEDIA_ROOT, 'db', '_'.join(self.genes) + '_seqs.fas.n*')
         self.db = os.path.join(settings.MEDIA_ROOT, 'db', '_'.join(self.genes) + '_seqs.fas')
 
-    def save_seqs_to_file(self):
-        """Query sequences for each gene from database and save to local disk.
+    def get_sequences(self) -> QuerySet:
+        """Sequences of the genes to blast against, or all of them."""
+        if self.genes:
+            return Sequences.objects.filter(gene__gene_code__in=self.genes)
+        return Sequences.objects.all()
 
-        Sets attribute `self.seq_file` containing necessary sequences from our
-        database.
-
-        """
-        if self.blast_type == 'new':
-            self.seq_file = os.path.join(
-                settings.MEDIA_ROOT,
-                'db',
-                '_'.join(self.genes) + "_seqs.fas",
-            )
-            if self.genes:
-                # Taken from http://stackoverflow.com/a/1239602
-                Qr = None
-                for gene in self.genes:
-                    q = Q(gene__gene_code=gene)
-                    if Qr:
-                        Qr = Qr | q
-                    else:
-                        Qr = q
-                queryset = Sequences.objects.filter(Qr)
-            else:
-                queryset = Sequences.objects.all()
-
-            my_records = []
-            for i in queryset:
-                item_id = i.code_id + '|' + i.gene.gene_code
-                seq = self.strip_question_marks(i.sequences)
-                if seq != '':
-                    seq_record = SeqRecord(Seq(seq), id=item_id)
-                    my_records.append(seq_record)
-            SeqIO.write(my_records, self.seq_file, "fasta")
+    def get_manifest_genes(self) -> Optional[List[str]]:
+        return list(self.genes) or None
 
     def save_query_to_file(self):
         this_id = self.name
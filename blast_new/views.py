@@ -4,8 +4,9 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import HttpResponseRedirect
 
+from blast_local.jobs import schedule_blast
+from blast_local.views import redirect_to_job
 from core.utils import get_context
-from .utils import BLASTNew
 from .forms import BLASTNewForm
 
 
@@ -30,26 +31,15 @@ def results(request):
 
         if form.is_valid():
             cleaned_data = form.cleaned_data
-
-            blast = BLASTNew(
-                blast_type='new',
-                name=cleaned_data['name'],
-                sequence=cleaned_data['sequence'],
-                gene_codes=cleaned_data['gene_codes'],
-            )
-            blast.save_seqs_to_file()
-
-            if not blast.is_blast_db_up_to_date():
-                blast.create_blast_db()
-
-            blast.save_query_to_file()
-            blast.do_blast()
-            result = blast.parse_blast_output()
-            if not result:
-                result = None
-            blast.delete_query_output_files()
-            context["result"] = result
-            return render(request, 'blast_new/results.html', context)
+            parameters = {
+                'name': cleaned_data['name'],
+                'sequence': cleaned_data['sequence'],
+                'gene_codes': sorted(
+                    cleaned_data['gene_codes'].values_list('gene_code', flat=True)
+                ),
+            }
+            job = schedule_blast('new', parameters, request.user)
+            return redirect_to_job(job)
         else:
             context["form"] = form
             return render(request, 'blast_new/index.html', context)
@@ -4,3 +4,7 @@ class MissingReadingFrameForGene(Exception):
 
 class InadequateCodonPositions(Exception):
     pass
+
+
+class InvalidBlastQuery(Exception):
+    pass
@@ -1,20 +1,20 @@
-import datetime
 import glob
+import json
 import logging
 import os
 import re
 import subprocess
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import uuid
 
 from django.conf import settings
+from django.db.models import Count, Max, QuerySet
 from django.http import HttpRequest
 from Bio import SeqIO
 from Bio.Blast.Applications import NcbiblastnCommandline
 from Bio.Blast import NCBIXML
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
-import pytz
 
 from . import exceptions
 from stats.models import Stats
@@ -137,6 +137,13 @@ def clean_positions(a_list):
         return a_list
 
 
+# columns of the tabular output of local blasts, the title goes last as it
+# can have spaces
+TABULAR_COLUMNS = (
+    'qseqid', 'sseqid', 'score', 'bitscore', 'evalue', 'qlen', 'length', 'nident', 'stitle',
+)
+
+
 class BLAST(object):
     """Handle duties related to local blasts.
 
@@ -148,7 +155,12 @@ class BLAST(object):
 
     Use `mask=False` to create unmasked blast databases.
 
+    Local blasts ask for tabular output, which is faster to parse than XML.
+
     """
+    # tabular or xml
+    output_format = 'tabular'
+
     def __init__(self, blast_type, voucher_code, gene_code, mask=None):
         """Type of blast to do: local, full, remote.
 
@@ -163,6 +175,7 @@ class BLAST(object):
         self.gene_code = gene_code
         self.cwd = os.path.dirname(__file__)
         self.seq_file = ""
+        self.manifest = None
         self.mask = bool(mask)
         self.path = os.path.join(settings.MEDIA_ROOT, 'db',
                                  "{0}_seqs.fas.n*".format(self.gene_code))
@@ -173,8 +186,9 @@ class BLAST(object):
         self.query_file = os.path.join(settings.MEDIA_ROOT, 'db',
                                        "query_{0}.fas".format(uuid.uuid4().hex))
 
+        extension = 'xml' if self.output_format == 'xml' else 'tsv'
         self.output_file = os.path.join(settings.MEDIA_ROOT, 'db',
-                                        "output_{0}.xml".format(uuid.uuid4().hex))
+                                        "output_{0}.{1}".format(uuid.uuid4().hex, extension))
         if settings.OS == 'linux':
             self.bin_path = '/usr/bin/'
         else:
@@ -189,59 +203,85 @@ class BLAST(object):
         files = glob.glob(self.db + '.*')
         return bool(files)
 
+    def get_sequences(self) -> QuerySet:
+        """Sequences of our database that go in the blast db."""
+        return Sequences.objects.filter(gene__gene_code=self.gene_code)
+
+    def get_manifest_genes(self) -> Optional[List[str]]:
+        """Gene codes in the blast db, None for all genes."""
+        return [self.gene_code]
+
+    def get_manifest_file(self) -> str:
+        return self.db + '.manifest.json'
+
+    def make_manifest(self) -> Dict[str, Any]:
+        """Describes the sequences of the blast db with one aggregate query.
+
+        Saving a sequence sets its time_edited, so the number of sequences
+        and the latest time_edited change whenever sequences are added,
+        edited or deleted.
+        """
+        stats = self.get_sequences().aggregate(
+            count=Count('id'), time_edited=Max('time_edited'),
+        )
+        time_edited = stats['time_edited']
+        return {
+            'genes': self.get_manifest_genes(),
+            'count': stats['count'],
+            'time_edited': time_edited.isoformat() if time_edited else None,
+        }
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.get_manifest_file()) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def save_manifest(self) -> None:
+        """Writes the manifest of the sequences saved by `save_seqs_to_file`."""
+        manifest_file = self.get_manifest_file()
+        with open(manifest_file + '.tmp', 'w') as handle:
+            json.dump(self.manifest, handle)
+        os.replace(manifest_file + '.tmp', manifest_file)
+
     def is_blast_db_up_to_date(self):
         """Finds out whether our blast db contains all our sequences.
 
-        In other words, it finds out whether there are sequences in our postgres
-        db with time_created or time_edited more recent than our blast db files.
+        In other words, it finds out whether the sequences of its genes
+        changed since the manifest written with the blast db. Edits of
+        other genes do not matter.
 
         :return: True or False
         """
         if not self.have_blast_db():
             return False
-
-        # get time creation blast database files
-        modification_times = []
-        files = glob.glob(self.path)
-        for i in files:
-            mod_time_in_secs = os.stat(i).st_ctime
-            modification_times.append(datetime.datetime.fromtimestamp(mod_time_in_secs))
-        modification_times.sort(reverse=True)
-        time_creation_blast = modification_times[0].replace(tzinfo=pytz.utc)
-
-        # get time creation time edited sequences in our database
-        time_created_queryset = Sequences.objects.all().order_by('-time_created')[:1]
-        time_created = time_created_queryset[0].time_created
-
-        time_edited_queryset = Sequences.objects.all().order_by('-time_edited')[:1]
-        time_edited = time_edited_queryset[0].time_edited
-
-        if time_created > time_creation_blast or time_edited > time_creation_blast:
-            return False
-        else:
-            return True
+        manifest = self.read_manifest()
+        return manifest is not None and manifest == self.make_manifest()
 
     def save_seqs_to_file(self):
-        """Query sequences for each gene from database and save them to local disk.
+        """Query sequences from database and save them to local disk.
 
         Sets attribute `self.seq_file` containing necessary sequences from our
-        database.
+        database, and `self.manifest` describing them.
 
         """
-        if self.blast_type == 'local':
-            self.seq_file = os.path.join(settings.MEDIA_ROOT,
-                                         'db',
-                                         "{0}_seqs.fas".format(self.gene_code))
-            queryset = Sequences.objects.all().filter(gene__gene_code=self.gene_code)
-
-            my_records = []
-            for i in queryset:
-                item_id = i.code_id + '|' + i.gene.gene_code
-                seq = self.strip_question_marks(i.sequences)
-                if seq != '':
-                    seq_record = SeqRecord(Seq(seq), id=item_id)
-                    my_records.append(seq_record)
-            SeqIO.write(my_records, self.seq_file, "fasta")
+        self.seq_file = self.db
+        # before reading the sequences, so that edits made meanwhile are
+        # found by the next check
+        self.manifest = self.make_manifest()
+        queryset = self.get_sequences().values_list(
+            'code_id', 'gene__gene_code', 'sequences',
+        )
+
+        my_records = []
+        for code_id, gene_code, sequences in queryset:
+            item_id = code_id + '|' + gene_code
+            seq = self.strip_question_marks(sequences)
+            if seq != '':
+                seq_record = SeqRecord(Seq(seq), id=item_id)
+                my_records.append(seq_record)
+        SeqIO.write(my_records, self.seq_file, "fasta")
 
     def create_blast_db(self):
         """Creates a BLAST database from our sequences file in FASTA format.
@@ -266,12 +306,16 @@ class BLAST(object):
             command += 'makeblastdb -in ' + self.seq_file + ' -input_type fasta -dbtype nucl '
             command += '-out ' + self.seq_file + ' -title "Whole Genome unmasked"'
             subprocess.check_output(command, shell=True)
+        if self.manifest is not None:
+            self.save_manifest()
 
     def save_query_to_file(self) -> bool:
         """Returns boolean to point out whether we could save a query file"""
         seq_obj = Sequences.objects.filter(
             code_id=self.voucher_code, gene__gene_code=self.gene_code
         ).first()
+        if seq_obj is None:
+            return False
         this_id = '{0}|{1}'.format(seq_obj.code_id, seq_obj.gene.gene_code)
         seq = self.strip_question_marks(seq_obj.sequences)
 
@@ -283,13 +327,19 @@ class BLAST(object):
             return False
 
     def do_blast(self):
+        if self.output_format == 'xml':
+            outfmt = 5
+        else:
+            # Biopython quotes it, as it has spaces
+            outfmt = '6 {}'.format(' '.join(TABULAR_COLUMNS))
         blastn_cline = NcbiblastnCommandline(
             cmd=self.bin_path + 'blastn',
             query=self.query_file,
             db=self.db,
             evalue=self.e_value,
-            outfmt=5,
-            out=self.output_file
+            outfmt=outfmt,
+            out=self.output_file,
+            num_threads=settings.BLAST_NUM_THREADS,
         )
         blastn_cline()
         return self.output_file
@@ -300,6 +350,12 @@ class BLAST(object):
         match_description, max_score, total_score, query_cover, e_value, % ident, accession number
 
         """
+        if self.output_format == 'xml':
+            return self.parse_xml_output()
+        with open(self.output_file) as handle:
+            return [hit for _, hit in self.iter_tabular_hits(handle)]
+
+    def parse_xml_output(self):
         handle = open(self.output_file, 'r')
         blast_record = NCBIXML.read(handle)
         hits = []
@@ -324,19 +380,56 @@ class BLAST(object):
                         else:
                             obj['description'] = alignment.title
 
-                    obj['score'] = hsp.score
-                    obj['bits'] = hsp.bits
-                    obj['e_value'] = hsp.expect
-
-                    obj['query_length'] = blast_record.query_length
-                    obj['align_length'] = hsp.align_length
-                    obj['identities'] = hsp.identities
-
-                    obj['query_cover'] = round((obj['align_length'] * 100) / obj['query_length'], 1)
-                    obj['ident'] = round((obj['identities'] * 100) / obj['align_length'], 1)
+                    self.add_hsp_values(
+                        obj, hsp.score, hsp.bits, hsp.expect, blast_record.query_length,
+                        hsp.align_length, hsp.identities,
+                    )
                     append(obj)
         return hits
 
+    def iter_tabular_hits(self, handle) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yields (query id, hit) for each line of tabular output (outfmt 6
+        or 7 with `TABULAR_COLUMNS`), with the same data as the XML output.
+        """
+        for line in handle:
+            if not line.strip() or line.startswith('#'):
+                continue
+            (query_id, subject_id, score, bits, e_value, query_length, align_length,
+             identities, title) = line.rstrip('\n').split('\t')
+            e_value = float(e_value)
+            if e_value >= self.e_value:
+                continue
+
+            # the FASTA id of our sequences, in the title unless the
+            # database was made with -parse_seqids
+            if title and title != 'N/A':
+                description = title.split(' ')[0]
+            else:
+                description = subject_id
+            obj = {'description': description}
+            if '|' in description:
+                obj['voucher_code'] = description.split('|')[0]
+                obj['gene_code'] = description.split('|')[1]
+
+            self.add_hsp_values(
+                obj, float(score), float(bits), e_value, int(query_length),
+                int(align_length), int(identities),
+            )
+            yield query_id, obj
+
+    def add_hsp_values(self, obj, score, bits, e_value, query_length, align_length,
+                       identities) -> None:
+        obj['score'] = score
+        obj['bits'] = bits
+        obj['e_value'] = e_value
+
+        obj['query_length'] = query_length
+        obj['align_length'] = align_length
+        obj['identities'] = identities
+
+        obj['query_cover'] = round((obj['align_length'] * 100) / obj['query_length'], 1)
+        obj['ident'] = round((obj['identities'] * 100) / obj['align_length'], 1)
+
     def delete_query_output_files(self):
         if os.path.isfile(self.query_file):
             os.remove(self.query_file)
@@ -1 +1,81 @@
-# Register your models here.
+from django.contrib import admin
+from django.db.models import F, FloatField, IntegerField
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+
+from create_dataset.models import Dataset
+
+
+def get_metric(name, output_field):
+    return Cast(KeyTextTransform(name, 'metrics'), output_field)
+
+
+def get_input_metric(name):
+    return Cast(KeyTextTransform(name, KeyTextTransform('input', 'metrics')), IntegerField())
+
+
+class DatasetAdmin(admin.ModelAdmin):
+    """Dataset jobs, slowest first, to find regressions and plan
+    the capacity of workers.
+    """
+    list_display = [
+        'id', 'user', 'created', 'wall_time', 'query_time', 'queries',
+        'vouchers', 'genes', 'total_bp', 'max_rss', 'file_size',
+    ]
+    list_filter = ['created']
+    date_hierarchy = 'created'
+    search_fields = ['user__username']
+    fields = [
+        'user', 'created', 'completed', 'task_uuid', 'file_path', 'file_size',
+        'compressed_size', 'errors', 'warnings', 'metrics',
+    ]
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related('user')
+        return queryset.annotate(
+            wall_time_value=get_metric('wall_time', FloatField()),
+            query_time_value=get_metric('query_time', FloatField()),
+            queries_value=get_metric('queries', IntegerField()),
+            max_rss_value=get_metric('max_rss', IntegerField()),
+            vouchers_value=get_input_metric('vouchers'),
+            genes_value=get_input_metric('genes'),
+            total_bp_value=get_input_metric('total_bp'),
+        )
+
+    def get_ordering(self, request):
+        return [F('wall_time_value').desc(nulls_last=True)]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Wall time (s)', ordering='wall_time_value')
+    def wall_time(self, obj):
+        return obj.wall_time_value
+
+    @admin.display(description='SQL time (s)', ordering='query_time_value')
+    def query_time(self, obj):
+        return obj.query_time_value
+
+    @admin.display(description='SQL queries', ordering='queries_value')
+    def queries(self, obj):
+        return obj.queries_value
+
+    @admin.display(description='Worker max RSS (bytes)', ordering='max_rss_value')
+    def max_rss(self, obj):
+        return obj.max_rss_value
+
+    @admin.display(ordering='vouchers_value')
+    def vouchers(self, obj):
+        return obj.vouchers_value
+
+    @admin.display(ordering='genes_value')
+    def genes(self, obj):
+        return obj.genes_value
+
+    @admin.display(description='Total bp', ordering='total_bp_value')
+    def total_bp(self, obj):
+        return obj.total_bp_value
+
+
+admin.site.register(Dataset, DatasetAdmin)
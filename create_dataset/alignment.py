@@ -0,0 +1,152 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+log = logging.getLogger(__name__)
+
+
+MISSING = ord('?')
+
+# sites included for each option of codon positions in the dataset form
+CODON_POSITIONS = {
+    '1st': (1,),
+    '2nd': (2,),
+    '3rd': (3,),
+    '1st-2nd': (1, 2),
+    'ALL': (1, 2, 3),
+}
+
+# number of leading sites that are not part of a full codon, as in
+# SeqRecordExpanded.first_codon_position()
+READING_FRAME_OFFSETS = {1: 0, 2: 2, 3: 1}
+
+
+class AlignmentMatrix(object):
+    """Aligned sequences as a ``uint8`` array with one row per taxon.
+
+    Genes are concatenated in columns. Sequences shorter than their gene
+    are padded with ``?``. Codon positions and genes are selected with
+    boolean masks and slices over columns, so they are cheap even for
+    thousands of taxa. Binary matrix bundles are made from it, see
+    ``MatrixBundleHandler``.
+
+    Attributes:
+        ``taxa``: list of row labels.
+        ``data``: numpy array of shape (number of taxa, number of sites).
+        ``genes``: OrderedDict of gene_code: (start, end) column offsets.
+        ``reading_frames``: dict of gene_code: reading frame (1, 2, 3 or None).
+
+    """
+    def __init__(self, taxa, data, genes, reading_frames=None):
+        self.taxa = list(taxa)
+        self.data = data
+        self.genes = OrderedDict(genes)
+        self.reading_frames = reading_frames or {}
+
+    @classmethod
+    def from_sequences(cls, taxa, genes, sequences: Dict[Tuple[str, str], str]):
+        """Builds the matrix.
+
+        Parameters:
+            taxa (list): row labels.
+            genes (list): tuples of (gene_code, length, reading_frame).
+            sequences (dict): sequence strings keyed by (taxon, gene_code).
+                              Missing sequences are filled with ``?``.
+        """
+        taxa = list(taxa)
+        offsets = []
+        start = 0
+        for gene_code, length, _ in genes:
+            # sequences longer than the gene length are kept whole
+            longest = max(
+                [len(sequences.get((taxon, gene_code), '')) for taxon in taxa] + [length or 0]
+            )
+            offsets.append((gene_code, (start, start + longest)))
+            start += longest
+
+        data = np.full((len(taxa), start), MISSING, dtype=np.uint8)
+        for row, taxon in enumerate(taxa):
+            for gene_code, (gene_start, _) in offsets:
+                sequence = sequences.get((taxon, gene_code))
+                if sequence:
+                    encoded = np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)
+                    data[row, gene_start:gene_start + len(encoded)] = encoded
+
+        reading_frames = {gene_code: reading_frame for gene_code, _, reading_frame in genes}
+        return cls(taxa, data, offsets, reading_frames)
+
+    @property
+    def number_taxa(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def number_chars(self) -> int:
+        return self.data.shape[1]
+
+    def get_codon_position_mask(self, positions='ALL', gene_code=None) -> np.ndarray:
+        """Boolean mask over the columns of a gene, or of the whole matrix.
+
+        Parameters:
+            positions (str): 1st, 2nd, 3rd, 1st-2nd or ALL.
+        """
+        if positions not in CODON_POSITIONS:
+            raise ValueError(f'unknown codon positions {positions}')
+
+        if gene_code is None:
+            masks = [self.get_codon_position_mask(positions, gene_code) for gene_code in self.genes]
+            return np.concatenate(masks + [np.zeros(0, dtype=bool)])
+
+        start, end = self.genes[gene_code]
+        if positions == 'ALL':
+            return np.ones(end - start, dtype=bool)
+
+        reading_frame = self.reading_frames.get(gene_code)
+        if reading_frame not in READING_FRAME_OFFSETS:
+            raise ValueError(f'reading frame of gene {gene_code} should be either 1, 2 or 3')
+        offset = READING_FRAME_OFFSETS[reading_frame]
+
+        columns = np.arange(end - start)
+        codon_position = (columns - offset) % 3 + 1
+        mask = np.isin(codon_position, CODON_POSITIONS[positions])
+        mask[:offset] = False
+        return mask
+
+    def select_codon_positions(self, positions) -> 'AlignmentMatrix':
+        """Returns a new matrix with the given codon positions of every gene."""
+        if positions == 'ALL':
+            return self
+
+        genes = []
+        columns = [np.zeros(0, dtype=np.intp)]
+        start = 0
+        for gene_code, (gene_start, _) in self.genes.items():
+            gene_columns = np.flatnonzero(self.get_codon_position_mask(positions, gene_code))
+            columns.append(gene_columns + gene_start)
+            genes.append((gene_code, (start, start + len(gene_columns))))
+            start += len(gene_columns)
+
+        data = self.data[:, np.concatenate(columns)]
+        # sites are no longer in codons, so there is no reading frame
+        return AlignmentMatrix(self.taxa, data, genes)
+
+    def get_gene(self, gene_code) -> np.ndarray:
+        """Columns of one gene, as a view of the matrix."""
+        start, end = self.genes[gene_code]
+        return self.data[:, start:end]
+
+    def get_partitions(self) -> List[Tuple[str, int, int]]:
+        """Returns (gene_code, first site, last site) for each gene, 1-based."""
+        return [
+            (gene_code, start + 1, end)
+            for gene_code, (start, end) in self.genes.items()
+        ]
+
+    def get_row(self, index, gene_code=None) -> str:
+        if gene_code is None:
+            row = self.data[index]
+        else:
+            row = self.get_gene(gene_code)[index]
+        return row.tobytes().decode('ascii')
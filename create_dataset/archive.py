@@ -0,0 +1,179 @@
+"""Per-gene archives: a zip file with one alignment file per gene.
+
+Sequences of all genes are read once, as for other datasets, and each gene is
+formatted on its own and written to the archive as soon as it is ready, so
+that only a few genes are kept in memory. The archive ends with a
+``manifest.json`` listing the file, length and number of taxa of each gene.
+"""
+import hashlib
+import itertools
+import json
+import os
+import re
+import uuid
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+
+# dataset format: format of the files in the archive
+ARCHIVE_FORMATS = OrderedDict([
+    ('FASTA_ARCHIVE', 'FASTA'),
+    ('NEXUS_ARCHIVE', 'NEXUS'),
+    ('PHYLIP_ARCHIVE', 'PHYLIP'),
+])
+
+FILE_EXTENSIONS = {
+    'FASTA': 'fasta',
+    'NEXUS': 'nex',
+    'PHYLIP': 'phy',
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+# fixed date for the entries, so that the same dataset gives the same archive
+ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+unsafe_chars_re = re.compile(r'[^\w.-]')
+
+
+def is_archive_format(file_format) -> bool:
+    return file_format in ARCHIVE_FORMATS
+
+
+def make_entry_name(gene_code: str, extension: str) -> str:
+    return '{}.{}'.format(unsafe_chars_re.sub('_', gene_code), extension)
+
+
+def make_zip_info(name: str, compress_type=zipfile.ZIP_DEFLATED) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=ENTRY_DATE_TIME)
+    info.compress_type = compress_type
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def get_file_checksum(file_path: str) -> str:
+    checksum = hashlib.sha256()
+    with open(file_path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def count_taxa_with_data(seq_objs) -> int:
+    return sum(1 for seq_obj in seq_objs if str(seq_obj.seq).strip('?-N'))
+
+
+class GeneArchiveHandler(object):
+    """Writes one file per gene to a zip archive in ``settings.DATASET_FILES_ROOT``.
+
+    Has the same attributes as ``DatasetHandler``. With more than one
+    ``workers``, genes are formatted in threads while the archive is
+    compressing and writing the genes before them.
+
+    Attributes:
+        ``genes``: list of (gene_code, seq_objs).
+        ``format_gene``: callable taking a gene_code, its seq_objs and the
+                         format, and returning a ``dataset_creator.Dataset``
+                         or None if the gene could not be formatted.
+        ``manifest``: list of dicts describing the genes in the archive.
+
+    """
+    def __init__(self, genes: List[Tuple[str, list]],
+                 format_gene: Callable[[str, list, str], Any],
+                 file_format: str, workers: int = None, progress=None):
+        self.genes = genes
+        self.format_gene = format_gene
+        self.file_format = file_format
+        self.entry_format = ARCHIVE_FORMATS[file_format]
+        if workers is None:
+            workers = settings.DATASET_ARCHIVE_WORKERS
+        self.workers = max(workers, 1)
+        self.progress = progress
+        self.dataset_file = os.path.join(
+            settings.DATASET_FILES_ROOT,
+            self.file_format + '_' + uuid.uuid4().hex + '.zip',
+        )
+        self.manifest = []
+        self.file_size = None
+        self.compressed_size = None
+        self.checksum = None
+
+    def save_dataset_to_file(self) -> None:
+        """Writes the archive. Its file size is the sum of the uncompressed
+        entries, and its checksum the sha256 of the zip file.
+        """
+        os.makedirs(os.path.dirname(self.dataset_file), exist_ok=True)
+        if self.progress:
+            self.progress.start_stage('writing file', total=len(self.genes))
+
+        file_size = 0
+        with zipfile.ZipFile(self.dataset_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for gene_code, entries, description in self.iter_formatted_genes():
+                for name, data in entries:
+                    archive.writestr(make_zip_info(name), data)
+                    file_size += len(data)
+                if description is not None:
+                    self.manifest.append(description)
+                if self.progress:
+                    self.progress.step()
+
+            manifest = json.dumps({
+                'format': self.entry_format,
+                'genes': self.manifest,
+            }, indent=2).encode('utf-8')
+            archive.writestr(make_zip_info(MANIFEST_NAME), manifest)
+            file_size += len(manifest)
+
+        self.file_size = file_size
+        self.compressed_size = os.path.getsize(self.dataset_file)
+        self.checksum = get_file_checksum(self.dataset_file)
+
+    def iter_formatted_genes(self) -> Iterator[Tuple[str, List[Tuple[str, bytes]], Optional[Dict[str, Any]]]]:
+        """Yields the genes in order as (gene_code, entries, manifest item).
+
+        With threads, at most twice as many genes as workers are formatted
+        ahead of the one being written.
+        """
+        if self.workers == 1:
+            for gene_code, seq_objs in self.genes:
+                yield self.make_entries(gene_code, seq_objs)
+            return
+
+        genes = iter(self.genes)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque(
+                executor.submit(self.make_entries, gene_code, seq_objs)
+                for gene_code, seq_objs in itertools.islice(genes, self.workers * 2)
+            )
+            while pending:
+                future = pending.popleft()
+                for gene_code, seq_objs in itertools.islice(genes, 1):
+                    pending.append(executor.submit(self.make_entries, gene_code, seq_objs))
+                yield future.result()
+
+    def make_entries(self, gene_code: str, seq_objs: list):
+        taxa_with_data = count_taxa_with_data(seq_objs)
+        dataset = self.format_gene(gene_code, seq_objs, self.entry_format)
+        if not dataset:
+            return gene_code, [], None
+
+        extension = FILE_EXTENSIONS[self.entry_format]
+        file_name = make_entry_name(gene_code, extension)
+        entries = [(file_name, dataset.dataset_str.encode('utf-8'))]
+        description = {
+            'gene_code': gene_code,
+            'file': file_name,
+            'length': int(dataset.number_chars),
+            'taxa': int(dataset.number_taxa),
+            'taxa_with_data': taxa_with_data,
+        }
+        # as in PHYLIP datasets, the charset block goes in its own file
+        if self.entry_format == 'PHYLIP' and dataset.extra_dataset_str:
+            charsets_name = make_entry_name(gene_code, 'charsets.txt')
+            entries.append((charsets_name, dataset.extra_dataset_str.encode('utf-8')))
+            description['charsets'] = charsets_name
+        return gene_code, entries, description
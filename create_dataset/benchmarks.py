@@ -0,0 +1,154 @@
+"""Measures how dataset creation scales with the number of vouchers and genes.
+
+Synthetic data is created with the ``create_synthetic_db`` command, using
+its own prefix so that it can be removed afterwards. Results can be saved
+as JSON and compared with a baseline saved from another commit.
+"""
+import logging
+import platform
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from create_dataset.utils import CreateDataset
+from gene_table.views import GeneTable
+from overview_table.utils import OverviewTableMaker
+from public_interface.models import Genes, Vouchers
+from voucher_table.utils import VoucherTable
+
+
+log = logging.getLogger(__name__)
+
+
+FORMATS = ('NEXUS', 'PHYLIP', 'TNT', 'MEGA', 'FASTA', 'GenBankFASTA', 'Bankit')
+
+# tier name: (number of vouchers, number of genes)
+TIERS = OrderedDict([
+    ('small', (50, 5)),
+    ('medium', (500, 10)),
+    ('large', (2000, 20)),
+])
+
+PREFIX = 'BENCH'
+
+METRICS = ('wall_time', 'peak_memory', 'queries')
+
+
+def measure(func) -> Dict[str, Any]:
+    """Runs ``func`` and returns its wall time in seconds, the peak of
+    memory allocated by Python in bytes, and the number of SQL queries.
+    """
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        func()
+        wall_time = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_time': round(wall_time, 4),
+        'peak_memory': peak_memory,
+        'queries': len(queries),
+    }
+
+
+def make_dataset_cleaned_data(voucher_codes, gene_codes, file_format) -> Dict[str, Any]:
+    return {
+        'gene_codes': Genes.objects.filter(gene_code__in=gene_codes),
+        'geneset': None,
+        'taxonset': None,
+        'voucher_codes': '\n'.join(voucher_codes),
+        'file_format': file_format,
+        'outgroup': '',
+        'positions': ['ALL'],
+        'partition_by_positions': 'by gene',
+        'translations': False,
+        'aminoacids': False,
+        'degen_translations': None,
+        'special': False,
+        'taxon_names': ['CODE', 'GENUS', 'SPECIES'],
+        'number_genes': None,
+        'introns': 'YES',
+    }
+
+
+def get_subjects(voucher_codes, gene_codes, formats):
+    """Returns dict of name: function to benchmark."""
+    subjects = OrderedDict()
+    for file_format in formats:
+        cleaned_data = make_dataset_cleaned_data(voucher_codes, gene_codes, file_format)
+        subjects[file_format] = lambda cleaned_data=cleaned_data: CreateDataset(cleaned_data)
+
+    gene_table_data = make_dataset_cleaned_data(voucher_codes, gene_codes, 'FASTA')
+    subjects['GeneTable'] = lambda: GeneTable(dict(gene_table_data))
+
+    voucher_table_data = make_dataset_cleaned_data(voucher_codes, gene_codes, 'FASTA')
+    voucher_table_data.update({
+        'voucher_info': ['code', 'genus', 'species'],
+        'collector_info': ['country'],
+        'gene_info': 'NUMBER OF BASES',
+        'field_delimitor': 'COMMA',
+    })
+    subjects['VoucherTable'] = lambda: VoucherTable(voucher_table_data).create_csv_file()
+    subjects['OverviewTable'] = lambda: list(OverviewTableMaker().items)
+    return subjects
+
+
+def run_benchmarks(tiers=None, formats=FORMATS, seed=1) -> Dict[str, Any]:
+    """Creates synthetic data for each tier and measures every subject.
+
+    Returns:
+        dict with the environment and the results keyed by ``tier:subject``.
+    """
+    if tiers is None:
+        tiers = TIERS
+
+    results = OrderedDict()
+    for tier, (number_vouchers, number_genes) in tiers.items():
+        call_command(
+            'create_synthetic_db', prefix=PREFIX, vouchers=number_vouchers,
+            genes=number_genes, seed=seed, verbosity=0,
+        )
+        voucher_codes = list(
+            Vouchers.objects.filter(code__startswith=PREFIX + '-')
+            .order_by('code').values_list('code', flat=True)
+        )
+        gene_codes = list(
+            Genes.objects.filter(gene_code__startswith=PREFIX + '_')
+            .order_by('gene_code').values_list('gene_code', flat=True)
+        )
+        try:
+            for subject, func in get_subjects(voucher_codes, gene_codes, formats).items():
+                log.info(f'benchmarking {subject} with {tier} tier')
+                result = measure(func)
+                result.update({'vouchers': number_vouchers, 'genes': number_genes})
+                results[f'{tier}:{subject}'] = result
+        finally:
+            call_command('create_synthetic_db', prefix=PREFIX, clear=True, verbosity=0)
+
+    return {
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'results': results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold=0.2) -> List[str]:
+    """Returns lines describing each metric that is worse than the baseline
+    by more than ``threshold`` (as fraction).
+    """
+    regressions = []
+    for key, result in current['results'].items():
+        if key not in baseline['results']:
+            continue
+        for metric in METRICS:
+            old = baseline['results'][key][metric]
+            new = result[metric]
+            if old and (new - old) / old > threshold:
+                regressions.append(f'{key} {metric}: {old} -> {new}')
+    return regressions
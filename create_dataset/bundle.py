@@ -0,0 +1,207 @@
+"""Binary matrix bundles for analysis pipelines.
+
+A bundle is a zip file with uncompressed entries:
+
+* ``matrix.npy``: ``uint8`` array of ASCII characters, one row per taxon.
+  Once extracted it can be opened without copies with
+  ``numpy.load('matrix.npy', mmap_mode='r')``.
+* ``taxa.tsv``: voucher code and taxon label of each row, in order.
+* ``manifest.json``: shape of the matrix and the partitions of each gene.
+
+Sequences are not formatted as text, the matrix is written as it is.
+"""
+import json
+import os
+import re
+import uuid
+import zipfile
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+from django.conf import settings
+
+from .alignment import AlignmentMatrix
+from .archive import MANIFEST_NAME, get_file_checksum, make_zip_info
+
+
+MATRIX_NAME = 'matrix.npy'
+TAXA_NAME = 'taxa.tsv'
+
+# taxonomy fields in taxon labels, as in datasets made by dataset_creator
+LABEL_FIELDS = (
+    'orden', 'superfamily', 'family', 'subfamily', 'tribe', 'subtribe',
+    'genus', 'species', 'subspecies', 'author', 'hostorg', 'country',
+    'specific_locality',
+)
+
+# codon positions in each partition, for each partitioning scheme
+PARTITION_POSITIONS = {
+    'by gene': None,
+    'by codon position': ((1,), (2,), (3,)),
+    '1st-2nd, 3rd': ((1, 2), (3,)),
+}
+
+POSITION_NAMES = {
+    (1,): '1st',
+    (2,): '2nd',
+    (3,): '3rd',
+    (1, 2): '1st-2nd',
+}
+
+
+def make_taxon_label(seq_obj) -> str:
+    label = seq_obj.voucher_code.replace('-', '_')
+    if seq_obj.taxonomy:
+        for field in LABEL_FIELDS:
+            if field in seq_obj.taxonomy:
+                label += '_' + seq_obj.taxonomy[field]
+    label = re.sub('_+', '_', label.replace(' ', '_'))
+    return label.rstrip('_')
+
+
+def make_alignment_from_seq_objs(seq_objs, gene_lengths: Dict[str, int]) -> AlignmentMatrix:
+    """Builds the matrix of ``SeqRecordExpanded`` objects without formatting them."""
+    # taxa and genes in the order of seq_objs
+    taxa = list(dict.fromkeys(seq_obj.voucher_code for seq_obj in seq_objs))
+    genes = OrderedDict()
+    sequences = {}
+    for seq_obj in seq_objs:
+        if seq_obj.gene_code not in genes:
+            genes[seq_obj.gene_code] = (
+                seq_obj.gene_code,
+                gene_lengths.get(seq_obj.gene_code),
+                seq_obj.reading_frame,
+            )
+        sequences[(seq_obj.voucher_code, seq_obj.gene_code)] = str(seq_obj.seq)
+    genes = list(genes.values())
+    return AlignmentMatrix.from_sequences(taxa, genes, sequences)
+
+
+def make_ranges(columns: np.ndarray) -> List[List[int]]:
+    """Splits sorted 0-based columns in runs of equal steps.
+
+    Returns:
+        list of [first site, last site, step], 1-based as in NEXUS charsets
+        such as ``1-300\\3``.
+    """
+    ranges = []
+    index = 0
+    while index < len(columns):
+        start = int(columns[index])
+        if index + 1 == len(columns):
+            ranges.append([start + 1, start + 1, 1])
+            break
+        step = int(columns[index + 1] - columns[index])
+        end_index = index + 1
+        while end_index + 1 < len(columns) and columns[end_index + 1] - columns[end_index] == step:
+            end_index += 1
+        ranges.append([start + 1, int(columns[end_index]) + 1, step])
+        index = end_index + 1
+    return ranges
+
+
+def make_partitions(matrix: AlignmentMatrix, codon_positions: str,
+                    partitioning: str) -> List[Dict[str, Any]]:
+    """Partition map of the matrix once ``codon_positions`` are selected.
+
+    Each gene has its sites and the sites of its partitions. Sites before
+    the first full codon are in the gene but in no codon position partition.
+    """
+    partition_positions = PARTITION_POSITIONS[partitioning]
+
+    genes = []
+    start = 0
+    for gene_code in matrix.genes:
+        selected_mask = matrix.get_codon_position_mask(codon_positions, gene_code)
+        end = start + int(selected_mask.sum())
+        gene = {
+            'gene_code': gene_code,
+            'sites': [start + 1, end],
+            'partitions': [],
+        }
+        genes.append(gene)
+
+        if partition_positions is None:
+            gene['partitions'].append({
+                'name': gene_code,
+                'sites': make_ranges(np.arange(start, end)),
+            })
+        else:
+            for positions in partition_positions:
+                mask = np.zeros(len(selected_mask), dtype=bool)
+                for position in positions:
+                    mask |= matrix.get_codon_position_mask(POSITION_NAMES[(position,)], gene_code)
+                # columns of the partition among the selected columns
+                columns = np.flatnonzero(mask[selected_mask]) + start
+                if len(columns):
+                    gene['partitions'].append({
+                        'name': f'{gene_code}_{POSITION_NAMES[positions]}',
+                        'codon_positions': list(positions),
+                        'sites': make_ranges(columns),
+                    })
+        start = end
+    return genes
+
+
+class MatrixBundleHandler(object):
+    """Writes a binary matrix bundle to ``settings.DATASET_FILES_ROOT``.
+
+    Has the same attributes as ``DatasetHandler``.
+    """
+    file_format = 'NPY'
+
+    def __init__(self, matrix: AlignmentMatrix, labels: Dict[str, str],
+                 partitions: List[Dict[str, Any]], codon_positions: str,
+                 partitioning: str):
+        self.matrix = matrix
+        self.labels = labels
+        self.partitions = partitions
+        self.codon_positions = codon_positions
+        self.partitioning = partitioning
+        self.dataset_file = os.path.join(
+            settings.DATASET_FILES_ROOT,
+            self.file_format + '_' + uuid.uuid4().hex + '.zip',
+        )
+        self.file_size = None
+        self.compressed_size = None
+        self.checksum = None
+
+    def get_manifest(self) -> Dict[str, Any]:
+        return {
+            'format': self.file_format,
+            'matrix': MATRIX_NAME,
+            'taxa': TAXA_NAME,
+            'shape': list(self.matrix.data.shape),
+            'dtype': 'uint8',
+            'encoding': 'ascii',
+            'missing': '?',
+            'codon_positions': self.codon_positions,
+            'partitioning': self.partitioning,
+            'genes': self.partitions,
+        }
+
+    def save_dataset_to_file(self) -> None:
+        """Writes the bundle. Its file size is the sum of the entries and
+        its checksum the sha256 of the zip file.
+        """
+        os.makedirs(os.path.dirname(self.dataset_file), exist_ok=True)
+        taxa = ''.join(
+            f'{taxon}\t{self.labels.get(taxon, taxon)}\n' for taxon in self.matrix.taxa
+        ).encode('utf-8')
+        manifest = json.dumps(self.get_manifest(), indent=2).encode('utf-8')
+
+        with zipfile.ZipFile(self.dataset_file, 'w', zipfile.ZIP_STORED,
+                             allowZip64=True) as bundle:
+            # the array is written straight into the zip file, without copies
+            matrix_info = make_zip_info(MATRIX_NAME, zipfile.ZIP_STORED)
+            with bundle.open(matrix_info, 'w', force_zip64=True) as handle:
+                np.lib.format.write_array(handle, np.ascontiguousarray(self.matrix.data),
+                                          allow_pickle=False)
+            bundle.writestr(make_zip_info(TAXA_NAME, zipfile.ZIP_STORED), taxa)
+            bundle.writestr(make_zip_info(MANIFEST_NAME, zipfile.ZIP_STORED), manifest)
+
+        with zipfile.ZipFile(self.dataset_file) as bundle:
+            self.file_size = sum(info.file_size for info in bundle.infolist())
+        self.compressed_size = os.path.getsize(self.dataset_file)
+        self.checksum = get_file_checksum(self.dataset_file)
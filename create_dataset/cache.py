@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from core.utils import get_voucher_codes, get_gene_codes
+from create_dataset.models import CachedDataset, Dataset
+from public_interface.models import Genes, Sequences, Vouchers
+
+
+log = logging.getLogger(__name__)
+
+
+CACHED_OPTIONS = (
+    'file_format', 'outgroup', 'positions', 'partition_by_positions',
+    'translations', 'aminoacids', 'degen_translations', 'special',
+    'taxon_names', 'number_genes', 'introns',
+)
+
+
+def make_cache_key(cleaned_data) -> str:
+    """Hash of the resolved vouchers, genes, dataset options and data version.
+
+    Two requests get the same key only if they would produce the same dataset
+    from the same rows in our database.
+    """
+    voucher_codes = get_voucher_codes(cleaned_data)
+    gene_codes = get_gene_codes(cleaned_data)
+
+    options = dict()
+    for option in CACHED_OPTIONS:
+        value = cleaned_data.get(option)
+        if isinstance(value, (list, tuple)):
+            value = sorted(value)
+        options[option] = value or None
+
+    payload = {
+        'voucher_codes': voucher_codes,
+        'gene_codes': gene_codes,
+        'options': options,
+        'data_version': get_data_version(voucher_codes, gene_codes),
+    }
+    payload = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_data_version(voucher_codes, gene_codes) -> Dict[str, Any]:
+    """Stamp that changes whenever the rows used by a dataset are modified.
+
+    Counts are included so that deleted sequences or vouchers also change
+    the stamp.
+    """
+    sequences = Sequences.objects.filter(
+        code__in=voucher_codes,
+        gene__gene_code__in=gene_codes,
+    ).aggregate(count=Count('id'), time_edited=Max('time_edited'))
+    vouchers = Vouchers.objects.filter(
+        code__in=voucher_codes,
+    ).aggregate(count=Count('code'), modified=Max('modified'))
+    genes = Genes.objects.filter(
+        gene_code__in=gene_codes,
+    ).order_by('gene_code').values_list('gene_code', 'length', 'reading_frame', 'genetic_code')
+    return {
+        'sequences': sequences,
+        'vouchers': vouchers,
+        'genes': list(genes),
+    }
+
+
+def get_cached_dataset(key: str) -> Optional[Dataset]:
+    """Returns finished dataset for this key and marks it as recently used."""
+    try:
+        cached = CachedDataset.objects.select_related('dataset').get(key=key)
+    except CachedDataset.DoesNotExist:
+        return None
+
+    CachedDataset.objects.filter(id=cached.id).update(last_used=timezone.now())
+    log.debug(f'dataset cache hit {key} -> {cached.dataset_id}')
+    return cached.dataset
+
+
+def cache_finished_job(task_uuid: str) -> None:
+    """Adds the finished datasets of a job to the cache.
+
+    Datasets that were given a ``cache_key`` when scheduling are cached
+    once they, and their sister dataset if any, are finished without
+    errors. Bankit jobs create two sister datasets (nucleotides and
+    aminoacids), and batch jobs several independent datasets, that share
+    the same ``task_uuid``.
+    """
+    datasets = list(Dataset.objects.filter(task_uuid=task_uuid))
+    cached_any = False
+    for dataset in datasets:
+        if not dataset.cache_key or not (dataset.file_path or dataset.content):
+            continue
+        group = [
+            other for other in datasets
+            if other == dataset
+            or other.id == dataset.sister_dataset_id
+            or other.sister_dataset_id == dataset.id
+        ]
+        if any(other.completed is None or other.errors for other in group):
+            continue
+
+        CachedDataset.objects.update_or_create(
+            key=dataset.cache_key,
+            defaults={
+                'dataset': dataset,
+                'size': sum(get_dataset_size(other) for other in group),
+                'last_used': timezone.now(),
+            },
+        )
+        cached_any = True
+    if cached_any:
+        evict_cached_datasets()
+
+
+def get_dataset_size(dataset: Dataset) -> int:
+    return dataset.compressed_size or dataset.file_size or len(dataset.content or '')
+
+
+def evict_cached_datasets(max_size: int = None) -> None:
+    """Drops least recently used entries until the cache fits ``max_size`` bytes.
+
+    Only the cache entries are removed, the datasets are kept.
+    """
+    if max_size is None:
+        max_size = settings.DATASET_CACHE_MAX_SIZE
+
+    total_size = 0
+    to_evict = []
+    entries = CachedDataset.objects.order_by('-last_used').values_list('id', 'size')
+    for cached_id, size in entries:
+        total_size += size
+        if total_size > max_size:
+            to_evict.append(cached_id)
+
+    if to_evict:
+        log.debug(f'evicting {len(to_evict)} datasets from cache')
+        CachedDataset.objects.filter(id__in=to_evict).delete()
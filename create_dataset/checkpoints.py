@@ -0,0 +1,116 @@
+"""Gene blocks of dataset jobs are kept on disk as they are built.
+
+When a job hits its soft time limit it is queued again, and the new run
+skips the genes already built. Checkpoints are removed when the dataset is
+saved, and by ``expire_datasets`` for jobs that never finished.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from .progress import DatasetProgress
+from .utils import GeneBlockCreator
+
+
+log = logging.getLogger(__name__)
+
+
+def get_checkpoints_root() -> str:
+    return os.path.join(settings.DATASET_FILES_ROOT, 'checkpoints')
+
+
+def split_gene_codes(gene_codes) -> List[List[str]]:
+    """Genes of each block, see ``settings.DATASET_CHECKPOINT_GENES``."""
+    genes_per_block = settings.DATASET_CHECKPOINT_GENES
+    return [
+        list(gene_codes[i:i + genes_per_block])
+        for i in range(0, len(gene_codes), genes_per_block)
+    ]
+
+
+class DatasetCheckpoint(object):
+    """Gene blocks of one dataset, stored as gzip JSON files.
+
+    Nothing is stored for datasets without id.
+    """
+    def __init__(self, dataset_id):
+        self.dataset_id = dataset_id
+        if dataset_id is None:
+            self.path = None
+        else:
+            self.path = os.path.join(get_checkpoints_root(), str(dataset_id))
+
+    def get_block_path(self, gene_codes) -> str:
+        digest = hashlib.sha1('\n'.join(gene_codes).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, f'{digest}.json.gz')
+
+    def load_block(self, gene_codes) -> Optional[Dict[str, Any]]:
+        if self.path is None:
+            return None
+        try:
+            with gzip.open(self.get_block_path(gene_codes), 'rt') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+
+    def save_block(self, gene_codes, block: Dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        block_path = self.get_block_path(gene_codes)
+        # the job can be stopped at any moment, so blocks are never half written
+        tmp_path = block_path + '.tmp'
+        with gzip.open(tmp_path, 'wt') as handle:
+            json.dump(block, handle)
+        os.replace(tmp_path, block_path)
+
+    def count_blocks(self, gene_codes) -> int:
+        """Number of the blocks of these genes that are saved."""
+        if self.path is None:
+            return 0
+        return sum(
+            os.path.isfile(self.get_block_path(batch)) for batch in split_gene_codes(gene_codes)
+        )
+
+    def delete(self) -> None:
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def build_gene_blocks(cleaned_data, gene_codes, dataset_obj_id=None,
+                      progress: DatasetProgress = None,
+                      total_genes: int = None) -> List[Dict[str, Any]]:
+    """Builds the blocks of ``settings.DATASET_CHECKPOINT_GENES`` genes,
+    loading those already built by a previous run of the job.
+
+    Progress is counted in genes. With ``total_genes``, the genes of the
+    dataset are built by several parallel tasks, and the genes built by
+    all of them are counted.
+    """
+    checkpoint = DatasetCheckpoint(dataset_obj_id)
+    batches = split_gene_codes(gene_codes)
+    if progress and total_genes:
+        progress.start_shared_stage('building sequences', total=total_genes)
+    elif progress:
+        progress.start_stage('building sequences', total=len(gene_codes))
+
+    blocks = []
+    for batch in batches:
+        block = checkpoint.load_block(batch)
+        if block is None:
+            block = GeneBlockCreator(cleaned_data, batch).to_block()
+            checkpoint.save_block(batch, block)
+            if progress and total_genes:
+                progress.step_shared(len(batch))
+        else:
+            log.debug(f'dataset {dataset_obj_id} genes {batch} loaded from checkpoint')
+        if progress and not total_genes:
+            progress.step(len(batch))
+        blocks.append(block)
+    return blocks
@@ -0,0 +1,102 @@
+import gzip
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from create_dataset.models import Dataset
+
+
+accepts_gzip_re = re.compile(r'^\s*gzip\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$', re.IGNORECASE)
+
+
+def accepts_gzip(request) -> bool:
+    """Whether Accept-Encoding lists gzip, without ``q=0``."""
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = accepts_gzip_re.match(coding)
+        if match:
+            try:
+                return float(match.group(1) or 1) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def make_download_response(request, dataset: Dataset, file_name: str, as_gzip: bool = False):
+    """Response with the dataset as attachment.
+
+    Compressed dataset files are sent as they are with ``Content-Encoding:
+    gzip`` if the client accepts it, and decompressed on the fly otherwise.
+    With ``as_gzip`` the client gets a ``.gz`` file instead. Per-gene
+    archives are always sent as zip files.
+    """
+    Dataset.objects.filter(id=dataset.id).update(last_downloaded=timezone.now())
+    if dataset.is_archive() and dataset.has_file():
+        return FileResponse(
+            open(dataset.get_file_path(), 'rb'),
+            as_attachment=True,
+            filename=os.path.splitext(file_name)[0] + '.zip',
+            content_type='application/zip',
+        )
+
+    if as_gzip:
+        return make_gzip_file_response(dataset, file_name + '.gz')
+
+    if not dataset.has_file():
+        response = HttpResponse(dataset.content, content_type='text/plain')
+        response['Content-Disposition'] = 'attachment; filename={}'.format(file_name)
+        return response
+
+    if not dataset.is_compressed():
+        return FileResponse(
+            dataset.open_file('rb'),
+            as_attachment=True,
+            filename=file_name,
+            content_type='text/plain',
+        )
+
+    if accepts_gzip(request):
+        response = FileResponse(
+            open(dataset.get_file_path(), 'rb'),
+            as_attachment=True,
+            filename=file_name,
+            content_type='text/plain',
+        )
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(
+            iter_file(dataset.open_file('rb')),
+            content_type='text/plain',
+        )
+        response['Content-Disposition'] = 'attachment; filename={}'.format(file_name)
+        if dataset.file_size is not None:
+            response['Content-Length'] = dataset.file_size
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def make_gzip_file_response(dataset: Dataset, file_name: str):
+    if dataset.has_file() and dataset.is_compressed():
+        return FileResponse(
+            open(dataset.get_file_path(), 'rb'),
+            as_attachment=True,
+            filename=file_name,
+            content_type='application/gzip',
+        )
+
+    # datasets stored before compression was used
+    content = dataset.get_content().encode('utf-8')
+    response = HttpResponse(gzip.compress(content), content_type='application/gzip')
+    response['Content-Disposition'] = 'attachment; filename={}'.format(file_name)
+    return response
+
+
+def iter_file(handle, chunk_size=64 * 1024):
+    with handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -13,6 +13,10 @@ class CreateDatasetForm(BaseDatasetForm):
             ('MEGA', 'MEGA format'),
             ('FASTA', 'Unaligned FASTA format'),
             ('Bankit', 'Bankit format'),
+            ('FASTA_ARCHIVE', 'Zip archive, one FASTA file per gene'),
+            ('NEXUS_ARCHIVE', 'Zip archive, one NEXUS file per gene'),
+            ('PHYLIP_ARCHIVE', 'Zip archive, one PHYLIP file per gene'),
+            ('NPY', 'Binary matrix for NumPy (.npy in a zip archive)'),
         ],
         widget=forms.RadioSelect(),
         required=True,
@@ -0,0 +1,51 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from create_dataset.models import Dataset
+from create_dataset.nexus import DatasetHandler
+
+
+class Command(BaseCommand):
+    help = 'Moves datasets stored in the database, or in uncompressed files, ' \
+           'to gzip files in DATASET_FILES_ROOT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        count = 0
+        # zip archives are compressed already, and hold more than one file
+        queryset = Dataset.objects.filter(completed__isnull=False).exclude(
+            file_path__endswith='.gz',
+        ).exclude(
+            file_path__endswith='.zip',
+        )
+        for dataset_id in queryset.values_list('id', flat=True).iterator(
+            chunk_size=options['batch_size'],
+        ):
+            # load datasets one by one, as their content can be large
+            dataset = Dataset.objects.get(id=dataset_id)
+            if self.compress_dataset(dataset):
+                count += 1
+        self.stdout.write(f'Compressed {count} datasets')
+
+    def compress_dataset(self, dataset) -> bool:
+        content = dataset.get_content()
+        if not content:
+            return False
+
+        old_file_path = dataset.get_file_path()
+        dataset_handler = DatasetHandler(content, 'dataset')
+        dataset_handler.save_dataset_to_file()
+        dataset.file_path = os.path.basename(dataset_handler.dataset_file)
+        dataset.file_size = dataset_handler.file_size
+        dataset.compressed_size = dataset_handler.compressed_size
+        dataset.checksum = dataset_handler.checksum
+        dataset.content = None
+        dataset.save(update_fields=[
+            'file_path', 'file_size', 'compressed_size', 'checksum', 'content',
+        ])
+        if old_file_path and os.path.isfile(old_file_path):
+            os.remove(old_file_path)
+        return True
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from create_dataset.retention import expire_datasets
+
+
+class Command(BaseCommand):
+    help = 'Deletes datasets that are too old, that nobody downloaded for a ' \
+           'while or that go over the storage budget, and files in ' \
+           'DATASET_FILES_ROOT that belong to no dataset. Also run every ' \
+           'night by celery beat.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Datasets deleted per query, defaults to '
+                                 'DATASET_RETENTION_BATCH_SIZE.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count what would be deleted.')
+
+    def handle(self, *args, **options):
+        stats = expire_datasets(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            action = 'Would delete'
+        else:
+            action = 'Deleted'
+        self.stdout.write(
+            f'{action} {stats["datasets"]} datasets and {stats["files"]} files '
+            f'({stats["bytes"]} bytes), and {stats["checkpoints"]} checkpoints'
+        )
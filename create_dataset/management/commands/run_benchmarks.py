@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from create_dataset.benchmarks import FORMATS, TIERS, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Times the creation of datasets and tables for synthetic databases ' \
+           'of several sizes. Records wall time, peak memory and number of ' \
+           'SQL queries. Use a test database, synthetic data is written to it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', default='small,medium',
+                            help='Comma separated sizes: {0}.'.format(', '.join(TIERS)))
+        parser.add_argument('--formats', default=','.join(FORMATS),
+                            help='Comma separated dataset formats.')
+        parser.add_argument('--output', help='Save results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare results with this JSON file.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed fraction of increase over the baseline.')
+
+    def handle(self, *args, **options):
+        tiers = {}
+        for tier in options['tiers'].split(','):
+            if tier not in TIERS:
+                raise CommandError(f'Unknown tier {tier}')
+            tiers[tier] = TIERS[tier]
+        formats = [i for i in options['formats'].split(',') if i]
+
+        results = run_benchmarks(tiers, formats)
+        for key, result in results['results'].items():
+            self.stdout.write(
+                f'{key:<30} {result["wall_time"]:>10.3f}s {result["peak_memory"]:>14,d}B '
+                f'{result["queries"]:>6d} queries'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline'], 'r') as handle:
+                baseline = json.load(handle)
+            regressions = compare(baseline, results, options['threshold'])
+            for line in regressions:
+                self.stdout.write(f'Regression {line}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against baseline')
@@ -0,0 +1,57 @@
+import logging
+from collections import namedtuple
+
+from public_interface.models import Sequences
+
+
+log = logging.getLogger(__name__)
+
+
+MatrixCell = namedtuple('MatrixCell', ['sequence', 'accession'])
+
+
+class SequenceMatrix(object):
+    """Sequences for a list of vouchers and genes, indexed in memory.
+
+    All the sequences needed to build a dataset are read from the database in
+    one streamed query. Lookups for each voucher and gene are done against
+    the in-memory index so that the number of queries does not grow with the
+    size of the dataset.
+
+    Attributes:
+        ``cells``: dict with ``(voucher_code, gene_code)`` keys and
+                   ``MatrixCell(sequence, accession)`` values.
+
+    """
+    chunk_size = 2000
+
+    def __init__(self, voucher_codes, gene_codes):
+        self.voucher_codes = voucher_codes
+        self.gene_codes = gene_codes
+        self.cells = self.load()
+
+    def load(self):
+        queryset = Sequences.objects.filter(
+            code__in=self.voucher_codes,
+            gene__gene_code__in=self.gene_codes,
+        ).values_list(
+            'code_id', 'gene__gene_code', 'sequences', 'accession',
+        ).order_by('code_id', 'id')
+
+        cells = dict()
+        for code, gene_code, sequence, accession in queryset.iterator(chunk_size=self.chunk_size):
+            # keep the first sequence in case of duplicated voucher/gene rows
+            if (code, gene_code) not in cells:
+                cells[(code, gene_code)] = MatrixCell(sequence, accession)
+        log.debug(f'loaded {len(cells)} sequences into matrix')
+        return cells
+
+    def get(self, voucher_code, gene_code):
+        """Returns MatrixCell or None if there is no sequence in the database."""
+        return self.cells.get((voucher_code, gene_code))
+
+    def __contains__(self, key):
+        return key in self.cells
+
+    def __len__(self):
+        return len(self.cells)
@@ -0,0 +1,153 @@
+import logging
+import resource
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+
+log = logging.getLogger(__name__)
+
+
+# name of the stage measured before the first stage is started
+FIRST_STAGE = 'preparing'
+
+
+def get_max_rss() -> int:
+    """Peak resident memory of this process in bytes.
+
+    Celery workers run many jobs in the same process, so this is the peak of
+    the worker so far, not of one job.
+    """
+    # kilobytes in Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class JobMetrics(object):
+    """Measures wall time, SQL queries and memory of the stages of a job.
+
+    Measuring is done inside ``with`` blocks, and can be resumed later with
+    another ``with`` block. Stages follow the stages of ``DatasetProgress``.
+    SQL queries are counted with an execute wrapper of the database
+    connection. Python memory is traced with ``tracemalloc`` only if
+    ``settings.DATASET_TRACE_MEMORY`` is true, as it slows down the job.
+
+    Attributes:
+        ``stages``: OrderedDict of stage: dict of measures.
+        ``input``: dimensions of the dataset.
+        ``output``: sizes of the dataset file.
+        ``gene_blocks``: metrics of the gene blocks of parallel jobs.
+
+    """
+    def __init__(self, trace_memory=None):
+        if trace_memory is None:
+            trace_memory = getattr(settings, 'DATASET_TRACE_MEMORY', False)
+        self.trace_memory = trace_memory
+        self.stages = OrderedDict()
+        self.stage = None
+        self.stage_started = None
+        self.input = {}
+        self.output = {}
+        self.gene_blocks = []
+        self.started_tracing = False
+        self.running = False
+
+    def __enter__(self):
+        if self.running:
+            return self
+        self.running = True
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        connection.execute_wrappers.append(self)
+        self.start_stage(self.stage or FIRST_STAGE)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.running:
+            return
+        self.stop_stage()
+        connection.execute_wrappers.remove(self)
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.running = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper that times the queries of the current stage."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if self.stage is not None:
+                measures = self.stages[self.stage]
+                measures['queries'] += 1
+                measures['query_time'] += time.perf_counter() - start
+
+    def start_stage(self, stage: str) -> None:
+        if not self.running:
+            self.stage = stage
+            return
+        if self.stage_started is not None:
+            self.stop_stage()
+        self.stage = stage
+        self.stages.setdefault(stage, {
+            'wall_time': 0.0,
+            'queries': 0,
+            'query_time': 0.0,
+            'peak_memory': None,
+        })
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.stage_started = time.perf_counter()
+
+    def stop_stage(self) -> None:
+        if self.stage_started is None:
+            return
+        measures = self.stages[self.stage]
+        measures['wall_time'] += time.perf_counter() - self.stage_started
+        if tracemalloc.is_tracing():
+            _, peak_memory = tracemalloc.get_traced_memory()
+            measures['peak_memory'] = max(measures['peak_memory'] or 0, peak_memory)
+        self.stage_started = None
+
+    def set_input(self, vouchers: int, genes: int, total_bp: int) -> None:
+        self.input = {'vouchers': vouchers, 'genes': genes, 'total_bp': total_bp}
+
+    def set_output(self, file_size: Optional[int], compressed_size: Optional[int]) -> None:
+        self.output = {'file_size': file_size, 'compressed_size': compressed_size}
+
+    def add_gene_blocks(self, gene_blocks: List[Dict[str, Any]]) -> None:
+        self.gene_blocks += [item for item in gene_blocks if item]
+
+    def to_dict(self) -> Dict[str, Any]:
+        # a list because jsonb does not keep the order of keys
+        stages = [
+            dict(
+                measures,
+                stage=stage,
+                wall_time=round(measures['wall_time'], 4),
+                query_time=round(measures['query_time'], 4),
+            )
+            for stage, measures in self.stages.items()
+        ]
+        peak_memories = [
+            measures['peak_memory'] for measures in stages
+            if measures['peak_memory'] is not None
+        ]
+        metrics = {
+            'wall_time': round(sum(i['wall_time'] for i in stages), 4),
+            'queries': sum(i['queries'] for i in stages),
+            'query_time': round(sum(i['query_time'] for i in stages), 4),
+            'peak_memory': max(peak_memories) if peak_memories else None,
+            'max_rss': get_max_rss(),
+            'stages': stages,
+            'input': self.input,
+            'output': self.output,
+        }
+        if self.gene_blocks:
+            metrics['gene_blocks'] = self.gene_blocks
+        return metrics
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_dataset', '0009_alter_dataset_errors_alter_dataset_warnings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='CachedDataset',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('last_used', models.DateTimeField(db_index=True)),
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='create_dataset.dataset')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_dataset', '0010_dataset_cache_key_cacheddataset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='file_path',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
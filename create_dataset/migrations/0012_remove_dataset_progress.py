@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_dataset', '0011_dataset_checksum_dataset_file_path_dataset_file_size'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dataset',
+            name='progress',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_dataset', '0012_remove_dataset_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='compressed_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
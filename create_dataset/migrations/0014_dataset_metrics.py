@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_dataset', '0013_dataset_compressed_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='metrics',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
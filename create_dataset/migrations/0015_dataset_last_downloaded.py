@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_dataset', '0014_dataset_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='last_downloaded',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,15 @@
+import gzip
+import io
+import os
+import zipfile
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
 from django.db.models import JSONField
 
+from create_dataset.archive import MANIFEST_NAME
+
 
 class Dataset(models.Model):
     user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
@@ -16,4 +24,76 @@ class Dataset(models.Model):
     # eg. Phylip datasets require an extra part for the gene definitions
     charset_block = models.TextField(null=True)
     task_uuid = models.TextField(null=True, blank=True)
-    progress = models.CharField(max_length=200, blank=True, null=True)
+    # hash of the dataset inputs, used to find identical finished datasets
+    cache_key = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    # finished datasets are written to disk, relative to settings.DATASET_FILES_ROOT
+    file_path = models.TextField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    # size on disk, files ending in .gz are gzip compressed
+    compressed_size = models.PositiveBigIntegerField(null=True, blank=True)
+    checksum = models.CharField(max_length=64, null=True, blank=True)
+    # timings, SQL queries, memory and sizes of the job, see JobMetrics
+    metrics = JSONField(blank=True, null=True)
+    # used to expire datasets nobody downloads any more
+    last_downloaded = models.DateTimeField(null=True, blank=True)
+
+    def get_file_path(self):
+        if self.file_path:
+            return os.path.join(settings.DATASET_FILES_ROOT, self.file_path)
+        return None
+
+    def is_compressed(self) -> bool:
+        return bool(self.file_path) and self.file_path.endswith('.gz')
+
+    def is_archive(self) -> bool:
+        """Per-gene archives and binary matrix bundles are zip files."""
+        return bool(self.file_path) and self.file_path.endswith('.zip')
+
+    def has_file(self) -> bool:
+        file_path = self.get_file_path()
+        return bool(file_path) and os.path.isfile(file_path)
+
+    def open_file(self, mode='rt'):
+        """Opens the dataset file, decompressing it if needed.
+
+        Archives are opened in their manifest.
+        """
+        if self.is_archive():
+            with zipfile.ZipFile(self.get_file_path()) as archive:
+                manifest = archive.read(MANIFEST_NAME)
+            if 'b' in mode:
+                return io.BytesIO(manifest)
+            return io.StringIO(manifest.decode('utf-8'))
+        if self.is_compressed():
+            return gzip.open(self.get_file_path(), mode)
+        return open(self.get_file_path(), mode.replace('t', ''))
+
+    def get_content(self) -> str:
+        """Returns the whole dataset as string.
+
+        Datasets created before they were written to disk are kept in the
+        ``content`` field.
+        """
+        if self.has_file():
+            with self.open_file() as handle:
+                return handle.read()
+        return self.content or ''
+
+    def preview(self, length=1500) -> str:
+        """Returns the beginning of the dataset without reading the whole file."""
+        if self.has_file():
+            with self.open_file() as handle:
+                return handle.read(length)
+        return (self.content or '')[:length]
+
+
+class CachedDataset(models.Model):
+    """Finished dataset that is served again for identical requests.
+
+    Entries are evicted by least recent use when the total size of cached
+    datasets grows over ``settings.DATASET_CACHE_MAX_SIZE``.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    dataset = models.OneToOneField(Dataset, on_delete=models.CASCADE)
+    size = models.PositiveBigIntegerField(default=0)
+    last_used = models.DateTimeField(db_index=True)
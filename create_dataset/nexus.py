@@ -1,28 +1,52 @@
+import gzip
+import hashlib
 import uuid
 import os
 
+from django.conf import settings
+
 
 class DatasetHandler(object):
+    """Writes datasets to gzip files in ``settings.DATASET_FILES_ROOT``.
+
+    Datasets are mostly runs of ``?``, ``-`` and four letters, so they are
+    much smaller compressed.
+    """
+    chunk_size = 1024 * 1024
+
     def __init__(self, dataset_str, file_format):
         self.dataset_str = dataset_str
         self.file_format = file_format
         self.warnings = []
         self.errors = []
 
-        self.cwd = os.path.dirname(__file__)
         self.guid = self.make_guid()
-        self.dataset_file = os.path.join(self.cwd,
-                                         'dataset_files',
-                                         self.file_format + '_' + self.guid + '.txt',
+        self.dataset_file = os.path.join(settings.DATASET_FILES_ROOT,
+                                         self.file_format + '_' + self.guid + '.txt.gz',
                                          )
-        self.aa_dataset_file = os.path.join(self.cwd,
-                                            'dataset_files',
-                                            self.file_format + '_aa_' + self.guid + '.txt',
-                                            )
+        self.file_size = None
+        self.compressed_size = None
+        self.checksum = None
 
     def save_dataset_to_file(self):
-        with open(self.dataset_file, 'w') as handle:
-            handle.write(self.dataset_str)
+        """Writes the dataset in chunks and keeps its size and sha256 checksum.
+
+        Size and checksum are of the uncompressed dataset.
+        """
+        os.makedirs(os.path.dirname(self.dataset_file), exist_ok=True)
+        checksum = hashlib.sha256()
+        file_size = 0
+        with open(self.dataset_file, 'wb') as raw_handle:
+            # mtime=0 so that the same dataset always gives the same file
+            with gzip.GzipFile(fileobj=raw_handle, mode='wb', mtime=0) as handle:
+                for start in range(0, len(self.dataset_str), self.chunk_size):
+                    chunk = self.dataset_str[start:start + self.chunk_size].encode('utf-8')
+                    handle.write(chunk)
+                    checksum.update(chunk)
+                    file_size += len(chunk)
+        self.file_size = file_size
+        self.compressed_size = os.path.getsize(self.dataset_file)
+        self.checksum = checksum.hexdigest()
 
     def make_guid(self):
         return uuid.uuid4().hex
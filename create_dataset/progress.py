@@ -0,0 +1,129 @@
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from django.core.cache import cache
+
+
+log = logging.getLogger(__name__)
+
+
+STAGES = (
+    'queued',
+    'loading sequences',
+    'building sequences',
+    'formatting dataset',
+    'writing file',
+    'finished',
+)
+
+# progress of abandoned jobs is dropped from the cache after one day
+PROGRESS_TIMEOUT = 24 * 60 * 60
+
+
+def get_progress_key(dataset_id) -> str:
+    return f'create_dataset:progress:{dataset_id}'
+
+
+def get_progress(dataset_id) -> Optional[Dict[str, Any]]:
+    """Returns the last progress published for a dataset, or None."""
+    return cache.get(get_progress_key(dataset_id))
+
+
+class DatasetProgress(object):
+    """Publishes the progress of a dataset job to the cache.
+
+    The results page and the progress endpoint read it from there, so that
+    running jobs do not need to write to the ``Dataset`` row.
+
+    Attributes:
+        ``dataset_id``: Dataset the progress belongs to. Nothing is
+                        published if it is None.
+        ``every``: publish only every this many steps of a stage.
+        ``metrics``: optional ``JobMetrics`` that is told when stages start.
+
+    """
+    every = 100
+
+    def __init__(self, dataset_id, every=None, metrics=None):
+        self.dataset_id = dataset_id
+        self.metrics = metrics
+        if every is not None:
+            self.every = every
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.stage_started = None
+
+    def start_stage(self, stage: str, total: int = 0, done: int = 0) -> None:
+        if stage not in STAGES:
+            raise ValueError(f'unknown stage {stage}')
+        self.stage = stage
+        self.done = done
+        self.total = total
+        self.stage_started = time.time()
+        if self.metrics is not None:
+            self.metrics.start_stage(stage)
+        self.publish()
+
+    def step(self, count: int = 1) -> None:
+        previous = self.done
+        self.done += count
+        if previous // self.every != self.done // self.every or self.done == self.total:
+            self.publish()
+
+    def start_shared_stage(self, stage: str, total: int) -> None:
+        """Starts a stage whose steps are done by several parallel tasks,
+        see ``step_shared``. Steps done by the other tasks are kept.
+        """
+        done = 0
+        if self.dataset_id is not None:
+            done = cache.get(self.get_shared_key(stage), 0)
+        self.start_stage(stage, total=total, done=min(done, total))
+
+    def step_shared(self, count: int = 1) -> None:
+        """Adds steps to those done by all tasks in the stage."""
+        if self.dataset_id is None:
+            self.step(count)
+            return
+        key = self.get_shared_key(self.stage)
+        cache.add(key, 0, PROGRESS_TIMEOUT)
+        self.done = min(cache.incr(key, count), self.total)
+        self.publish()
+
+    def get_shared_key(self, stage: str) -> str:
+        return f'{get_progress_key(self.dataset_id)}:{stage}'
+
+    def finish(self) -> None:
+        self.start_stage('finished')
+
+    def get_percent(self) -> int:
+        """Percent of the whole job, stages weighted equally."""
+        stage_index = STAGES.index(self.stage)
+        stage_fraction = self.done / self.total if self.total else 0
+        percent = (stage_index + min(stage_fraction, 1)) / (len(STAGES) - 1) * 100
+        return min(int(percent), 100)
+
+    def get_eta(self) -> Optional[int]:
+        """Seconds left to finish the current stage, if it can be estimated."""
+        if not self.total or not self.done:
+            return None
+        elapsed = time.time() - self.stage_started
+        return int(elapsed / self.done * (self.total - self.done))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.stage,
+            'done': self.done,
+            'total': self.total,
+            'percent': self.get_percent(),
+            'eta': self.get_eta(),
+        }
+
+    def publish(self) -> None:
+        if self.dataset_id is None:
+            return
+        progress = self.to_dict()
+        cache.set(get_progress_key(self.dataset_id), progress, PROGRESS_TIMEOUT)
+        log.info(f'dataset {self.dataset_id} {progress["stage"]} '
+                 f'{progress["done"]}/{progress["total"]}')
@@ -0,0 +1,179 @@
+"""Expires old datasets and removes their files.
+
+Datasets are expired when they are older than
+``settings.DATASET_MAX_AGE_DAYS``, when nobody downloaded them for
+``settings.DATASET_IDLE_DAYS``, or when the files of all datasets take more
+than ``settings.DATASET_STORAGE_MAX_SIZE`` bytes, in which case the least
+recently used are expired first. Datasets of the same job (eg. the
+nucleotide and aminoacid datasets of GenBank submissions) are expired
+together.
+
+Rows are deleted in batches of ``settings.DATASET_RETENTION_BATCH_SIZE``, so
+that each ``DELETE`` is short and does not hold locks for long.
+"""
+import datetime
+import logging
+import os
+from typing import Dict, Iterable, List
+
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from create_dataset.checkpoints import DatasetCheckpoint, get_checkpoints_root
+from create_dataset.models import Dataset
+from create_dataset.progress import get_progress_key
+
+
+log = logging.getLogger(__name__)
+
+
+# files younger than this are not orphans, their job may be saving its Dataset
+ORPHAN_FILE_MIN_AGE = datetime.timedelta(hours=1)
+
+
+def get_expired_dataset_ids(now=None) -> List[int]:
+    """Ids of datasets that expired by age, idle time or size budget."""
+    if now is None:
+        now = timezone.now()
+
+    queryset = Dataset.objects.annotate(
+        last_used=Coalesce('last_downloaded', 'completed', 'created'),
+    )
+    expired = Q(created__lt=now - datetime.timedelta(days=settings.DATASET_MAX_AGE_DAYS))
+    expired |= Q(last_used__lt=now - datetime.timedelta(days=settings.DATASET_IDLE_DAYS))
+    expired_ids = set(queryset.filter(expired).values_list('id', flat=True))
+
+    total_size = 0
+    entries = queryset.exclude(id__in=expired_ids).order_by(
+        F('last_used').desc(), '-id',
+    ).values_list('id', 'compressed_size', 'file_size')
+    for dataset_id, compressed_size, file_size in entries.iterator():
+        total_size += compressed_size or file_size or 0
+        if total_size > settings.DATASET_STORAGE_MAX_SIZE:
+            expired_ids.add(dataset_id)
+
+    return sorted(expired_ids)
+
+
+def add_sister_datasets(dataset_ids: Iterable[int]) -> List[int]:
+    dataset_ids = set(dataset_ids)
+    sisters = Dataset.objects.filter(
+        Q(sister_dataset_id__in=dataset_ids)
+        | Q(id__in=Dataset.objects.filter(id__in=dataset_ids).values('sister_dataset_id'))
+    ).values_list('id', flat=True)
+    return sorted(dataset_ids | set(sisters))
+
+
+def expire_datasets(batch_size=None, dry_run=False, now=None) -> Dict[str, int]:
+    """Deletes expired datasets, their files, progress and task results.
+
+    Returns:
+        dict with the number of ``datasets``, ``files`` and ``checkpoints``
+        removed, and the ``bytes`` freed on disk.
+    """
+    if batch_size is None:
+        batch_size = settings.DATASET_RETENTION_BATCH_SIZE
+
+    stats = {'datasets': 0, 'files': 0, 'bytes': 0}
+    expired_ids = get_expired_dataset_ids(now)
+    for index in range(0, len(expired_ids), batch_size):
+        batch = add_sister_datasets(expired_ids[index:index + batch_size])
+        datasets = list(
+            Dataset.objects.filter(id__in=batch).values_list('id', 'file_path', 'task_uuid')
+        )
+        stats['datasets'] += len(datasets)
+        if dry_run:
+            continue
+
+        Dataset.objects.filter(id__in=batch).delete()
+        for dataset_id, file_path, task_uuid in datasets:
+            cache.delete(get_progress_key(dataset_id))
+            if task_uuid:
+                AsyncResult(task_uuid).forget()
+            if file_path:
+                size = remove_file(os.path.join(settings.DATASET_FILES_ROOT, file_path))
+                if size is not None:
+                    stats['files'] += 1
+                    stats['bytes'] += size
+        log.info(f'expired {len(datasets)} datasets')
+
+    orphan_stats = remove_orphan_files(batch_size, dry_run, now)
+    stats['files'] += orphan_stats['files']
+    stats['bytes'] += orphan_stats['bytes']
+    stats['checkpoints'] = remove_orphan_checkpoints(dry_run)
+    return stats
+
+
+def remove_orphan_checkpoints(dry_run=False) -> int:
+    """Removes checkpoints of datasets that are finished or deleted."""
+    checkpoints_root = get_checkpoints_root()
+    if not os.path.isdir(checkpoints_root):
+        return 0
+
+    checkpoint_ids = [
+        int(entry.name) for entry in os.scandir(checkpoints_root)
+        if entry.is_dir() and entry.name.isdigit()
+    ]
+    running_ids = set(
+        Dataset.objects.filter(
+            id__in=checkpoint_ids, completed__isnull=True,
+        ).values_list('id', flat=True)
+    )
+    count = 0
+    for dataset_id in checkpoint_ids:
+        if dataset_id in running_ids:
+            continue
+        count += 1
+        if not dry_run:
+            DatasetCheckpoint(dataset_id).delete()
+    return count
+
+
+def remove_orphan_files(batch_size=None, dry_run=False, now=None) -> Dict[str, int]:
+    """Removes files in ``settings.DATASET_FILES_ROOT`` that belong to no dataset."""
+    if batch_size is None:
+        batch_size = settings.DATASET_RETENTION_BATCH_SIZE
+    if now is None:
+        now = timezone.now()
+
+    stats = {'files': 0, 'bytes': 0}
+    if not os.path.isdir(settings.DATASET_FILES_ROOT):
+        return stats
+
+    newest = (now - ORPHAN_FILE_MIN_AGE).timestamp()
+    file_names = [
+        entry.name for entry in os.scandir(settings.DATASET_FILES_ROOT)
+        if entry.is_file() and not entry.name.startswith('.')
+        and entry.stat().st_mtime < newest
+    ]
+    for index in range(0, len(file_names), batch_size):
+        batch = file_names[index:index + batch_size]
+        used = set(
+            Dataset.objects.filter(file_path__in=batch).values_list('file_path', flat=True)
+        )
+        for file_name in batch:
+            if file_name in used:
+                continue
+            file_path = os.path.join(settings.DATASET_FILES_ROOT, file_name)
+            if dry_run:
+                size = os.path.getsize(file_path)
+            else:
+                size = remove_file(file_path)
+            if size is not None:
+                stats['files'] += 1
+                stats['bytes'] += size
+    return stats
+
+
+def remove_file(file_path):
+    """Removes the file and returns its size, or None if it did not exist."""
+    try:
+        size = os.path.getsize(file_path)
+        os.remove(file_path)
+    except FileNotFoundError:
+        return None
+    return size
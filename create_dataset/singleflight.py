@@ -0,0 +1,92 @@
+"""Coalesces identical dataset requests while their job is running.
+
+The first request for a cache key (see ``make_cache_key``) schedules the job
+and records its dataset as in flight. Identical requests that arrive before
+it finishes get the same dataset, and their users are added to the users to
+notify when it is done. A short lock around checking and recording keeps two
+requests from scheduling the same job at once. ``cache.add`` is atomic in
+Redis, so the lock works across web workers.
+"""
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+from django.core.cache import cache
+
+from create_dataset.models import Dataset
+
+
+log = logging.getLogger(__name__)
+
+
+# longer than the time limit of dataset tasks plus some time in the queue
+IN_FLIGHT_TIMEOUT = 3 * 60 * 60
+LOCK_TIMEOUT = 30
+
+
+def get_in_flight_key(cache_key) -> str:
+    return f'create_dataset:in_flight:{cache_key}'
+
+
+def get_subscribers_key(cache_key) -> str:
+    return f'create_dataset:subscribers:{cache_key}'
+
+
+def get_lock_key(cache_key) -> str:
+    return f'create_dataset:lock:{cache_key}'
+
+
+@contextmanager
+def single_flight_lock(cache_key, timeout=LOCK_TIMEOUT):
+    """Lock for one cache key. After waiting ``timeout`` seconds we go on
+    without it, at worst the same dataset is created twice.
+    """
+    lock_key = get_lock_key(cache_key)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    acquired = cache.add(lock_key, token, timeout)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.05)
+        acquired = cache.add(lock_key, token, timeout)
+    if not acquired:
+        log.warning(f'could not lock dataset requests for {cache_key}')
+
+    try:
+        yield
+    finally:
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def get_in_flight_dataset(cache_key) -> Optional[int]:
+    """Id of the unfinished dataset for this key, if any."""
+    dataset_id = cache.get(get_in_flight_key(cache_key))
+    if dataset_id is None:
+        return None
+    if not Dataset.objects.filter(id=dataset_id, completed__isnull=True).exists():
+        cache.delete(get_in_flight_key(cache_key))
+        return None
+    return dataset_id
+
+
+def start_flight(cache_key, dataset_id, user_id) -> None:
+    cache.set(get_in_flight_key(cache_key), dataset_id, IN_FLIGHT_TIMEOUT)
+    cache.set(get_subscribers_key(cache_key), [user_id], IN_FLIGHT_TIMEOUT)
+
+
+def attach_user(cache_key, user_id) -> None:
+    """Adds a user to be notified when the dataset in flight is done."""
+    subscribers = cache.get(get_subscribers_key(cache_key)) or []
+    if user_id not in subscribers:
+        subscribers.append(user_id)
+    cache.set(get_subscribers_key(cache_key), subscribers, IN_FLIGHT_TIMEOUT)
+
+
+def finish_flight(cache_key) -> List[int]:
+    """Forgets the dataset in flight and returns the ids of users to notify."""
+    with single_flight_lock(cache_key):
+        subscribers = cache.get(get_subscribers_key(cache_key)) or []
+        cache.delete_many([get_in_flight_key(cache_key), get_subscribers_key(cache_key)])
+    return subscribers
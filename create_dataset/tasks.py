@@ -1,17 +1,316 @@
+import logging
+import os
+from typing import Any, Dict, List
+
+from celery import chord, group
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
 from django.utils import timezone
 
+from core.utils import get_gene_codes
 from public_interface.models import TaxonSets, GeneSets, Genes
+from public_interface.tasks import notify_user
 from voseq.celery import app
 from create_dataset.models import Dataset
-from .utils import CreateDataset
+from .cache import cache_finished_job
+from . import retention, singleflight
+from .checkpoints import DatasetCheckpoint, build_gene_blocks
+from .progress import DatasetProgress
+from .utils import (
+    SHARED_SEQUENCES_OPTIONS, VARIANT_OPTIONS, CreateDataset, MergedDatasetCreator,
+)
 
 
-@app.task(time_limit=7200, soft_time_limit=7150)
+log = logging.getLogger(__name__)
+
+
+@app.task(bind=True, time_limit=7200, soft_time_limit=7150)
 def create_dataset(
+    self, taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+    outgroup, positions, partition_by_positions, translations, aminoacids,
+    degen_translations, special, taxon_names, number_genes, introns,
+    dataset_obj_id
+):
+    cleaned_data = make_cleaned_data(
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+        outgroup, positions, partition_by_positions, translations, aminoacids,
+        degen_translations, special, taxon_names, number_genes, introns,
+    )
+    gene_codes = get_gene_codes(cleaned_data)
+    saved_blocks = DatasetCheckpoint(dataset_obj_id).count_blocks(gene_codes)
+    try:
+        dataset_creator = make_dataset_creator(cleaned_data, dataset_obj_id)
+        save_dataset(dataset_creator, dataset_obj_id)
+    except SoftTimeLimitExceeded:
+        raise continue_later(self, dataset_obj_id, gene_codes, saved_blocks)
+    DatasetCheckpoint(dataset_obj_id).delete()
+
+
+@app.task(bind=True, time_limit=7200, soft_time_limit=7150)
+def create_gene_block(
+    self, gene_codes, taxonset_id, geneset_id, gene_codes_ids, voucher_codes,
+    file_format, outgroup, positions, partition_by_positions, translations,
+    aminoacids, degen_translations, special, taxon_names, number_genes, introns,
+    dataset_obj_id=None
+):
+    """Builds the sequences of a dataset for some of its genes.
+
+    Returns a list of blocks, of ``settings.DATASET_CHECKPOINT_GENES`` genes
+    each, that are merged with the other blocks by ``merge_gene_blocks``.
+    """
+    cleaned_data = make_cleaned_data(
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+        outgroup, positions, partition_by_positions, translations, aminoacids,
+        degen_translations, special, taxon_names, number_genes, introns,
+    )
+    saved_blocks = DatasetCheckpoint(dataset_obj_id).count_blocks(gene_codes)
+    try:
+        return build_gene_blocks(
+            cleaned_data, gene_codes, dataset_obj_id,
+            progress=DatasetProgress(dataset_obj_id),
+            total_genes=len(get_gene_codes(cleaned_data)),
+        )
+    except SoftTimeLimitExceeded:
+        raise continue_later(self, dataset_obj_id, gene_codes, saved_blocks)
+
+
+@app.task(bind=True, time_limit=7200, soft_time_limit=7150)
+def merge_gene_blocks(
+    self, blocks, taxonset_id, geneset_id, gene_codes_ids, voucher_codes,
+    file_format, outgroup, positions, partition_by_positions, translations,
+    aminoacids, degen_translations, special, taxon_names, number_genes, introns,
+    dataset_obj_id
+):
+    """Chord callback that formats the dataset from the gene blocks."""
+    cleaned_data = make_cleaned_data(
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+        outgroup, positions, partition_by_positions, translations, aminoacids,
+        degen_translations, special, taxon_names, number_genes, introns,
+    )
+    try:
+        dataset_creator = MergedDatasetCreator(
+            cleaned_data, flatten_blocks(blocks), dataset_obj_id,
+        )
+        save_dataset(dataset_creator, dataset_obj_id)
+    except SoftTimeLimitExceeded:
+        raise continue_later(self, dataset_obj_id)
+    DatasetCheckpoint(dataset_obj_id).delete()
+
+
+@app.task(bind=True, time_limit=7200, soft_time_limit=7150)
+def create_genbank_datasets(
+    self, taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+    outgroup, positions, partition_by_positions, translations, aminoacids,
+    degen_translations, special, taxon_names, number_genes, introns,
+    dataset_obj_id, aa_dataset_obj_id
+):
+    """Creates the nucleotide and aminoacid datasets of a GenBank
+    submission. Sequences are read from the database only once.
+    """
+    cleaned_data = make_cleaned_data(
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+        outgroup, positions, partition_by_positions, translations, False,
+        degen_translations, special, taxon_names, number_genes, introns,
+    )
+    gene_codes = get_gene_codes(cleaned_data)
+    saved_blocks = DatasetCheckpoint(dataset_obj_id).count_blocks(gene_codes)
+    try:
+        dataset_creator = make_dataset_creator(cleaned_data, dataset_obj_id)
+        save_genbank_datasets(dataset_creator, dataset_obj_id, aa_dataset_obj_id)
+    except SoftTimeLimitExceeded:
+        raise continue_later(self, dataset_obj_id, gene_codes, saved_blocks)
+    DatasetCheckpoint(dataset_obj_id).delete()
+
+
+@app.task(bind=True, time_limit=7200, soft_time_limit=7150)
+def merge_genbank_blocks(
+    self, blocks, taxonset_id, geneset_id, gene_codes_ids, voucher_codes,
+    file_format, outgroup, positions, partition_by_positions, translations,
+    aminoacids, degen_translations, special, taxon_names, number_genes, introns,
+    dataset_obj_id, aa_dataset_obj_id
+):
+    """Chord callback that formats both GenBank datasets from the gene blocks."""
+    cleaned_data = make_cleaned_data(
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+        outgroup, positions, partition_by_positions, translations, False,
+        degen_translations, special, taxon_names, number_genes, introns,
+    )
+    try:
+        dataset_creator = MergedDatasetCreator(
+            cleaned_data, flatten_blocks(blocks), dataset_obj_id,
+        )
+        save_genbank_datasets(dataset_creator, dataset_obj_id, aa_dataset_obj_id)
+    except SoftTimeLimitExceeded:
+        raise continue_later(self, dataset_obj_id)
+    DatasetCheckpoint(dataset_obj_id).delete()
+
+
+@app.task(bind=True, time_limit=7200, soft_time_limit=7150)
+def create_dataset_batch(
+    self, taxonset_id, geneset_id, gene_codes_ids, voucher_codes, special,
+    taxon_names, number_genes, introns, variants, dataset_obj_ids
+):
+    """Creates several datasets of the same vouchers and genes.
+
+    Sequences are read from the database once, and each dataset is
+    formatted from them with its own options, see ``VARIANT_OPTIONS``.
+    ``variants`` are dicts of those options, one for each of
+    ``dataset_obj_ids``. Datasets already saved by a previous run of the
+    job are skipped.
+    """
+    cleaned_data = make_cleaned_data(
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes,
+        *[SHARED_SEQUENCES_OPTIONS[option] for option in VARIANT_OPTIONS],
+        special, taxon_names, number_genes, introns,
+    )
+    completed_ids = set(
+        Dataset.objects.filter(
+            id__in=dataset_obj_ids, completed__isnull=False,
+        ).values_list('id', flat=True)
+    )
+    gene_codes = get_gene_codes(cleaned_data)
+    saved_blocks = DatasetCheckpoint(dataset_obj_ids[0]).count_blocks(gene_codes)
+    try:
+        dataset_creator = make_dataset_creator(cleaned_data, dataset_obj_ids[0])
+        for variant, dataset_obj_id in zip(variants, dataset_obj_ids):
+            if dataset_obj_id in completed_ids:
+                continue
+            save_dataset(dataset_creator.create_variant(variant, dataset_obj_id), dataset_obj_id)
+    except SoftTimeLimitExceeded:
+        raise continue_later(self, dataset_obj_ids[0], gene_codes, saved_blocks)
+    DatasetCheckpoint(dataset_obj_ids[0]).delete()
+
+
+@app.task
+def notify_attached_users(dataset_obj_id, cache_key):
+    """Notifies every user that asked for this dataset while it was created."""
+    for user_id in singleflight.finish_flight(cache_key):
+        notify_user(dataset_obj_id, user_id)
+
+
+@app.task
+def forget_flight(cache_key):
+    """Error callback, so that new requests do not get the failed dataset."""
+    singleflight.finish_flight(cache_key)
+
+
+@app.task(time_limit=7200, soft_time_limit=7150)
+def expire_datasets():
+    """Periodic task that deletes expired datasets and orphan files."""
+    stats = retention.expire_datasets()
+    return stats
+
+
+def make_dataset_creator(cleaned_data, dataset_obj_id) -> CreateDataset:
+    """Datasets with many genes are built in blocks that are kept as
+    checkpoints, so that a continuation of the job skips the genes done.
+    """
+    gene_codes = get_gene_codes(cleaned_data)
+    if len(gene_codes) <= settings.DATASET_GENES_PER_TASK:
+        return CreateDataset(cleaned_data, dataset_obj_id)
+
+    blocks = build_gene_blocks(
+        cleaned_data, gene_codes, dataset_obj_id, progress=DatasetProgress(dataset_obj_id),
+    )
+    return MergedDatasetCreator(cleaned_data, blocks, dataset_obj_id)
+
+
+def flatten_blocks(results) -> List[Dict[str, Any]]:
+    """Gene blocks from the lists returned by ``create_gene_block`` tasks."""
+    blocks = []
+    for result in results:
+        if isinstance(result, list):
+            blocks += result
+        else:
+            blocks.append(result)
+    return blocks
+
+
+def continue_later(task, dataset_obj_id, gene_codes=(), saved_blocks=0):
+    """Queues the task again when it reaches its soft time limit, if it has
+    saved checkpoints of more of its ``gene_codes`` than the ``saved_blocks``
+    there were when it started. Otherwise a new task would stop at the same
+    place, so the task fails.
+    """
+    if DatasetCheckpoint(dataset_obj_id).count_blocks(gene_codes) <= saved_blocks:
+        log.error(f'dataset {dataset_obj_id} reached the time limit without building any gene')
+        return SoftTimeLimitExceeded(
+            f'dataset {dataset_obj_id} reached the time limit without building any gene',
+        )
+    log.warning(f'dataset {dataset_obj_id} reached the time limit, continuing in a new task')
+    return task.retry(countdown=0, max_retries=settings.DATASET_MAX_CONTINUATIONS)
+
+
+def make_dataset_job(
     taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
     outgroup, positions, partition_by_positions, translations, aminoacids,
     degen_translations, special, taxon_names, number_genes, introns,
     dataset_obj_id
+):
+    """Returns the celery signature that creates a dataset.
+
+    Datasets with more genes than ``settings.DATASET_GENES_PER_TASK`` are
+    split into batches of genes that are built in parallel by
+    ``create_gene_block`` tasks, and merged by ``merge_gene_blocks``.
+    """
+    dataset_args = (
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+        outgroup, positions, partition_by_positions, translations, aminoacids,
+        degen_translations, special, taxon_names, number_genes, introns,
+    )
+    cleaned_data = make_cleaned_data(*dataset_args)
+    gene_codes = get_gene_codes(cleaned_data)
+    genes_per_task = settings.DATASET_GENES_PER_TASK
+
+    if len(gene_codes) <= genes_per_task:
+        return create_dataset.si(*dataset_args, dataset_obj_id)
+
+    gene_blocks = [
+        create_gene_block.si(gene_codes[i:i + genes_per_task], *dataset_args, dataset_obj_id)
+        for i in range(0, len(gene_codes), genes_per_task)
+    ]
+    return chord(
+        header=group(gene_blocks),
+        body=merge_gene_blocks.s(*dataset_args, dataset_obj_id),
+    )
+
+
+def make_genbank_job(
+    taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+    outgroup, positions, partition_by_positions, translations, aminoacids,
+    degen_translations, special, taxon_names, number_genes, introns,
+    dataset_obj_id, aa_dataset_obj_id
+):
+    """Returns the celery signature that creates the nucleotide and
+    aminoacid datasets of a GenBank submission, split in gene blocks as
+    in ``make_dataset_job``.
+    """
+    dataset_args = (
+        taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+        outgroup, positions, partition_by_positions, translations, False,
+        degen_translations, special, taxon_names, number_genes, introns,
+    )
+    cleaned_data = make_cleaned_data(*dataset_args)
+    gene_codes = get_gene_codes(cleaned_data)
+    genes_per_task = settings.DATASET_GENES_PER_TASK
+
+    if len(gene_codes) <= genes_per_task:
+        return create_genbank_datasets.si(*dataset_args, dataset_obj_id, aa_dataset_obj_id)
+
+    gene_blocks = [
+        create_gene_block.si(gene_codes[i:i + genes_per_task], *dataset_args, dataset_obj_id)
+        for i in range(0, len(gene_codes), genes_per_task)
+    ]
+    return chord(
+        header=group(gene_blocks),
+        body=merge_genbank_blocks.s(*dataset_args, dataset_obj_id, aa_dataset_obj_id),
+    )
+
+
+def make_cleaned_data(
+    taxonset_id, geneset_id, gene_codes_ids, voucher_codes, file_format,
+    outgroup, positions, partition_by_positions, translations, aminoacids,
+    degen_translations, special, taxon_names, number_genes, introns,
 ):
     cleaned_data = dict()
     if taxonset_id:
@@ -38,12 +337,38 @@ def create_dataset(
     cleaned_data['taxon_names'] = taxon_names
     cleaned_data['number_genes'] = number_genes
     cleaned_data['introns'] = introns
-    dataset_creator = CreateDataset(cleaned_data, dataset_obj_id)
+    return cleaned_data
 
+
+def save_dataset(dataset_creator, dataset_obj_id):
     dataset_obj = Dataset.objects.get(id=dataset_obj_id)
-    dataset_obj.content = dataset_creator.dataset_str
+    dataset_handler = dataset_creator.dataset_handler
+    if dataset_handler:
+        with dataset_creator.metrics:
+            dataset_creator.progress.start_stage('writing file')
+            dataset_handler.save_dataset_to_file()
+        dataset_obj.file_path = os.path.basename(dataset_handler.dataset_file)
+        dataset_obj.file_size = dataset_handler.file_size
+        dataset_obj.compressed_size = dataset_handler.compressed_size
+        dataset_obj.checksum = dataset_handler.checksum
+        dataset_creator.metrics.set_output(
+            dataset_handler.file_size, dataset_handler.compressed_size,
+        )
     dataset_obj.charset_block = dataset_creator.charset_block
     dataset_obj.completed = timezone.now()
     dataset_obj.errors = dataset_creator.errors
     dataset_obj.warnings = list(set(dataset_creator.warnings))
+    dataset_obj.metrics = dataset_creator.metrics.to_dict()
     dataset_obj.save()
+    dataset_creator.progress.finish()
+
+    if dataset_obj.task_uuid:
+        cache_finished_job(dataset_obj.task_uuid)
+
+
+def save_genbank_datasets(dataset_creator, dataset_obj_id, aa_dataset_obj_id):
+    # the aminoacid dataset is made before the nucleotide one is saved
+    # and its progress is marked as finished
+    aa_dataset_creator = dataset_creator.create_aminoacid_dataset(aa_dataset_obj_id)
+    save_dataset(dataset_creator, dataset_obj_id)
+    save_dataset(aa_dataset_creator, aa_dataset_obj_id)
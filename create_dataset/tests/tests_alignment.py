@@ -0,0 +1,56 @@
+from django.test import TestCase
+from seqrecord_expanded import SeqRecordExpanded
+
+from create_dataset.alignment import AlignmentMatrix
+
+
+class AlignmentMatrixTest(TestCase):
+    def setUp(self):
+        self.sequences = {
+            ('CP100-10', 'COI'): 'ACGTACGTAC',
+            ('CP100-11', 'COI'): 'ACGTAC',
+            ('CP100-10', 'ef1a'): 'TTTGGGCCCA',
+            ('CP100-11', 'ef1a'): 'TTTGGGCCCAAA',
+        }
+        self.genes = [('COI', 10, 1), ('ef1a', 10, 2)]
+        self.matrix = AlignmentMatrix.from_sequences(
+            ['CP100-10', 'CP100-11'], self.genes, self.sequences,
+        )
+
+    def test_padding(self):
+        self.assertEqual((2, 22), self.matrix.data.shape)
+        self.assertEqual('ACGTAC????', self.matrix.get_row(1, 'COI'))
+        self.assertEqual('TTTGGGCCCA??', self.matrix.get_row(0, 'ef1a'))
+        self.assertEqual([('COI', 1, 10), ('ef1a', 11, 22)], self.matrix.get_partitions())
+
+    def test_missing_sequence(self):
+        matrix = AlignmentMatrix.from_sequences(['CP100-12'], self.genes, self.sequences)
+        self.assertEqual('?' * 20, matrix.get_row(0))
+
+    def test_codon_positions_match_seqrecord_expanded(self):
+        methods = {
+            '1st': 'first_codon_position',
+            '2nd': 'second_codon_position',
+            '3rd': 'third_codon_position',
+            '1st-2nd': 'first_and_second_codon_positions',
+        }
+        sequence = 'ACGTTGCAAGCTTCA'
+        for reading_frame in (1, 2, 3):
+            matrix = AlignmentMatrix.from_sequences(
+                ['CP100-10'], [('COI', 15, reading_frame)], {('CP100-10', 'COI'): sequence},
+            )
+            seq_record = SeqRecordExpanded(sequence, reading_frame=reading_frame)
+            for positions, method in methods.items():
+                selected = matrix.select_codon_positions(positions)
+                self.assertEqual(getattr(seq_record, method)(), selected.get_row(0),
+                                 msg=f'{positions} reading frame {reading_frame}')
+
+    def test_select_codon_positions__partitions(self):
+        selected = self.matrix.select_codon_positions('3rd')
+        self.assertEqual([('COI', 1, 3), ('ef1a', 4, 6)], selected.get_partitions())
+        self.assertEqual('GCA', selected.get_row(0, 'COI'))
+
+    def test_select_codon_positions__missing_reading_frame(self):
+        matrix = AlignmentMatrix.from_sequences(['CP100-10'], [('COI', 10, None)], self.sequences)
+        self.assertRaises(ValueError, matrix.select_codon_positions, '1st')
+        self.assertIs(matrix, matrix.select_codon_positions('ALL'))
@@ -0,0 +1,137 @@
+import io
+import json
+import zipfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.client import Client
+
+from create_dataset.models import Dataset
+from create_dataset.tasks import create_dataset
+from create_dataset.utils import CreateDataset
+from public_interface.models import Genes
+
+
+class GeneArchiveTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.user = User.objects.get(username='admin')
+        self.user.set_password('pass')
+        self.user.save()
+        self.c = Client()
+
+        self.gene_codes_ids = list(
+            Genes.objects.filter(
+                gene_code__in=['COI-begin', 'ef1a', 'wingless'],
+            ).values_list('id', flat=True)
+        )
+
+    def make_dataset_args(self, file_format):
+        return [
+            None,  # taxonset_id
+            None,  # geneset_id
+            self.gene_codes_ids,
+            'CP100-10\r\nCP100-11\r\nCP100-12',
+            file_format,
+            '',  # outgroup
+            ['ALL'],
+            'by gene',
+            False,  # translations
+            False,  # aminoacids
+            None,  # degen_translations
+            False,  # special
+            ['CODE', 'GENUS', 'SPECIES'],
+            None,  # number_genes
+            'YES',  # introns
+        ]
+
+    def build_archive(self, file_format='NEXUS_ARCHIVE'):
+        dataset_obj = Dataset.objects.create(user=self.user)
+        with self.settings(DATASET_GENES_PER_TASK=100):
+            create_dataset(*self.make_dataset_args(file_format), dataset_obj.id)
+        return Dataset.objects.get(id=dataset_obj.id)
+
+    def read_archive(self, dataset_obj):
+        with zipfile.ZipFile(dataset_obj.get_file_path()) as archive:
+            return {name: archive.read(name).decode('utf-8') for name in archive.namelist()}
+
+    def test_archive(self):
+        dataset_obj = self.build_archive()
+        self.assertTrue(dataset_obj.is_archive())
+        entries = self.read_archive(dataset_obj)
+        self.assertEqual(
+            ['COI-begin.nex', 'ef1a.nex', 'wingless.nex', 'manifest.json'],
+            list(entries),
+        )
+        self.assertTrue(entries['ef1a.nex'].startswith('#NEXUS'))
+        self.assertEqual(sum(len(i.encode('utf-8')) for i in entries.values()),
+                         dataset_obj.file_size)
+
+    def test_archive__same_as_one_gene_dataset(self):
+        dataset_obj = self.build_archive()
+        entries = self.read_archive(dataset_obj)
+
+        cleaned_data = {
+            'taxonset': None, 'geneset': None,
+            'gene_codes': Genes.objects.filter(gene_code='wingless'),
+            'voucher_codes': 'CP100-10\r\nCP100-11\r\nCP100-12',
+            'file_format': 'NEXUS', 'outgroup': '', 'positions': ['ALL'],
+            'partition_by_positions': 'by gene', 'translations': False,
+            'aminoacids': False, 'degen_translations': None, 'special': False,
+            'taxon_names': ['CODE', 'GENUS', 'SPECIES'], 'number_genes': None,
+            'introns': 'YES',
+        }
+        self.assertEqual(CreateDataset(cleaned_data).dataset_str, entries['wingless.nex'])
+
+    def test_archive__manifest(self):
+        dataset_obj = self.build_archive('PHYLIP_ARCHIVE')
+        manifest = json.loads(self.read_archive(dataset_obj)['manifest.json'])
+        self.assertEqual('PHYLIP', manifest['format'])
+        self.assertEqual(
+            ['COI-begin', 'ef1a', 'wingless'],
+            [gene['gene_code'] for gene in manifest['genes']],
+        )
+        gene = manifest['genes'][1]
+        self.assertEqual('ef1a.phy', gene['file'])
+        self.assertEqual(3, gene['taxa'])
+        self.assertEqual('ef1a.charsets.txt', gene['charsets'])
+        self.assertEqual(
+            Genes.objects.get(gene_code='ef1a').length, gene['length'],
+        )
+        self.assertLessEqual(gene['taxa_with_data'], gene['taxa'])
+
+    def test_archive__workers(self):
+        dataset_obj = self.build_archive()
+        with override_settings(DATASET_ARCHIVE_WORKERS=3):
+            threaded_dataset_obj = self.build_archive()
+        self.assertEqual(dataset_obj.checksum, threaded_dataset_obj.checksum)
+
+    def test_archive__preview(self):
+        dataset_obj = self.build_archive('FASTA_ARCHIVE')
+        manifest = json.loads(dataset_obj.preview(length=100000))
+        self.assertEqual('FASTA', manifest['format'])
+
+    def test_compress_datasets__archive(self):
+        dataset_obj = self.build_archive()
+        entries = self.read_archive(dataset_obj)
+        call_command('compress_datasets', stdout=io.StringIO())
+
+        result = Dataset.objects.get(id=dataset_obj.id)
+        self.assertEqual(dataset_obj.file_path, result.file_path)
+        self.assertEqual(entries, self.read_archive(result))
+
+    def test_download_archive(self):
+        dataset_obj = self.build_archive()
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        response = self.c.get(f'/create_dataset/download/{dataset_obj.id}/')
+        self.assertEqual('application/zip', response['Content-Type'])
+        self.assertIn(f'dataset_{dataset_obj.id}.zip', response['Content-Disposition'])
+        content = b''.join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIn('manifest.json', archive.namelist())
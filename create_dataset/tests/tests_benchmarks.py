@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from create_dataset.benchmarks import compare, run_benchmarks
+from public_interface.models import Vouchers
+
+
+class BenchmarksTest(TestCase):
+    def test_run_benchmarks(self):
+        result = run_benchmarks({'tiny': (4, 2)}, formats=['NEXUS', 'FASTA'])
+        self.assertEqual(
+            ['tiny:NEXUS', 'tiny:FASTA', 'tiny:GeneTable', 'tiny:VoucherTable', 'tiny:OverviewTable'],
+            list(result['results']),
+        )
+        nexus = result['results']['tiny:NEXUS']
+        self.assertGreater(nexus['wall_time'], 0)
+        self.assertGreater(nexus['peak_memory'], 0)
+        self.assertGreater(nexus['queries'], 0)
+        # synthetic data is removed afterwards
+        self.assertFalse(Vouchers.objects.filter(code__startswith='BENCH-').exists())
+
+    def test_compare(self):
+        baseline = {'results': {'small:NEXUS': {'wall_time': 1.0, 'peak_memory': 100, 'queries': 4}}}
+        current = {'results': {
+            'small:NEXUS': {'wall_time': 1.1, 'peak_memory': 100, 'queries': 9},
+            'small:FASTA': {'wall_time': 1.0, 'peak_memory': 100, 'queries': 4},
+        }}
+        self.assertEqual(['small:NEXUS queries: 4 -> 9'], compare(baseline, current))
+
+    def test_command_with_baseline(self):
+        output = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        call_command('run_benchmarks', tiers='small', formats='FASTA', output=output,
+                     stdout=StringIO())
+        with open(output) as handle:
+            baseline = json.load(handle)
+        self.assertIn('small:FASTA', baseline['results'])
+
+        baseline['results']['small:FASTA']['queries'] = 1
+        with open(output, 'w') as handle:
+            json.dump(baseline, handle)
+        with self.assertRaises(CommandError):
+            call_command('run_benchmarks', tiers='small', formats='FASTA', baseline=output,
+                         stdout=StringIO())
@@ -0,0 +1,146 @@
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from create_dataset.alignment import AlignmentMatrix
+from create_dataset.bundle import make_partitions, make_ranges
+from create_dataset.models import Dataset
+from create_dataset.tasks import create_dataset
+from create_dataset.utils import CreateDataset
+from public_interface.models import Genes
+
+
+class MakePartitionsTest(TestCase):
+    def setUp(self):
+        self.matrix = AlignmentMatrix.from_sequences(
+            ['A', 'B'],
+            [('gene1', 6, 1), ('gene2', 5, 2)],
+            {('A', 'gene1'): 'ACGTAC', ('B', 'gene2'): 'GGCCA'},
+        )
+
+    def test_make_ranges(self):
+        self.assertEqual([[1, 10, 3]], make_ranges(np.arange(0, 10, 3)))
+        self.assertEqual([[1, 2, 1], [5, 5, 1]], make_ranges(np.array([0, 1, 4])))
+        self.assertEqual([], make_ranges(np.array([], dtype=int)))
+
+    def test_by_gene(self):
+        partitions = make_partitions(self.matrix, 'ALL', 'by gene')
+        self.assertEqual(
+            [
+                {'gene_code': 'gene1', 'sites': [1, 6],
+                 'partitions': [{'name': 'gene1', 'sites': [[1, 6, 1]]}]},
+                {'gene_code': 'gene2', 'sites': [7, 11],
+                 'partitions': [{'name': 'gene2', 'sites': [[7, 11, 1]]}]},
+            ],
+            partitions,
+        )
+
+    def test_by_codon_position(self):
+        partitions = make_partitions(self.matrix, 'ALL', 'by codon position')
+        gene1 = partitions[0]['partitions']
+        self.assertEqual(['gene1_1st', 'gene1_2nd', 'gene1_3rd'], [i['name'] for i in gene1])
+        self.assertEqual([[1, 4, 3]], gene1[0]['sites'])
+        # the first two sites of gene2 are before its first codon
+        gene2 = partitions[1]['partitions']
+        self.assertEqual([[9, 9, 1]], gene2[0]['sites'])
+        self.assertEqual([[10, 10, 1]], gene2[1]['sites'])
+        self.assertEqual([[11, 11, 1]], gene2[2]['sites'])
+
+    def test_selected_codon_positions(self):
+        partitions = make_partitions(self.matrix, '1st-2nd', '1st-2nd, 3rd')
+        self.assertEqual([1, 4], partitions[0]['sites'])
+        self.assertEqual(
+            [{'name': 'gene1_1st-2nd', 'codon_positions': [1, 2], 'sites': [[1, 4, 1]]}],
+            partitions[0]['partitions'],
+        )
+        self.assertEqual([5, 6], partitions[1]['sites'])
+
+
+class MatrixBundleTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.cleaned_data = {
+            'taxonset': None, 'geneset': None,
+            'gene_codes': Genes.objects.filter(gene_code__in=['COI-begin', 'ef1a']),
+            'voucher_codes': 'CP100-10\r\nCP100-11\r\nCP100-12',
+            'file_format': 'NPY', 'outgroup': '', 'positions': ['ALL'],
+            'partition_by_positions': 'by gene', 'translations': False,
+            'aminoacids': False, 'degen_translations': None, 'special': False,
+            'taxon_names': ['CODE', 'GENUS', 'SPECIES'], 'number_genes': None,
+            'introns': 'YES',
+        }
+
+    def build_bundle(self):
+        gene_codes_ids = list(self.cleaned_data['gene_codes'].values_list('id', flat=True))
+        dataset_obj = Dataset.objects.create()
+        with self.settings(DATASET_GENES_PER_TASK=100):
+            create_dataset(
+                None, None, gene_codes_ids, self.cleaned_data['voucher_codes'], 'NPY', '',
+                ['ALL'], 'by gene', False, False, None, False,
+                ['CODE', 'GENUS', 'SPECIES'], None, 'YES', dataset_obj.id,
+            )
+        return Dataset.objects.get(id=dataset_obj.id)
+
+    def test_bundle(self):
+        dataset_obj = self.build_bundle()
+        self.assertTrue(dataset_obj.is_archive())
+        with zipfile.ZipFile(dataset_obj.get_file_path()) as bundle:
+            self.assertEqual(['matrix.npy', 'taxa.tsv', 'manifest.json'], bundle.namelist())
+            self.assertTrue(all(
+                info.compress_type == zipfile.ZIP_STORED for info in bundle.infolist()
+            ))
+            manifest = json.loads(bundle.read('manifest.json'))
+            taxa = bundle.read('taxa.tsv').decode('utf-8').splitlines()
+            with tempfile.TemporaryDirectory() as directory:
+                bundle.extract('matrix.npy', directory)
+                matrix = np.load(os.path.join(directory, 'matrix.npy'), mmap_mode='r')
+                self.assertIsInstance(matrix, np.memmap)
+                self.assertEqual(np.uint8, matrix.dtype)
+                self.assertEqual(manifest['shape'], list(matrix.shape))
+                rows = [row.tobytes().decode('ascii') for row in matrix]
+                del matrix
+
+        self.assertEqual('NPY', manifest['format'])
+        self.assertEqual(['COI-begin', 'ef1a'], [i['gene_code'] for i in manifest['genes']])
+        self.assertEqual(
+            ['CP100-10', 'CP100-11', 'CP100-12'], [line.split('\t')[0] for line in taxa],
+        )
+        self.assertTrue(taxa[0].split('\t')[1].startswith('CP100_10_'))
+
+        # same sites as the concatenated sequences of a FASTA dataset
+        fasta = CreateDataset(dict(self.cleaned_data, file_format='FASTA')).dataset_str
+        first_record = fasta.split('>')[1].splitlines()
+        self.assertEqual(''.join(first_record[1:]), rows[0])
+
+    def test_bundle__aminoacids(self):
+        dataset = CreateDataset(dict(self.cleaned_data, aminoacids=True))
+        self.assertEqual('', dataset.dataset_str)
+        self.assertIsNone(dataset.dataset_handler)
+        self.assertEqual(['Binary matrices can only have nucleotide sequences'], dataset.errors)
+
+    def test_bundle__preview(self):
+        dataset_obj = self.build_bundle()
+        manifest = json.load(io.StringIO(dataset_obj.preview(length=100000)))
+        self.assertEqual('matrix.npy', manifest['matrix'])
+
+    def test_compress_datasets__bundle(self):
+        dataset_obj = self.build_bundle()
+        with open(dataset_obj.get_file_path(), 'rb') as handle:
+            content = handle.read()
+        call_command('compress_datasets', stdout=io.StringIO())
+
+        result = Dataset.objects.get(id=dataset_obj.id)
+        self.assertEqual(dataset_obj.file_path, result.file_path)
+        with open(result.get_file_path(), 'rb') as handle:
+            self.assertEqual(content, handle.read())
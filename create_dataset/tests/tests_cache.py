@@ -0,0 +1,142 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from create_dataset.cache import (
+    cache_finished_job, evict_cached_datasets, get_cached_dataset, make_cache_key,
+)
+from create_dataset.models import CachedDataset, Dataset
+from create_dataset.views import schedule_dataset
+from public_interface.models import Genes, Sequences
+
+
+class DatasetCacheTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.cleaned_data = {
+            'gene_codes': Genes.objects.filter(gene_code__in=['COI-begin', 'ef1a']),
+            'taxonset': None,
+            'voucher_codes': 'CP100-10\r\nCP100-11',
+            'geneset': None,
+            'taxon_names': ['CODE', 'GENUS', 'SPECIES'],
+            'positions': ['ALL'],
+            'translations': False,
+            'partition_by_positions': 'by gene',
+            'degen_translations': 'normal',
+            'number_genes': None,
+            'file_format': 'FASTA',
+            'aminoacids': False,
+            'outgroup': '',
+            'special': False,
+            'introns': 'YES',
+        }
+        self.user = User.objects.get(username='admin')
+
+    def make_finished_dataset(self, key, content='>CP100_10\nACGT\n'):
+        dataset = Dataset.objects.create(
+            user=self.user, task_uuid=key, cache_key=key, content=content,
+            completed=timezone.now(), errors=[],
+        )
+        cache_finished_job(key)
+        return dataset
+
+    def test_make_cache_key(self):
+        key = make_cache_key(self.cleaned_data)
+        self.assertEqual(key, make_cache_key(self.cleaned_data))
+
+        self.cleaned_data['voucher_codes'] = 'CP100-11\r\nCP100-10\r\nCP100-10'
+        self.assertEqual(key, make_cache_key(self.cleaned_data))
+
+        self.cleaned_data['file_format'] = 'NEXUS'
+        self.assertNotEqual(key, make_cache_key(self.cleaned_data))
+
+    def test_make_cache_key__data_version(self):
+        key = make_cache_key(self.cleaned_data)
+        sequence = Sequences.objects.get(code_id='CP100-10', gene__gene_code='COI-begin')
+        sequence.sequences = 'ACGT'
+        sequence.save()
+        self.assertNotEqual(key, make_cache_key(self.cleaned_data))
+
+    def test_get_cached_dataset(self):
+        key = make_cache_key(self.cleaned_data)
+        self.assertIsNone(get_cached_dataset(key))
+
+        dataset = self.make_finished_dataset(key)
+        self.assertEqual(dataset, get_cached_dataset(key))
+
+    def test_cache_finished_job__with_errors(self):
+        Dataset.objects.create(
+            task_uuid='abc', cache_key='key', content='', completed=timezone.now(),
+            errors=['Cannot degenerate codons'],
+        )
+        cache_finished_job('abc')
+        self.assertIsNone(get_cached_dataset('key'))
+
+    def test_cache_finished_job__pending_sister_dataset(self):
+        nucleotide_dataset = Dataset.objects.create(task_uuid='abc')
+        Dataset.objects.create(
+            task_uuid='abc', cache_key='key', content='ACGT', completed=timezone.now(),
+            errors=[], sister_dataset_id=nucleotide_dataset.id,
+        )
+        cache_finished_job('abc')
+        self.assertIsNone(get_cached_dataset('key'))
+
+    def test_cache_finished_job__batch(self):
+        Dataset.objects.create(
+            task_uuid='abc', cache_key='key1', content='ACGT', completed=timezone.now(),
+            errors=[],
+        )
+        Dataset.objects.create(
+            task_uuid='abc', cache_key='key2', content='ACGTACGT', completed=timezone.now(),
+            errors=[],
+        )
+        Dataset.objects.create(
+            task_uuid='abc', cache_key='key3', content='', completed=timezone.now(),
+            errors=['Cannot degenerate codons'],
+        )
+        Dataset.objects.create(task_uuid='abc', cache_key='key4')
+        cache_finished_job('abc')
+        # each dataset counts its own size, failed ones do not stop the others
+        self.assertEqual(
+            [('key1', 4), ('key2', 8)],
+            list(CachedDataset.objects.order_by('key').values_list('key', 'size')),
+        )
+
+    def test_cache_finished_job__sister_datasets(self):
+        nucleotide_dataset = Dataset.objects.create(
+            task_uuid='abc', content='ACGT', completed=timezone.now(), errors=[],
+        )
+        Dataset.objects.create(
+            task_uuid='abc', cache_key='key', content='MK', completed=timezone.now(),
+            errors=[], sister_dataset_id=nucleotide_dataset.id,
+        )
+        cache_finished_job('abc')
+        self.assertEqual(6, CachedDataset.objects.get(key='key').size)
+
+    def test_evict_cached_datasets(self):
+        self.make_finished_dataset('key1')
+        self.make_finished_dataset('key2')
+        evict_cached_datasets(max_size=20)
+        self.assertEqual(['key2'], list(CachedDataset.objects.values_list('key', flat=True)))
+        self.assertEqual(2, Dataset.objects.filter(cache_key__in=['key1', 'key2']).count())
+
+    @patch('create_dataset.views.chord')
+    def test_schedule_dataset__cache_hit(self, mock_chord):
+        dataset = self.make_finished_dataset(make_cache_key(self.cleaned_data))
+        result = schedule_dataset(self.cleaned_data, self.user)
+        self.assertEqual(dataset.id, result)
+        mock_chord.assert_not_called()
+
+    @patch('create_dataset.views.chord')
+    def test_schedule_dataset__cache_miss(self, mock_chord):
+        result = schedule_dataset(self.cleaned_data, self.user)
+        self.assertEqual(make_cache_key(self.cleaned_data), Dataset.objects.get(id=result).cache_key)
+        mock_chord.assert_called_once()
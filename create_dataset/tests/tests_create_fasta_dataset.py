@@ -75,7 +75,7 @@ class CreateFASTADatasetTest(TestCase):
             dataset_obj_id=dataset_obj.id,
         )
         dataset_obj.refresh_from_db()
-        self.assertIn("[ef1a]\nCP100_10_Aus_aus", dataset_obj.content)
+        self.assertIn("[ef1a]\nCP100_10_Aus_aus", dataset_obj.get_content())
 
     def test_create_dataset__gaps(self):
         """Test that gaps have not been converted to underscores."""
@@ -106,7 +106,7 @@ class CreateFASTADatasetTest(TestCase):
             dataset_obj_id=dataset_obj.id,
         )
         dataset_obj.refresh_from_db()
-        self.assertFalse("___" in str(dataset_obj.content))
+        self.assertFalse("___" in str(dataset_obj.get_content()))
 
     def test_create_dataset_degenerated(self):
         dataset_obj = Dataset.objects.create()
@@ -131,7 +131,7 @@ class CreateFASTADatasetTest(TestCase):
         )
         expected = 'MGNMGNMGNMGNMGNMGNMGNMGNMG'
         dataset_obj.refresh_from_db()
-        self.assertTrue(expected in str(dataset_obj.content))
+        self.assertTrue(expected in str(dataset_obj.get_content()))
 
     def test_create_dataset_degenerated_warning_data_cannot_be_partitioned(self):
         dataset_obj = Dataset.objects.create()
@@ -204,7 +204,7 @@ class CreateFASTADatasetTest(TestCase):
         )
         expected = 'RRRRRRRRRRRRRRRRRRRRRRRRRRR'
         dataset_obj.refresh_from_db()
-        self.assertTrue(expected in str(dataset_obj.content))
+        self.assertTrue(expected in str(dataset_obj.get_content()))
 
     def test_fasta_with_seqs_of_different_sizes(self):
         """Test that an error message is shown to the users GUI."""
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from create_dataset.matrix import SequenceMatrix
+from create_dataset.utils import CreateDataset
+from public_interface.models import Genes
+
+
+class SequenceMatrixTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        g1 = Genes.objects.get(gene_code='COI-begin')
+        g2 = Genes.objects.get(gene_code='ef1a')
+        self.cleaned_data = {
+            'gene_codes': [g1, g2],
+            'taxonset': None,
+            'voucher_codes': 'CP100-10\r\nCP100-11',
+            'geneset': None,
+            'taxon_names': ['CODE', 'GENUS', 'SPECIES'],
+            'positions': ['ALL'],
+            'translations': False,
+            'partition_by_positions': 'by gene',
+            'degen_translations': None,
+            'number_genes': None,
+            'file_format': 'FASTA',
+            'aminoacids': False,
+            'outgroup': None,
+        }
+
+    def test_load_in_one_query(self):
+        with self.assertNumQueries(1):
+            matrix = SequenceMatrix(('CP100-10', 'CP100-11'), ('COI-begin', 'ef1a'))
+        self.assertEqual(4, len(matrix))
+        self.assertIn(('CP100-10', 'COI-begin'), matrix)
+
+    def test_get_missing_cell(self):
+        matrix = SequenceMatrix(('CP100-10', 'CP1000'), ('COI-begin',))
+        self.assertIsNone(matrix.get('CP1000', 'COI-begin'))
+        self.assertIsNotNone(matrix.get('CP100-10', 'COI-begin').sequence)
+
+    def test_number_of_queries_does_not_depend_on_matrix_size(self):
+        with self.assertNumQueries(4):
+            CreateDataset(self.cleaned_data)
+
+        self.cleaned_data['voucher_codes'] = '\r\n'.join(
+            ['CP100-1{}'.format(i) for i in range(10)]
+        )
+        with self.assertNumQueries(4):
+            CreateDataset(self.cleaned_data)
+
+    def test_get_lineages(self):
+        dataset_creator = CreateDataset(self.cleaned_data)
+        result = dataset_creator.get_lineages()
+        self.assertEqual(['CP100-10', 'CP100-11'], sorted(result))
+        self.assertTrue(result['CP100-10'].startswith('Eukaryota; Metazoa;'))
+        self.assertIn('Nymphalidae; Nymphalinae', result['CP100-10'])
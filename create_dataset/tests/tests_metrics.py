@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.client import Client
+
+from create_dataset.metrics import JobMetrics
+from create_dataset.models import Dataset
+from create_dataset.tasks import create_dataset
+from public_interface.models import Genes
+
+
+class JobMetricsTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.user = User.objects.get(username='admin')
+        self.user.set_password('pass')
+        self.user.save()
+        self.c = Client()
+
+    def create_dataset(self):
+        dataset_obj = Dataset.objects.create(user=self.user)
+        gene_codes_ids = list(
+            Genes.objects.filter(gene_code__in=['COI-begin', 'ef1a']).values_list('id', flat=True)
+        )
+        create_dataset(
+            None, None, gene_codes_ids, 'CP100-10\r\nCP100-11', 'FASTA', '', ['ALL'],
+            'by gene', False, False, None, False, ['CODE', 'GENUS', 'SPECIES'], None,
+            'YES', dataset_obj.id,
+        )
+        return Dataset.objects.get(id=dataset_obj.id)
+
+    def test_stages(self):
+        metrics = JobMetrics()
+        with metrics:
+            list(Genes.objects.all())
+            metrics.start_stage('loading sequences')
+            list(Genes.objects.all())
+            list(Genes.objects.all())
+        # queries outside the with block are not counted
+        list(Genes.objects.all())
+        with metrics:
+            list(Genes.objects.all())
+
+        result = metrics.to_dict()
+        self.assertEqual(
+            ['preparing', 'loading sequences'], [i['stage'] for i in result['stages']],
+        )
+        self.assertEqual(1, result['stages'][0]['queries'])
+        self.assertEqual(3, result['stages'][1]['queries'])
+        self.assertEqual(4, result['queries'])
+        self.assertIsNone(result['peak_memory'])
+        self.assertGreater(result['max_rss'], 0)
+
+    def test_stages__trace_memory(self):
+        metrics = JobMetrics(trace_memory=True)
+        with metrics:
+            data = [str(i) for i in range(10000)]
+        self.assertEqual(10000, len(data))
+        self.assertGreater(metrics.to_dict()['peak_memory'], 0)
+
+    @override_settings(DATASET_GENES_PER_TASK=100)
+    def test_create_dataset(self):
+        result = self.create_dataset().metrics
+        self.assertEqual(
+            ['preparing', 'loading sequences', 'building sequences', 'formatting dataset',
+             'writing file'],
+            [i['stage'] for i in result['stages']],
+        )
+        self.assertEqual(2, result['input']['vouchers'])
+        self.assertEqual(2, result['input']['genes'])
+        self.assertGreater(result['input']['total_bp'], 0)
+        self.assertGreater(result['output']['file_size'], 0)
+        self.assertGreater(result['queries'], 0)
+        self.assertGreater(result['wall_time'], 0)
+
+    @override_settings(DATASET_CHECKPOINT_GENES=1, DATASET_GENES_PER_TASK=1)
+    def test_create_dataset__gene_blocks(self):
+        result = self.create_dataset().metrics
+        self.assertEqual(2, len(result['gene_blocks']))
+        self.assertEqual(
+            ['preparing', 'loading sequences', 'building sequences'],
+            [i['stage'] for i in result['gene_blocks'][0]['stages']],
+        )
+
+    def test_admin_changelist(self):
+        self.create_dataset()
+        Dataset.objects.create(user=self.user)
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        response = self.c.get('/admin/create_dataset/dataset/')
+        self.assertEqual(200, response.status_code)
+        self.assertContains(response, 'Wall time')
+        self.assertEqual(2, response.context['cl'].result_count)
@@ -0,0 +1,133 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.client import Client
+
+from create_dataset.checkpoints import DatasetCheckpoint
+from create_dataset.models import Dataset
+from create_dataset.progress import DatasetProgress, get_progress
+from create_dataset.tasks import create_dataset, create_gene_block
+from public_interface.models import Genes
+
+
+class DatasetProgressTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+        cache.clear()
+
+        self.user = User.objects.get(username='admin')
+        self.user.set_password('pass')
+        self.user.save()
+        self.c = Client()
+
+    def test_progress(self):
+        progress = DatasetProgress(1, every=10)
+        progress.start_stage('building sequences', total=100)
+        self.assertEqual(0, get_progress(1)['done'])
+
+        progress.step(5)
+        self.assertEqual(0, get_progress(1)['done'])
+
+        progress.step(5)
+        result = get_progress(1)
+        self.assertEqual('building sequences', result['stage'])
+        self.assertEqual(10, result['done'])
+        self.assertEqual(42, result['percent'])
+        self.assertIsNotNone(result['eta'])
+
+    def test_progress__stage_already_done(self):
+        progress = DatasetProgress(1)
+        progress.start_stage('building sequences', total=5, done=5)
+        result = get_progress(1)
+        self.assertEqual(5, result['done'])
+        self.assertEqual(60, result['percent'])
+
+    def test_progress__shared_stage(self):
+        first = DatasetProgress(1)
+        second = DatasetProgress(1)
+        first.start_shared_stage('building sequences', total=4)
+        second.start_shared_stage('building sequences', total=4)
+        first.step_shared(1)
+        second.step_shared(2)
+        self.assertEqual(3, get_progress(1)['done'])
+
+        # a task started later keeps the genes already built
+        DatasetProgress(1).start_shared_stage('building sequences', total=4)
+        self.assertEqual(3, get_progress(1)['done'])
+
+    def test_progress__finish(self):
+        progress = DatasetProgress(1)
+        progress.finish()
+        self.assertEqual(100, get_progress(1)['percent'])
+        self.assertIsNone(get_progress(1)['eta'])
+
+    def test_progress__unknown_stage(self):
+        self.assertRaises(ValueError, DatasetProgress(1).start_stage, 'cooking')
+
+    def test_progress__without_dataset(self):
+        DatasetProgress(None).start_stage('queued')
+        self.assertIsNone(get_progress(None))
+
+    def test_create_dataset__writes_dataset_row_once(self):
+        dataset_obj = Dataset.objects.create()
+        gene_codes_ids = list(
+            Genes.objects.filter(gene_code__in=['COI-begin', 'ef1a']).values_list('id', flat=True)
+        )
+        with patch.object(Dataset, 'save', autospec=True, side_effect=Dataset.save) as mock_save:
+            create_dataset(
+                None, None, gene_codes_ids, 'CP100-10\r\nCP100-11', 'FASTA', '',
+                ['ALL'], 'by gene', False, False, None, False,
+                ['CODE', 'GENUS', 'SPECIES'], None, 'YES', dataset_obj.id,
+            )
+        self.assertEqual(1, mock_save.call_count)
+        self.assertEqual('finished', get_progress(dataset_obj.id)['stage'])
+
+    def test_view_progress(self):
+        dataset_obj = Dataset.objects.create()
+        DatasetProgress(dataset_obj.id).start_stage('loading sequences')
+
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get(f'/create_dataset/progress/{dataset_obj.id}/')
+        self.assertEqual(200, res.status_code)
+        self.assertFalse(res.json()['completed'])
+        self.assertEqual('loading sequences', res.json()['progress']['stage'])
+
+    def test_create_gene_block__progress(self):
+        dataset_obj = Dataset.objects.create()
+        gene_codes_ids = list(
+            Genes.objects.filter(
+                gene_code__in=['COI-begin', 'ef1a', 'wingless'],
+            ).values_list('id', flat=True)
+        )
+        with self.settings(DATASET_CHECKPOINT_GENES=1):
+            create_gene_block(
+                ['COI-begin', 'ef1a'], None, None, gene_codes_ids, 'CP100-10\r\nCP100-11',
+                'FASTA', '', ['ALL'], 'by gene', False, False, None, False,
+                ['CODE', 'GENUS', 'SPECIES'], None, 'YES', dataset_obj.id,
+            )
+        DatasetCheckpoint(dataset_obj.id).delete()
+        result = get_progress(dataset_obj.id)
+        self.assertEqual('building sequences', result['stage'])
+        self.assertEqual(2, result['done'])
+        self.assertEqual(3, result['total'])
+
+    def test_view_progress__aminoacid_dataset(self):
+        dataset_obj = Dataset.objects.create()
+        aa_dataset_obj = Dataset.objects.create(sister_dataset_id=dataset_obj.id)
+        DatasetProgress(dataset_obj.id).start_stage('building sequences')
+
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get(f'/create_dataset/progress/{aa_dataset_obj.id}/')
+        self.assertEqual('building sequences', res.json()['progress']['stage'])
+
+    def test_view_progress__missing_dataset(self):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get('/create_dataset/progress/9999/')
+        self.assertEqual(404, res.status_code)
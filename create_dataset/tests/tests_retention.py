@@ -0,0 +1,132 @@
+import datetime
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from create_dataset.checkpoints import DatasetCheckpoint
+from create_dataset.models import CachedDataset, Dataset
+from create_dataset.retention import expire_datasets, get_expired_dataset_ids
+
+
+@override_settings(
+    DATASET_MAX_AGE_DAYS=90,
+    DATASET_IDLE_DAYS=30,
+    DATASET_STORAGE_MAX_SIZE=1000,
+    DATASET_RETENTION_BATCH_SIZE=2,
+)
+class RetentionTest(TestCase):
+    def setUp(self):
+        self.files_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(DATASET_FILES_ROOT=self.files_root)
+        self.settings_override.enable()
+        self.now = timezone.now()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.files_root)
+
+    def make_dataset(self, days_ago=0, size=100, last_downloaded_days_ago=None, **kwargs):
+        created = self.now - datetime.timedelta(days=days_ago)
+        file_path = f'dataset_{Dataset.objects.count()}.txt.gz'
+        with open(os.path.join(self.files_root, file_path), 'wb') as handle:
+            handle.write(b'x' * size)
+        dataset = Dataset.objects.create(file_path=file_path, compressed_size=size, **kwargs)
+        last_downloaded = None
+        if last_downloaded_days_ago is not None:
+            last_downloaded = self.now - datetime.timedelta(days=last_downloaded_days_ago)
+        # created has auto_now_add
+        Dataset.objects.filter(id=dataset.id).update(
+            created=created, completed=created, last_downloaded=last_downloaded,
+        )
+        return dataset
+
+    def test_get_expired_dataset_ids(self):
+        old = self.make_dataset(days_ago=100, last_downloaded_days_ago=1)
+        idle = self.make_dataset(days_ago=40)
+        downloaded = self.make_dataset(days_ago=40, last_downloaded_days_ago=2)
+        new = self.make_dataset(days_ago=1)
+        self.assertEqual(sorted([old.id, idle.id]), get_expired_dataset_ids(self.now))
+        self.assertTrue(Dataset.objects.filter(id__in=[downloaded.id, new.id]).exists())
+
+    def test_get_expired_dataset_ids__storage_budget(self):
+        least_used = self.make_dataset(days_ago=5, size=600)
+        used = self.make_dataset(days_ago=10, size=300, last_downloaded_days_ago=1)
+        new = self.make_dataset(days_ago=1, size=300)
+        self.assertEqual([least_used.id], get_expired_dataset_ids(self.now))
+        self.assertNotIn(used.id, get_expired_dataset_ids(self.now))
+        self.assertNotIn(new.id, get_expired_dataset_ids(self.now))
+
+    @patch('create_dataset.retention.AsyncResult')
+    def test_expire_datasets(self, mock_async_result):
+        nucleotide = self.make_dataset(days_ago=100, task_uuid='abc')
+        # aminoacid dataset of the same job is new, but is deleted with its sister
+        aa = self.make_dataset(days_ago=1, sister_dataset_id=nucleotide.id, task_uuid='abc')
+        idle = self.make_dataset(days_ago=40)
+        CachedDataset.objects.create(key='key', dataset=idle, size=100, last_used=self.now)
+        new = self.make_dataset(days_ago=1)
+
+        stats = expire_datasets(now=self.now)
+
+        self.assertEqual({'datasets': 3, 'files': 3, 'bytes': 300, 'checkpoints': 0}, stats)
+        self.assertEqual([new.id], list(Dataset.objects.values_list('id', flat=True)))
+        self.assertFalse(CachedDataset.objects.exists())
+        self.assertEqual([new.file_path], os.listdir(self.files_root))
+        mock_async_result.assert_called_with('abc')
+        mock_async_result.return_value.forget.assert_called()
+        self.assertFalse(Dataset.objects.filter(id=aa.id).exists())
+
+    @patch('create_dataset.retention.AsyncResult')
+    def test_expire_datasets__dry_run(self, mock_async_result):
+        self.make_dataset(days_ago=100)
+        stats = expire_datasets(dry_run=True, now=self.now)
+        self.assertEqual(1, stats['datasets'])
+        self.assertEqual(1, Dataset.objects.count())
+        self.assertEqual(1, len(os.listdir(self.files_root)))
+        mock_async_result.assert_not_called()
+
+    def test_expire_datasets__orphan_files(self):
+        dataset = self.make_dataset(days_ago=1)
+        orphan_path = os.path.join(self.files_root, 'NEXUS_orphan.txt.gz')
+        recent_orphan_path = os.path.join(self.files_root, 'NEXUS_recent.txt.gz')
+        for file_path in [orphan_path, recent_orphan_path]:
+            with open(file_path, 'wb') as handle:
+                handle.write(b'x' * 10)
+        two_hours_ago = (self.now - datetime.timedelta(hours=2)).timestamp()
+        os.utime(orphan_path, (two_hours_ago, two_hours_ago))
+        os.utime(os.path.join(self.files_root, dataset.file_path), (two_hours_ago, two_hours_ago))
+
+        stats = expire_datasets(now=self.now)
+
+        self.assertEqual({'datasets': 0, 'files': 1, 'bytes': 10, 'checkpoints': 0}, stats)
+        self.assertEqual(
+            sorted([dataset.file_path, 'NEXUS_recent.txt.gz']), sorted(os.listdir(self.files_root)),
+        )
+
+    def test_expire_datasets__checkpoints(self):
+        running = Dataset.objects.create()
+        finished = self.make_dataset(days_ago=1)
+        for dataset_id in [running.id, finished.id, 12345]:
+            DatasetCheckpoint(dataset_id).save_block(['COI'], {'seq_objs': []})
+
+        stats = expire_datasets(now=self.now)
+
+        self.assertEqual(2, stats['checkpoints'])
+        self.assertEqual(
+            [str(running.id)], os.listdir(os.path.join(self.files_root, 'checkpoints')),
+        )
+
+    @patch('create_dataset.retention.AsyncResult')
+    def test_command(self, mock_async_result):
+        self.make_dataset(days_ago=100)
+        out = StringIO()
+        call_command('expire_datasets', stdout=out)
+        self.assertIn(
+            'Deleted 1 datasets and 1 files (100 bytes), and 0 checkpoints', out.getvalue(),
+        )
+        self.assertFalse(Dataset.objects.exists())
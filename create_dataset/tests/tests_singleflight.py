@@ -0,0 +1,105 @@
+from unittest.mock import call, patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from create_dataset.cache import make_cache_key
+from create_dataset.models import Dataset
+from create_dataset.singleflight import (
+    get_in_flight_dataset, get_lock_key, get_subscribers_key, single_flight_lock,
+)
+from create_dataset.tasks import forget_flight, notify_attached_users
+from create_dataset.views import schedule_dataset
+from public_interface.models import Genes
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+        cache.clear()
+
+        self.cleaned_data = {
+            'gene_codes': Genes.objects.filter(gene_code__in=['COI-begin', 'ef1a']),
+            'taxonset': None,
+            'voucher_codes': 'CP100-10\r\nCP100-11',
+            'geneset': None,
+            'taxon_names': ['CODE', 'GENUS', 'SPECIES'],
+            'positions': ['ALL'],
+            'translations': False,
+            'partition_by_positions': 'by gene',
+            'degen_translations': 'normal',
+            'number_genes': None,
+            'file_format': 'FASTA',
+            'aminoacids': False,
+            'outgroup': '',
+            'special': False,
+            'introns': 'YES',
+        }
+        self.cache_key = make_cache_key(self.cleaned_data)
+        self.user = User.objects.get(username='admin')
+        self.other_user = User.objects.create_user('other', 'other@example.com', 'pass')
+
+    @patch('create_dataset.views.chord')
+    def test_schedule_dataset__in_flight(self, mock_chord):
+        dataset_id = schedule_dataset(self.cleaned_data, self.user)
+        self.assertEqual(dataset_id, schedule_dataset(self.cleaned_data, self.other_user))
+        self.assertEqual(dataset_id, schedule_dataset(self.cleaned_data, self.other_user))
+
+        mock_chord.assert_called_once()
+        self.assertEqual(1, Dataset.objects.count())
+        self.assertEqual(
+            [self.user.id, self.other_user.id], cache.get(get_subscribers_key(self.cache_key)),
+        )
+
+    @patch('create_dataset.views.chord')
+    def test_schedule_dataset__other_options(self, mock_chord):
+        dataset_id = schedule_dataset(self.cleaned_data, self.user)
+        self.cleaned_data['file_format'] = 'NEXUS'
+        self.assertNotEqual(dataset_id, schedule_dataset(self.cleaned_data, self.user))
+        self.assertEqual(2, mock_chord.call_count)
+
+    @patch('create_dataset.views.chord')
+    def test_schedule_dataset__finished_flight(self, mock_chord):
+        dataset_id = schedule_dataset(self.cleaned_data, self.user)
+        # finished with errors, so it was not cached
+        Dataset.objects.filter(id=dataset_id).update(completed=timezone.now(), errors=['error'])
+
+        self.assertIsNone(get_in_flight_dataset(self.cache_key))
+        self.assertNotEqual(dataset_id, schedule_dataset(self.cleaned_data, self.other_user))
+
+    @patch('create_dataset.tasks.notify_user')
+    @patch('create_dataset.views.chord')
+    def test_notify_attached_users(self, mock_chord, mock_notify_user):
+        dataset_id = schedule_dataset(self.cleaned_data, self.user)
+        schedule_dataset(self.cleaned_data, self.other_user)
+
+        notify_attached_users(dataset_id, self.cache_key)
+
+        mock_notify_user.assert_has_calls([
+            call(dataset_id, self.user.id),
+            call(dataset_id, self.other_user.id),
+        ])
+        self.assertIsNone(cache.get(get_subscribers_key(self.cache_key)))
+        self.assertIsNone(get_in_flight_dataset(self.cache_key))
+
+    @patch('create_dataset.views.chord')
+    def test_forget_flight(self, mock_chord):
+        dataset_id = schedule_dataset(self.cleaned_data, self.user)
+        forget_flight(self.cache_key)
+        self.assertNotEqual(dataset_id, schedule_dataset(self.cleaned_data, self.user))
+
+    def test_single_flight_lock(self):
+        with single_flight_lock('key'):
+            self.assertIsNotNone(cache.get(get_lock_key('key')))
+            # gives up waiting for the lock
+            with single_flight_lock('key', timeout=0):
+                pass
+            self.assertIsNotNone(cache.get(get_lock_key('key')))
+        self.assertIsNone(cache.get(get_lock_key('key')))
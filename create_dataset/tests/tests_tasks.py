@@ -0,0 +1,369 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from celery.exceptions import Retry, SoftTimeLimitExceeded
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from create_dataset.checkpoints import DatasetCheckpoint
+from create_dataset.models import Dataset
+from create_dataset.tasks import (
+    create_dataset, create_dataset_batch, create_gene_block, create_genbank_datasets,
+    make_cleaned_data, make_dataset_creator, make_dataset_job, make_genbank_job,
+    merge_genbank_blocks, merge_gene_blocks,
+)
+from create_dataset.utils import CreateDataset, GeneBlockCreator
+from public_interface.models import Genes
+
+
+class DatasetTaskTestCase(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.gene_codes_ids = list(
+            Genes.objects.filter(
+                gene_code__in=['COI-begin', 'ef1a', 'wingless'],
+            ).values_list('id', flat=True)
+        )
+        self.dataset_args = [
+            None,  # taxonset_id
+            None,  # geneset_id
+            self.gene_codes_ids,
+            'CP100-10\r\nCP100-11\r\nCP100-12',
+            'NEXUS',
+            '',  # outgroup
+            ['ALL'],
+            'by gene',
+            False,  # translations
+            False,  # aminoacids
+            None,  # degen_translations
+            False,  # special
+            ['CODE', 'GENUS', 'SPECIES'],
+            None,  # number_genes
+            'YES',  # introns
+        ]
+
+    def build_in_parallel(self, gene_batches, dataset_args):
+        dataset_obj = Dataset.objects.create()
+        # blocks go through the json result backend between tasks
+        blocks = [
+            json.loads(json.dumps(create_gene_block(batch, *dataset_args)))
+            for batch in gene_batches
+        ]
+        merge_gene_blocks(blocks, *dataset_args, dataset_obj.id)
+        return Dataset.objects.get(id=dataset_obj.id)
+
+    def build_in_one_task(self, dataset_args):
+        dataset_obj = Dataset.objects.create()
+        # without checkpoints, all genes are built at once by CreateDataset
+        with self.settings(DATASET_GENES_PER_TASK=100):
+            create_dataset(*dataset_args, dataset_obj.id)
+        return Dataset.objects.get(id=dataset_obj.id)
+
+
+class ParallelDatasetTest(DatasetTaskTestCase):
+    def test_merge_gene_blocks(self):
+        expected = self.build_in_one_task(self.dataset_args)
+        result = self.build_in_parallel([['COI-begin'], ['ef1a', 'wingless']], self.dataset_args)
+        self.assertEqual(expected.get_content(), result.get_content())
+        self.assertIn('charset wingless', result.get_content())
+
+    def test_merge_gene_blocks__phylip_charset_block(self):
+        self.dataset_args[4] = 'PHYLIP'
+        expected = self.build_in_one_task(self.dataset_args)
+        result = self.build_in_parallel([['COI-begin', 'ef1a'], ['wingless']], self.dataset_args)
+        self.assertEqual(expected.get_content(), result.get_content())
+        self.assertEqual(expected.charset_block, result.charset_block)
+
+    def test_merge_gene_blocks__number_genes(self):
+        self.dataset_args[13] = 3
+        expected = self.build_in_one_task(self.dataset_args)
+        result = self.build_in_parallel([['COI-begin'], ['ef1a'], ['wingless']], self.dataset_args)
+        self.assertEqual(expected.get_content(), result.get_content())
+
+    def test_make_dataset_creator__one_pass(self):
+        cleaned_data = make_cleaned_data(*self.dataset_args)
+        with patch('create_dataset.tasks.build_gene_blocks') as mock_build_gene_blocks:
+            dataset_creator = make_dataset_creator(cleaned_data, None)
+        self.assertIs(CreateDataset, type(dataset_creator))
+        mock_build_gene_blocks.assert_not_called()
+
+    @override_settings(DATASET_GENES_PER_TASK=2)
+    def test_make_dataset_job(self):
+        job = make_dataset_job(*self.dataset_args, 1)
+        self.assertEqual('celery.chord', job.task)
+        self.assertEqual(
+            [('COI-begin', 'ef1a'), ('wingless',)],
+            [tuple(task.args[0]) for task in job.tasks],
+        )
+
+    @override_settings(DATASET_GENES_PER_TASK=3)
+    def test_make_dataset_job__few_genes(self):
+        job = make_dataset_job(*self.dataset_args, 1)
+        self.assertEqual('create_dataset.tasks.create_dataset', job.task)
+
+
+class GenBankDatasetsTest(DatasetTaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset_args[4] = 'GenBankFASTA'
+
+    def build_separately(self):
+        expected = self.build_in_one_task(self.dataset_args)
+        self.dataset_args[9] = True
+        aa_expected = self.build_in_one_task(self.dataset_args)
+        self.dataset_args[9] = False
+        return expected, aa_expected
+
+    def test_create_genbank_datasets(self):
+        expected, aa_expected = self.build_separately()
+        dataset_obj = Dataset.objects.create()
+        aa_dataset_obj = Dataset.objects.create(sister_dataset_id=dataset_obj.id)
+        create_genbank_datasets(*self.dataset_args, dataset_obj.id, aa_dataset_obj.id)
+
+        result = Dataset.objects.get(id=dataset_obj.id)
+        aa_result = Dataset.objects.get(id=aa_dataset_obj.id)
+        self.assertEqual(expected.get_content(), result.get_content())
+        self.assertEqual(aa_expected.get_content(), aa_result.get_content())
+        self.assertNotEqual(result.get_content(), aa_result.get_content())
+        self.assertEqual(sorted(aa_expected.warnings), sorted(aa_result.warnings))
+        self.assertIsNotNone(aa_result.completed)
+
+    def test_create_genbank_datasets__bankit(self):
+        self.dataset_args[4] = 'Bankit'
+        expected, aa_expected = self.build_separately()
+        dataset_obj = Dataset.objects.create()
+        aa_dataset_obj = Dataset.objects.create(sister_dataset_id=dataset_obj.id)
+        create_genbank_datasets(*self.dataset_args, dataset_obj.id, aa_dataset_obj.id)
+
+        self.assertEqual(
+            expected.get_content(), Dataset.objects.get(id=dataset_obj.id).get_content(),
+        )
+        self.assertEqual(
+            aa_expected.get_content(), Dataset.objects.get(id=aa_dataset_obj.id).get_content(),
+        )
+
+    def test_merge_genbank_blocks(self):
+        expected, aa_expected = self.build_separately()
+        dataset_obj = Dataset.objects.create()
+        aa_dataset_obj = Dataset.objects.create(sister_dataset_id=dataset_obj.id)
+        blocks = [
+            json.loads(json.dumps(create_gene_block(batch, *self.dataset_args)))
+            for batch in [['COI-begin'], ['ef1a', 'wingless']]
+        ]
+        merge_genbank_blocks(blocks, *self.dataset_args, dataset_obj.id, aa_dataset_obj.id)
+
+        self.assertEqual(
+            expected.get_content(), Dataset.objects.get(id=dataset_obj.id).get_content(),
+        )
+        self.assertEqual(
+            aa_expected.get_content(), Dataset.objects.get(id=aa_dataset_obj.id).get_content(),
+        )
+
+    @override_settings(DATASET_GENES_PER_TASK=2)
+    def test_make_genbank_job(self):
+        job = make_genbank_job(*self.dataset_args, 1, 2)
+        self.assertEqual('celery.chord', job.task)
+        self.assertEqual('create_dataset.tasks.merge_genbank_blocks', job.body.task)
+
+    @override_settings(DATASET_GENES_PER_TASK=3)
+    def test_make_genbank_job__few_genes(self):
+        job = make_genbank_job(*self.dataset_args, 1, 2)
+        self.assertEqual('create_dataset.tasks.create_genbank_datasets', job.task)
+        self.assertEqual((1, 2), tuple(job.args[-2:]))
+
+
+class DatasetBatchTest(DatasetTaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.variants = [
+            {
+                'file_format': 'NEXUS', 'outgroup': '', 'positions': ['ALL'],
+                'partition_by_positions': 'by gene', 'translations': False,
+                'aminoacids': False, 'degen_translations': None,
+            },
+            {
+                'file_format': 'PHYLIP', 'outgroup': 'CP100-12', 'positions': ['1st', '2nd'],
+                'partition_by_positions': 'by codon position', 'translations': False,
+                'aminoacids': False, 'degen_translations': None,
+            },
+            {
+                'file_format': 'FASTA', 'outgroup': '', 'positions': ['ALL'],
+                'partition_by_positions': 'by gene', 'translations': False,
+                'aminoacids': True, 'degen_translations': None,
+            },
+        ]
+
+    def run_batch(self, dataset_obj_ids):
+        with self.settings(DATASET_GENES_PER_TASK=100):
+            create_dataset_batch(
+                *self.dataset_args[:4], *self.dataset_args[11:], self.variants, dataset_obj_ids,
+            )
+
+    def test_create_dataset_batch(self):
+        expected = []
+        for variant in self.variants:
+            dataset_args = list(self.dataset_args)
+            dataset_args[4:11] = variant.values()
+            expected.append(self.build_in_one_task(dataset_args))
+
+        dataset_obj_ids = [Dataset.objects.create().id for _ in self.variants]
+        with patch('create_dataset.utils.CreateDataset.create_seq_objs',
+                   autospec=True, side_effect=CreateDataset.create_seq_objs) as mock_create:
+            self.run_batch(dataset_obj_ids)
+        # sequences are read once for all datasets
+        mock_create.assert_called_once()
+
+        for expected_dataset, dataset_obj_id in zip(expected, dataset_obj_ids):
+            result = Dataset.objects.get(id=dataset_obj_id)
+            self.assertEqual(expected_dataset.get_content(), result.get_content())
+            self.assertEqual(expected_dataset.charset_block, result.charset_block)
+            self.assertIsNotNone(result.completed)
+
+    def test_create_dataset_batch__completed_datasets_are_skipped(self):
+        dataset_obj_ids = [Dataset.objects.create().id for _ in self.variants]
+        Dataset.objects.filter(id=dataset_obj_ids[1]).update(content='done', completed=timezone.now())
+        self.run_batch(dataset_obj_ids)
+        self.assertEqual('done', Dataset.objects.get(id=dataset_obj_ids[1]).content)
+        self.assertIsNotNone(Dataset.objects.get(id=dataset_obj_ids[2]).completed)
+
+    def test_create_dataset_batch__invalid_first_variant(self):
+        self.variants[0].update(
+            {'positions': ['1st'], 'translations': True, 'degen_translations': 'normal'},
+        )
+        dataset_args = list(self.dataset_args)
+        dataset_args[4:11] = self.variants[2].values()
+        expected = self.build_in_one_task(dataset_args)
+
+        dataset_obj_ids = [Dataset.objects.create().id for _ in self.variants]
+        self.run_batch(dataset_obj_ids)
+        first = Dataset.objects.get(id=dataset_obj_ids[0])
+        self.assertEqual(
+            ['Cannot degenerate codons if you have not selected all codon positions'],
+            first.errors,
+        )
+        result = Dataset.objects.get(id=dataset_obj_ids[2])
+        self.assertEqual([], result.errors)
+        self.assertEqual(expected.get_content(), result.get_content())
+
+    def test_create_variant__genbank_fasta(self):
+        cleaned_data = make_cleaned_data(*self.dataset_args)
+        dataset_creator = CreateDataset(cleaned_data)
+        with self.assertRaises(ValueError):
+            dataset_creator.create_variant({'file_format': 'GenBankFASTA'})
+
+
+class CheckpointTest(DatasetTaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            DATASET_FILES_ROOT=self.files_root, DATASET_CHECKPOINT_GENES=1,
+            DATASET_GENES_PER_TASK=1,
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.files_root)
+
+    def test_create_dataset__continuation(self):
+        expected = self.build_in_one_task(self.dataset_args)
+        dataset_obj = Dataset.objects.create()
+        calls = []
+
+        class StoppedGeneBlockCreator(GeneBlockCreator):
+            def __init__(self, cleaned_data, gene_codes, dataset_obj_id=None):
+                calls.append(tuple(gene_codes))
+                if len(calls) == 2:
+                    raise SoftTimeLimitExceeded()
+                super().__init__(cleaned_data, gene_codes, dataset_obj_id)
+
+        with patch('create_dataset.checkpoints.GeneBlockCreator', StoppedGeneBlockCreator), \
+                patch.object(create_dataset, 'retry', side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                create_dataset(*self.dataset_args, dataset_obj.id)
+        mock_retry.assert_called_once()
+        self.assertIsNotNone(DatasetCheckpoint(dataset_obj.id).load_block(['COI-begin']))
+        self.assertIsNone(Dataset.objects.get(id=dataset_obj.id).completed)
+
+        # the continuation skips COI-begin
+        calls.clear()
+        with patch('create_dataset.checkpoints.GeneBlockCreator', wraps=GeneBlockCreator) \
+                as mock_creator:
+            create_dataset(*self.dataset_args, dataset_obj.id)
+        self.assertEqual(
+            [('ef1a',), ('wingless',)],
+            [tuple(call_args[0][1]) for call_args in mock_creator.call_args_list],
+        )
+
+        result = Dataset.objects.get(id=dataset_obj.id)
+        self.assertEqual(expected.get_content(), result.get_content())
+        self.assertFalse(os.path.exists(DatasetCheckpoint(dataset_obj.id).path))
+
+    def make_stopped_creator(self, calls, stop_at):
+        class StoppedGeneBlockCreator(GeneBlockCreator):
+            def __init__(self, cleaned_data, gene_codes, dataset_obj_id=None):
+                calls.append(tuple(gene_codes))
+                if len(calls) == stop_at:
+                    raise SoftTimeLimitExceeded()
+                super().__init__(cleaned_data, gene_codes, dataset_obj_id)
+
+        return StoppedGeneBlockCreator
+
+    def test_create_gene_block__continuation(self):
+        dataset_obj = Dataset.objects.create()
+        gene_codes = ['COI-begin', 'ef1a', 'wingless']
+        expected = create_gene_block(gene_codes, *self.dataset_args)
+
+        calls = []
+        with patch('create_dataset.checkpoints.GeneBlockCreator',
+                   self.make_stopped_creator(calls, stop_at=3)), \
+                patch.object(create_gene_block, 'retry', side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                create_gene_block(gene_codes, *self.dataset_args, dataset_obj.id)
+        mock_retry.assert_called_once()
+
+        # the retry builds only the gene it did not save
+        with patch('create_dataset.checkpoints.GeneBlockCreator', wraps=GeneBlockCreator) \
+                as mock_creator:
+            blocks = create_gene_block(gene_codes, *self.dataset_args, dataset_obj.id)
+        self.assertEqual(
+            [('wingless',)],
+            [tuple(call_args[0][1]) for call_args in mock_creator.call_args_list],
+        )
+        self.assertEqual(
+            [block['seq_objs'] for block in expected], [block['seq_objs'] for block in blocks],
+        )
+
+    def test_create_gene_block__no_retry_without_new_checkpoint(self):
+        dataset_obj = Dataset.objects.create()
+        with patch('create_dataset.checkpoints.GeneBlockCreator',
+                   self.make_stopped_creator([], stop_at=1)), \
+                patch.object(create_gene_block, 'retry', side_effect=Retry()) as mock_retry:
+            with self.assertRaises(SoftTimeLimitExceeded):
+                create_gene_block(['COI-begin', 'ef1a'], *self.dataset_args, dataset_obj.id)
+        mock_retry.assert_not_called()
+
+    def test_create_gene_block__checkpoints(self):
+        dataset_obj = Dataset.objects.create()
+        blocks = create_gene_block(['COI-begin', 'ef1a'], *self.dataset_args, dataset_obj.id)
+        self.assertEqual([['COI-begin'], ['ef1a']], [list(block['gene_codes']) for block in blocks])
+        self.assertEqual(
+            blocks[1]['seq_objs'], DatasetCheckpoint(dataset_obj.id).load_block(['ef1a'])['seq_objs'],
+        )
+
+    def test_dataset_checkpoint__without_dataset(self):
+        checkpoint = DatasetCheckpoint(None)
+        checkpoint.save_block(['COI-begin'], {'seq_objs': []})
+        self.assertIsNone(checkpoint.load_block(['COI-begin']))
+        self.assertEqual([], os.listdir(self.files_root))
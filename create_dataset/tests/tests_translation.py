@@ -0,0 +1,108 @@
+import random
+import warnings
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+from seqrecord_expanded import SeqRecordExpanded
+
+from create_dataset.translation import (
+    GENETIC_CODES, TranslatedSeqRecord, degenerate_sequences, prepare_translations,
+    translate_sequences,
+)
+from create_dataset.utils import CreateDataset
+from public_interface.models import Genes, Sequences
+
+
+def make_random_sequences(number, alphabet='ACGTACGTACGTRYN?acgt'):
+    generator = random.Random(1)
+    return [
+        ''.join(generator.choice(alphabet) for _ in range(generator.randint(0, 40)))
+        for _ in range(number)
+    ]
+
+
+class TranslationTablesTest(TestCase):
+    def setUp(self):
+        self.sequences = make_random_sequences(50)
+
+    def test_translate_sequences(self):
+        for genetic_code in GENETIC_CODES:
+            translated, invalid = translate_sequences(self.sequences, genetic_code)
+            expected = []
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                for sequence in self.sequences:
+                    seq_obj = SeqRecordExpanded(sequence, reading_frame=1, table=genetic_code)
+                    expected.append(seq_obj.translate())
+            self.assertEqual(expected, translated, f'genetic code {genetic_code}')
+            self.assertEqual([], invalid)
+
+    def test_translate_sequences__invalid_codons(self):
+        translated, invalid = translate_sequences(['ATGA-GAAA', 'ATGZZZ', 'TTT---'], 1)
+        self.assertEqual(['MXK', 'MX', 'F-'], translated)
+        self.assertEqual([(0, 1), (1, 1)], invalid)
+
+    def test_degenerate_sequences(self):
+        for method in ['normal', 'S', 'Z', 'SZ']:
+            degenerated = degenerate_sequences(self.sequences, 1, method)
+            expected = []
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                for sequence in self.sequences:
+                    seq_obj = SeqRecordExpanded(sequence, reading_frame=1, table=1)
+                    expected.append(seq_obj.degenerate(method))
+            self.assertEqual(expected, degenerated, f'method {method}')
+
+    def test_degenerate_sequences__unknown_method(self):
+        with self.assertRaises(ValueError):
+            degenerate_sequences(['ATG'], 2, 'S')
+
+    def test_prepare_translations(self):
+        seq_objs = [
+            SeqRecordExpanded('CATGAAA', voucher_code='A', gene_code='g', reading_frame=2, table=1),
+            SeqRecordExpanded('ATGAAA', voucher_code='B', gene_code='g', reading_frame=None, table=1),
+        ]
+        records, errors = prepare_translations(seq_objs, aminoacids=True)
+        self.assertIsInstance(records[0], TranslatedSeqRecord)
+        self.assertEqual('MK', records[0].translate())
+        # records without reading frame are left as they are
+        self.assertIs(seq_objs[1], records[1])
+        self.assertEqual([], errors)
+
+    def test_prepare_translations__errors(self):
+        seq_objs = [
+            SeqRecordExpanded('ATGZZZATG', voucher_code='A', gene_code='g', reading_frame=1, table=1),
+        ]
+        records, errors = prepare_translations(seq_objs, aminoacids=True)
+        self.assertEqual('MXM', records[0].translate())
+        self.assertEqual(["Gene g, sequence A: Codon 'ZZZ' is invalid."], errors)
+
+
+class CreateDatasetTranslationTest(TestCase):
+    def setUp(self):
+        args = []
+        opts = {'dumpfile': settings.MEDIA_ROOT + 'test_data.xml', 'verbosity': 0}
+        cmd = 'migrate_db'
+        call_command(cmd, *args, **opts)
+
+        self.cleaned_data = {
+            'taxonset': None, 'geneset': None,
+            'gene_codes': Genes.objects.filter(gene_code__in=['COI-begin', 'ef1a']),
+            'voucher_codes': 'CP100-10\r\nCP100-11\r\nCP100-12',
+            'file_format': 'NEXUS', 'outgroup': '', 'positions': ['ALL'],
+            'partition_by_positions': 'by gene', 'translations': False,
+            'aminoacids': True, 'degen_translations': None, 'special': False,
+            'taxon_names': ['CODE', 'GENUS', 'SPECIES'], 'number_genes': None,
+            'introns': 'YES',
+        }
+
+    def test_invalid_codons_do_not_stop_dataset(self):
+        seq = Sequences.objects.get(code='CP100-10', gene__gene_code='COI-begin')
+        seq.sequences = 'ZZZ' + seq.sequences[3:]
+        seq.save()
+
+        dataset = CreateDataset(self.cleaned_data)
+        self.assertIn('[ef1a]', dataset.dataset_str)
+        self.assertEqual(1, len(dataset.errors))
+        self.assertIn('Gene COI-begin, sequence CP100-10', str(dataset.errors[0]))
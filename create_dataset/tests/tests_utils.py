@@ -4,7 +4,7 @@ from django.conf import settings
 from django.core.management import call_command
 
 from create_dataset.utils import CreateDataset
-from public_interface.models import Genes
+from public_interface.models import Genes, Sequences
 from public_interface.models import TaxonSets
 
 
@@ -1006,3 +1006,20 @@ GGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGGG
         dataset_creator = CreateDataset(cleaned_data)
         self.assertIn('>CP100_10_Papilionoidea_Aus_aus', dataset_creator.dataset_str)
 
+    def test_create_seq_objs__minimum_number_of_genes__prefilter(self):
+        Sequences.objects.filter(code_id='CP100-11', gene__gene_code='ef1a').delete()
+        cleaned_data = self.cleaned_data
+        cleaned_data['number_genes'] = 2
+        cleaned_data['voucher_codes'] = 'CP100-10\r\nCP100-11\r\nCP100-12'
+
+        class CreateDatasetWithoutPrefilter(CreateDataset):
+            def prefilter_vouchers_with_few_genes(self, gene_codes):
+                return self.voucher_codes
+
+        expected = CreateDatasetWithoutPrefilter(cleaned_data)
+        dataset_creator = CreateDataset(cleaned_data)
+        self.assertNotIn('CP100_11', dataset_creator.dataset_str)
+        self.assertEqual(expected.dataset_str, dataset_creator.dataset_str)
+        self.assertEqual(('CP100-10', 'CP100-12'), dataset_creator.voucher_codes)
+        self.assertIn('1 vouchers were discarded because they have fewer than 2 genes',
+                      dataset_creator.warnings)
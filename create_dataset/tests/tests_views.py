@@ -1,3 +1,6 @@
+import gzip
+import json
+from io import StringIO
 from unittest.mock import patch
 
 from django.conf import settings
@@ -5,6 +8,7 @@ from django.core.management import call_command
 from django.db import connection
 from django.test import TestCase
 from django.test.client import Client
+from django.utils import timezone
 
 from create_dataset.models import Dataset
 from create_dataset.tasks import create_dataset
@@ -66,7 +70,112 @@ class CreateDatasetViewsTest(TestCase):
         )
         dataset_obj.refresh_from_db()
         expected = 'ACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACG'
-        self.assertIn(expected, dataset_obj.content)
+        self.assertIn(expected, dataset_obj.get_content())
+
+    def test_serve_file(self):
+        dataset_obj = Dataset.objects.create()
+        create_dataset(
+            taxonset_id=1,
+            geneset_id=1,
+            gene_codes_ids=[],
+            voucher_codes='CP100-10',
+            file_format='FASTA',
+            outgroup='',
+            positions='ALL',
+            partition_by_positions='by gene',
+            translations=False,
+            aminoacids=False,
+            degen_translations='normal',
+            special=False,
+            taxon_names=['CODE', 'GENUS', 'SPECIES'],
+            number_genes='',
+            introns='YES',
+            dataset_obj_id=dataset_obj.id,
+        )
+        dataset_obj.refresh_from_db()
+        self.assertIsNone(dataset_obj.content)
+        self.assertEqual(64, len(dataset_obj.checksum))
+
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get(f'/create_dataset/download/{dataset_obj.id}/')
+        self.assertTrue(res.streaming)
+        content = b''.join(res.streaming_content)
+        self.assertEqual(dataset_obj.file_size, len(content))
+        self.assertIn(b">CP100_10_Aus_aus\nACGACGACG", content)
+
+    def make_finished_dataset(self):
+        dataset_obj = Dataset.objects.create()
+        create_dataset(
+            taxonset_id=1,
+            geneset_id=1,
+            gene_codes_ids=[],
+            voucher_codes='CP100-10',
+            file_format='FASTA',
+            outgroup='',
+            positions='ALL',
+            partition_by_positions='by gene',
+            translations=False,
+            aminoacids=False,
+            degen_translations='normal',
+            special=False,
+            taxon_names=['CODE', 'GENUS', 'SPECIES'],
+            number_genes='',
+            introns='YES',
+            dataset_obj_id=dataset_obj.id,
+        )
+        dataset_obj.refresh_from_db()
+        return dataset_obj
+
+    def test_serve_file__gzip_encoding(self):
+        dataset_obj = self.make_finished_dataset()
+        self.assertTrue(dataset_obj.is_compressed())
+        self.assertLess(dataset_obj.compressed_size, dataset_obj.file_size)
+
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get(f'/create_dataset/download/{dataset_obj.id}/',
+                         HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual('gzip', res['Content-Encoding'])
+        self.assertIn('Accept-Encoding', res['Vary'])
+        content = gzip.decompress(b''.join(res.streaming_content))
+        self.assertEqual(dataset_obj.get_content().encode('utf-8'), content)
+
+    def test_serve_file__gzip_refused(self):
+        dataset_obj = self.make_finished_dataset()
+
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get(f'/create_dataset/download/{dataset_obj.id}/',
+                         HTTP_ACCEPT_ENCODING='deflate, gzip;q=0')
+        self.assertFalse(res.has_header('Content-Encoding'))
+        content = b''.join(res.streaming_content)
+        self.assertEqual(dataset_obj.get_content().encode('utf-8'), content)
+
+    def test_serve_file__gz_file(self):
+        dataset_obj = self.make_finished_dataset()
+
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get(f'/create_dataset/download/{dataset_obj.id}/gz/')
+        self.assertEqual('application/gzip', res['Content-Type'])
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertIn(f'dataset_{dataset_obj.id}.txt.gz', res['Content-Disposition'])
+        content = gzip.decompress(b''.join(res.streaming_content))
+        self.assertEqual(dataset_obj.get_content().encode('utf-8'), content)
+        self.assertIsNotNone(Dataset.objects.get(id=dataset_obj.id).last_downloaded)
+
+    def test_serve_file__gz_file_for_content_in_database(self):
+        dataset_obj = Dataset.objects.create(content='>CP100_10\nACGT\n', completed=timezone.now())
+
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get(f'/create_dataset/download/{dataset_obj.id}/gz/')
+        self.assertEqual(b'>CP100_10\nACGT\n', gzip.decompress(res.content))
+
+    def test_compress_datasets(self):
+        dataset_obj = Dataset.objects.create(content='>CP100_10\nACGT\n', completed=timezone.now())
+        call_command('compress_datasets', stdout=StringIO())
+
+        dataset_obj.refresh_from_db()
+        self.assertIsNone(dataset_obj.content)
+        self.assertTrue(dataset_obj.is_compressed())
+        self.assertEqual('>CP100_10\nACGT\n', dataset_obj.get_content())
 
     def test_view_result_invalid_form(self):
         self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
@@ -106,7 +215,7 @@ class CreateDatasetViewsTest(TestCase):
         )
         expected = ">CP100_10_Aus_aus\nACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACGACG"
         dataset_obj.refresh_from_db()
-        self.assertIn(expected, dataset_obj.content)
+        self.assertIn(expected, dataset_obj.get_content())
 
     def test_create_dataset__aa_with_bad_codon(self):
         """Test when trying to translate 'N--' codon. Should translate to X"""
@@ -163,6 +272,86 @@ class CreateDatasetViewsTest(TestCase):
                           )
         self.assertEqual(302, res.status_code)
 
+    def get_preview_data(self, **kwargs):
+        data = {
+            'voucher_codes': 'CP100-10\r\nCP100-11\r\nCP100-12',
+            'gene_codes': self.g1.id,  # COI-begin
+            'geneset': '',
+            'taxonset': '',
+            'introns': 'YES',
+            'file_format': 'PHYLIP',
+            'degen_translations': 'normal',
+            'outgroup': '',
+            'positions': 'ALL',
+            'partition_by_positions': 'by gene',
+            'taxon_names': ['CODE', 'GENUS', 'SPECIES'],
+        }
+        data.update(kwargs)
+        return data
+
+    @patch('create_dataset.views.schedule_dataset')
+    def test_preview(self, mock_schedule_dataset):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        with self.settings(DATASET_PREVIEW_TAXA=2):
+            res = self.c.post('/create_dataset/preview/', self.get_preview_data())
+        self.assertEqual(200, res.status_code)
+        data = res.json()
+        self.assertEqual(2, data['number_taxa'])
+        self.assertEqual(3, data['total_taxa'])
+        self.assertIn('CP100_10', data['dataset'])
+        self.assertNotIn('CP100_12', data['dataset'])
+        self.assertIn('COI-begin', data['charset_block'])
+        mock_schedule_dataset.assert_not_called()
+        self.assertEqual(0, Dataset.objects.count())
+
+    def test_preview__outgroup(self):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        with self.settings(DATASET_PREVIEW_TAXA=1):
+            res = self.c.post(
+                '/create_dataset/preview/',
+                self.get_preview_data(file_format='NEXUS', outgroup='CP100-12'),
+            )
+        data = res.json()
+        self.assertEqual(2, data['number_taxa'])
+        self.assertIn('CP100_12', data['dataset'])
+        self.assertNotIn('CP100_11', data['dataset'])
+
+    def test_preview__archive(self):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.post(
+            '/create_dataset/preview/',
+            self.get_preview_data(
+                file_format='NEXUS_ARCHIVE',
+                gene_codes=[self.g1.id, Genes.objects.get(gene_code='ef1a').id],
+            ),
+        )
+        data = res.json()
+        self.assertTrue(data['dataset'].startswith('#NEXUS'))
+        self.assertEqual([], data['errors'])
+        self.assertIn('Preview shows only the file of gene COI-begin', ' '.join(data['warnings']))
+        self.assertEqual(0, Dataset.objects.count())
+
+    def test_preview__binary_matrix(self):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.post(
+            '/create_dataset/preview/',
+            self.get_preview_data(file_format='NPY', translations=False),
+        )
+        data = res.json()
+        self.assertEqual('', data['dataset'])
+        self.assertEqual(['Preview is not available for binary matrices'], data['errors'])
+
+    def test_preview__invalid_form(self):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.post('/create_dataset/preview/', {'voucher_codes': ''})
+        self.assertEqual(400, res.status_code)
+        self.assertIn('form_errors', res.json())
+
+    def test_preview__get(self):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.c.get('/create_dataset/preview/')
+        self.assertEqual(405, res.status_code)
+
     def test_results(self):
         dataset = Dataset.objects.create()
         self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
@@ -173,3 +362,62 @@ class CreateDatasetViewsTest(TestCase):
         self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
         res = self.c.post('/create_dataset/results/1/')
         self.assertEqual(404, res.status_code)
+
+    def post_batch(self, data):
+        return self.c.post(
+            '/create_dataset/batch/', json.dumps(data), content_type='application/json',
+        )
+
+    def get_batch_data(self, variants):
+        data = self.get_preview_data(gene_codes=[self.g1.id], positions=['ALL'])
+        del data['file_format']
+        data['variants'] = variants
+        return data
+
+    @patch('create_dataset.views.chain')
+    def test_batch(self, mock_chain):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.post_batch(self.get_batch_data([
+            {'file_format': 'FASTA'},
+            {'file_format': 'NEXUS', 'positions': ['1st', '2nd']},
+        ]))
+        self.assertEqual(202, res.status_code)
+        datasets = res.json()['datasets']
+        self.assertEqual(2, len(datasets))
+        self.assertEqual(
+            f"/create_dataset/results/{datasets[0]['id']}/", datasets[0]['results_url'],
+        )
+        dataset_objs = Dataset.objects.filter(id__in=[i['id'] for i in datasets])
+        # one job for all datasets
+        self.assertEqual(1, len({i.task_uuid for i in dataset_objs}))
+        mock_chain.return_value.apply_async.assert_called_once()
+
+        job = mock_chain.call_args[0][0]
+        variants = job.args[-2]
+        self.assertEqual(['FASTA', 'NEXUS'], [i['file_format'] for i in variants])
+        self.assertEqual(['1st', '2nd'], variants[1]['positions'])
+
+    @patch('create_dataset.views.chain')
+    def test_batch__invalid_variants(self, mock_chain):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        res = self.post_batch(self.get_batch_data([
+            {'file_format': 'FASTA'},
+            {'file_format': 'FASTA', 'voucher_codes': 'CP100-10'},
+            {'file_format': 'Bankit'},
+            {'file_format': 'GenBankFASTA'},
+        ]))
+        self.assertEqual(400, res.status_code)
+        form_errors = res.json()['form_errors']
+        self.assertEqual(['1', '2', '3'], sorted(form_errors))
+        self.assertIn('voucher_codes', form_errors['1'])
+        mock_chain.assert_not_called()
+        self.assertEqual(0, Dataset.objects.count())
+
+    def test_batch__too_many_variants(self):
+        self.c.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        with self.settings(DATASET_BATCH_MAX_VARIANTS=1):
+            res = self.post_batch(self.get_batch_data([
+                {'file_format': 'FASTA'}, {'file_format': 'NEXUS'},
+            ]))
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(0, Dataset.objects.count())
@@ -0,0 +1,313 @@
+"""Translation and degeneration of sequences with codon lookup tables.
+
+Codons are translated with tables computed once per NCBI genetic code, and
+degenerated with the tables of ``degenerate_dna`` (Zwick et al.), instead of
+one sequence at a time with Biopython. Sequences of one gene are stacked in
+a matrix, turned into an array of codon indices and looked up at once.
+
+Codons with gaps mixed with bases, or with characters that are not IUPAC
+codes, cannot be translated. They are translated as ``X`` and reported as
+errors of their sequence, so that the rest of the dataset is still made.
+"""
+import itertools
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from Bio.Data.CodonTable import TranslationError, unambiguous_dna_by_id
+from Bio.Seq import Seq
+from degenerate_dna import tables as degenerate_tables
+from seqrecord_expanded import SeqRecordExpanded
+from seqrecord_expanded.exceptions import TranslationErrorMixedGappedSeq
+
+
+# IUPAC codes, N last, and the gap
+SYMBOLS = 'ACGTMRWSYKVHDBN-'
+# index of characters that are neither IUPAC codes nor gaps
+INVALID = len(SYMBOLS)
+NUMBER_SYMBOLS = len(SYMBOLS) + 1
+NUMBER_CODONS = NUMBER_SYMBOLS ** 3
+
+GENETIC_CODES = tuple(sorted(unambiguous_dna_by_id))
+
+# tables of degenerate_dna by genetic code and method of Zwick et al.
+DEGENERACY_TABLES = {
+    (1, 'normal'): degenerate_tables.degen_table_1,
+    (1, 'S'): degenerate_tables.degen_S,
+    (1, 'Z'): degenerate_tables.degen_Z,
+    (1, 'SZ'): degenerate_tables.degen_SZ,
+    (5, 'normal'): degenerate_tables.degen_table_5,
+}
+
+# codons with ambiguous 1st or 2nd positions are degenerated to NNN
+ambiguous_start_re = re.compile('^[MWRYSKHVDBN]|^[ACTG][MWRYSKHVDBN]')
+
+# leading bases dropped before translating, as SeqRecordExpanded does
+TRANSLATION_OFFSETS = {1: 0, 2: 1, 3: 2}
+
+
+def make_symbol_index() -> np.ndarray:
+    """Symbol index of each byte. ``?`` is read as ``N``."""
+    index = np.full(256, INVALID, dtype=np.intp)
+    for position, symbol in enumerate(SYMBOLS):
+        index[ord(symbol)] = position
+        index[ord(symbol.lower())] = position
+    index[ord('?')] = SYMBOLS.index('N')
+    return index
+
+
+SYMBOL_INDEX = make_symbol_index()
+
+
+def make_clean_bytes() -> np.ndarray:
+    """Upper case of each byte, and ``N`` for ``?``, as ``degenerate_dna``
+    cleans the codons it keeps.
+    """
+    clean = np.arange(256, dtype=np.uint8)
+    for symbol in SYMBOLS:
+        clean[ord(symbol.lower())] = ord(symbol)
+    clean[ord('?')] = ord('N')
+    return clean
+
+
+CLEAN_BYTES = make_clean_bytes()
+
+
+def iter_codons():
+    """Yields (codon index, codon string). Invalid characters are ``!``."""
+    symbols = list(SYMBOLS) + ['!']
+    for index, codon in enumerate(itertools.product(symbols, repeat=3)):
+        yield index, ''.join(codon)
+
+
+@lru_cache(maxsize=None)
+def get_translation_table(genetic_code: int) -> np.ndarray:
+    """Aminoacid of each codon index as a byte, 0 for codons that cannot be
+    translated.
+    """
+    if genetic_code not in unambiguous_dna_by_id:
+        raise ValueError(f'unknown genetic code {genetic_code}')
+
+    table = np.zeros(NUMBER_CODONS, dtype=np.uint8)
+    for index, codon in iter_codons():
+        if '!' in codon:
+            continue
+        try:
+            aminoacid = str(Seq(codon).translate(table=genetic_code, gap='-'))
+        except TranslationError:
+            continue
+        table[index] = ord(aminoacid)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=None)
+def get_degeneracy_table(genetic_code: int, method: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Degenerated codon of each codon index.
+
+    Returns:
+        array of shape (number of codons, 3) with the bytes of the
+        degenerated codons, and a boolean array of the codons that are kept
+        as they are.
+    """
+    try:
+        degeneracy = DEGENERACY_TABLES[(genetic_code, method)]
+    except KeyError:
+        raise ValueError(
+            f'cannot degenerate with genetic code {genetic_code} and method {method}'
+        )
+
+    table = np.zeros((NUMBER_CODONS, 3), dtype=np.uint8)
+    unchanged = np.zeros(NUMBER_CODONS, dtype=bool)
+    for index, codon in iter_codons():
+        if ambiguous_start_re.search(codon):
+            degenerated = 'NNN'
+        elif codon in degeneracy:
+            degenerated = degeneracy[codon]
+        else:
+            unchanged[index] = True
+            continue
+        table[index] = np.frombuffer(degenerated.encode('ascii'), dtype=np.uint8)
+    table.flags.writeable = False
+    unchanged.flags.writeable = False
+    return table, unchanged
+
+
+def encode_sequences(sequences: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stacks sequences in a ``uint8`` matrix, padding them with ``?``.
+
+    Returns:
+        the matrix and the length of each sequence.
+    """
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.intp)
+    width = int(lengths.max()) if len(sequences) else 0
+    width += -width % 3
+    matrix = np.full((len(sequences), width), ord('?'), dtype=np.uint8)
+    for row, sequence in enumerate(sequences):
+        matrix[row, :len(sequence)] = np.frombuffer(
+            sequence.encode('ascii', 'replace'), dtype=np.uint8,
+        )
+    return matrix, lengths
+
+
+def get_codon_indices(matrix: np.ndarray) -> np.ndarray:
+    """Codon index of each codon of the rows, of shape (rows, codons)."""
+    symbols = SYMBOL_INDEX[matrix].reshape(matrix.shape[0], -1, 3)
+    return (
+        symbols[:, :, 0] * NUMBER_SYMBOLS * NUMBER_SYMBOLS
+        + symbols[:, :, 1] * NUMBER_SYMBOLS
+        + symbols[:, :, 2]
+    )
+
+
+def translate_sequences(sequences: List[str], genetic_code: int):
+    """Translates sequences that start with a full codon.
+
+    Trailing bases of partial codons are dropped, as Biopython does.
+
+    Returns:
+        list of aminoacid sequences, and list of (row, codon) of the codons
+        that could not be translated.
+    """
+    if not sequences:
+        return [], []
+    matrix, lengths = encode_sequences(sequences)
+    aminoacids = get_translation_table(genetic_code)[get_codon_indices(matrix)]
+
+    invalid_rows, invalid_codons = np.nonzero(aminoacids == 0)
+    aminoacids[invalid_rows, invalid_codons] = ord('X')
+    number_codons = lengths // 3
+    invalid = [
+        (int(row), int(codon))
+        for row, codon in zip(invalid_rows, invalid_codons)
+        if codon < number_codons[row]
+    ]
+    translated = [
+        aminoacids[row, :number_codons[row]].tobytes().decode('ascii')
+        for row in range(len(sequences))
+    ]
+    return translated, invalid
+
+
+def degenerate_sequences(sequences: List[str], genetic_code: int, method: str) -> List[str]:
+    """Degenerates sequences that start with a full codon.
+
+    Codons that cannot be degenerated and trailing bases of partial codons
+    are kept as they are, as ``degenerate_dna`` does.
+    """
+    if not sequences:
+        return []
+    matrix, lengths = encode_sequences(sequences)
+    table, unchanged = get_degeneracy_table(genetic_code, method)
+    codon_indices = get_codon_indices(matrix)
+
+    codons = CLEAN_BYTES[matrix].reshape(matrix.shape[0], -1, 3)
+    degenerated = np.where(
+        unchanged[codon_indices][:, :, np.newaxis], codons, table[codon_indices],
+    ).reshape(matrix.shape[0], -1)
+
+    result = []
+    for row, sequence in enumerate(sequences):
+        full_codons = lengths[row] - lengths[row] % 3
+        result.append(
+            degenerated[row, :full_codons].tobytes().decode('ascii') + sequence[full_codons:]
+        )
+    return result
+
+
+class TranslatedSeqRecord(SeqRecordExpanded):
+    """SeqRecordExpanded with its translation or degenerated sequence
+    already computed.
+
+    ``dataset_creator`` calls ``translate`` and ``degenerate`` of each
+    record, which return them instead of computing them again.
+    """
+    def __init__(self, *args, translation=None, degenerated=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.translation = translation
+        self.degenerated = degenerated
+
+    def translate(self, table=None):
+        if self.translation is not None and table in (None, self.table):
+            return self.translation
+        return super().translate(table=table)
+
+    def degenerate(self, method=None):
+        if self.degenerated is not None:
+            return self.degenerated
+        return super().degenerate(method=method)
+
+
+def prepare_translations(seq_objs, aminoacids=False, degenerate: Optional[str] = None):
+    """Translates or degenerates the sequences of each gene at once.
+
+    Records that cannot be done with the tables (without reading frame or
+    genetic code) are left to ``SeqRecordExpanded``.
+
+    Returns:
+        list of records, ``TranslatedSeqRecord`` for those done, and the
+        list of error messages of their codons that could not be translated.
+    """
+    if not aminoacids and not degenerate:
+        return list(seq_objs), []
+    if not aminoacids and (1, degenerate) not in DEGENERACY_TABLES:
+        return list(seq_objs), []
+
+    groups: Dict[Tuple[str, int, int], List[int]] = OrderedDict()
+    for position, seq_obj in enumerate(seq_objs):
+        if seq_obj.reading_frame not in TRANSLATION_OFFSETS:
+            continue
+        # SeqRecordExpanded degenerates with the standard code
+        genetic_code = seq_obj.table if aminoacids else 1
+        if genetic_code not in unambiguous_dna_by_id:
+            continue
+        key = (seq_obj.gene_code, genetic_code, seq_obj.reading_frame)
+        groups.setdefault(key, []).append(position)
+
+    records = list(seq_objs)
+    errors = []
+    for (_, genetic_code, reading_frame), positions in groups.items():
+        offset = TRANSLATION_OFFSETS[reading_frame]
+        sequences = [str(seq_objs[position].seq)[offset:] for position in positions]
+        if aminoacids:
+            translated, invalid = translate_sequences(sequences, genetic_code)
+            errors += make_translation_errors(seq_objs, positions, sequences, invalid)
+            results = {'translation': translated}
+        else:
+            results = {'degenerated': degenerate_sequences(sequences, genetic_code, degenerate)}
+
+        for index, position in enumerate(positions):
+            seq_obj = seq_objs[position]
+            records[position] = TranslatedSeqRecord(
+                str(seq_obj.seq),
+                voucher_code=seq_obj.voucher_code,
+                taxonomy=seq_obj.taxonomy,
+                lineage=seq_obj.lineage,
+                gene_code=seq_obj.gene_code,
+                reading_frame=seq_obj.reading_frame,
+                table=seq_obj.table,
+                accession_number=seq_obj.accession_number,
+                **{key: value[index] for key, value in results.items()}
+            )
+    return records, errors
+
+
+def make_translation_errors(seq_objs, positions, sequences, invalid) -> List[str]:
+    """One error per sequence, with its first codon that could not be translated."""
+    errors = []
+    reported = set()
+    for row, codon_index in invalid:
+        if row in reported:
+            continue
+        reported.add(row)
+        seq_obj = seq_objs[positions[row]]
+        codon = sequences[row][codon_index * 3:codon_index * 3 + 3]
+        error = TranslationErrorMixedGappedSeq(
+            seq_obj.voucher_code,
+            seq_obj.gene_code,
+            TranslationError(f"Codon '{codon}' is invalid"),
+        )
+        errors.append(str(error))
+    return errors
@@ -6,6 +6,11 @@ app_name = 'create_dataset'
 urlpatterns = [
     path('', views.index, name='index'),
     path('results/', views.generate_results, name='generate-dataset-results'),
+    path('preview/', views.preview, name='dataset-preview'),
+    path('batch/', views.batch, name='dataset-batch'),
     path('results/<dataset_id>/', views.results, name='create-dataset-results'),
+    path('progress/<dataset_id>/', views.progress, name='dataset-progress'),
     path('download/<dataset_id>/', views.serve_file, name='download-dataset-results'),
+    path('download/<dataset_id>/gz/', views.serve_file, {'as_gzip': True},
+         name='download-dataset-results-gz'),
 ]
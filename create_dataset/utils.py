@@ -1,17 +1,29 @@
+import copy
 import logging
 import re
+from collections import OrderedDict
 
 from seqrecord_expanded import SeqRecordExpanded
 from seqrecord_expanded.exceptions import MissingParameterError, TranslationErrorMixedGappedSeq
 from dataset_creator import Dataset
-from typing import Dict
+from typing import Any, Dict
+
+from django.conf import settings
+from django.db.models import Count
 
-from create_dataset.models import Dataset as DatasetModel
 from Bio.Nexus.Nexus import NexusError
 
 from core import exceptions
 from core.utils import get_voucher_codes, get_gene_codes, clean_positions
+from .archive import ARCHIVE_FORMATS, GeneArchiveHandler, is_archive_format
+from .bundle import (
+    MatrixBundleHandler, make_alignment_from_seq_objs, make_partitions, make_taxon_label,
+)
+from .matrix import SequenceMatrix
+from .metrics import JobMetrics
 from .nexus import DatasetHandler
+from .progress import DatasetProgress
+from .translation import prepare_translations
 from public_interface.models import Genes, Sequences, Vouchers
 
 
@@ -25,6 +37,32 @@ LINEAGES = {
     "Hedyloidea": "Eukaryota; Metazoa; Ecdysozoa; Arthropoda; Hexapoda; Insecta; Pterygota; Neoptera; Holometabola; Lepidoptera; Glossata; Ditrysia; ",  # noqa
 }
 
+# options of datasets made from the same sequences by ``create_variant``
+VARIANT_OPTIONS = (
+    'file_format', 'outgroup', 'positions', 'partition_by_positions',
+    'translations', 'aminoacids', 'degen_translations',
+)
+
+# valid values of VARIANT_OPTIONS, for reading the sequences shared by variants
+SHARED_SEQUENCES_OPTIONS = {
+    'file_format': None, 'outgroup': '', 'positions': ['ALL'],
+    'partition_by_positions': 'by gene', 'translations': False,
+    'aminoacids': False, 'degen_translations': None,
+}
+
+LINEAGE_FIELDS = (
+    'superfamily', 'family', 'subfamily', 'tribe', 'subtribe', 'genus',
+    'species', 'subspecies',
+)
+
+
+def make_lineage(voucher: Dict[str, str]) -> str:
+    """Builds lineage string from a dict of the voucher taxonomy fields."""
+    lineage = LINEAGES.get(voucher['superfamily'], '')
+    additional_lineage = ";".join([voucher[field] for field in LINEAGE_FIELDS[1:]])
+    lineage += re.sub(";+", "; ", additional_lineage)
+    return lineage.strip()
+
 
 class CreateDataset(object):
     """Accepts form input to create a dataset in several formats.
@@ -76,10 +114,18 @@ class CreateDataset(object):
         self.gene_codes_metadata = self.get_gene_codes_metadata()
         self.warnings = []
         self.outgroup = cleaned_data['outgroup']
+        self.dataset_handler = None
         self.dataset_file = None
         self.aa_dataset_file = None
         self.charset_block = None
-        self.dataset_str = self.create_dataset()
+        self.lineages = None
+        self.genes_per_voucher = {}
+        self.warnings_before_formatting = None
+        self.errors_before_formatting = None
+        self.metrics = JobMetrics()
+        self.progress = DatasetProgress(dataset_obj_id, metrics=self.metrics)
+        with self.metrics:
+            self.dataset_str = self.create_dataset()
 
     def clean_translations(self):
         if self.cleaned_data['translations']:
@@ -88,9 +134,9 @@ class CreateDataset(object):
             # No need to do degen translation
             self.degen_translations = None
 
-    def create_dataset(self):
+    def has_valid_options(self):
         if not self.codon_positions:
-            return ''
+            return False
 
         error_msg = None
         if self.degen_translations is not None and self.codon_positions != ['ALL']:
@@ -101,87 +147,247 @@ class CreateDataset(object):
             self.errors.append(error_msg)
 
         if error_msg:
+            return False
+        return True
+
+    def create_dataset(self):
+        if not self.has_valid_options():
             return ''
 
         self.voucher_codes = get_voucher_codes(self.cleaned_data)
         self.gene_codes = get_gene_codes(self.cleaned_data)
+        self.voucher_codes = self.prefilter_vouchers_with_few_genes(self.gene_codes)
         self.create_seq_objs()
+        self.set_input_metrics()
         if not self.seq_objs:
             return ''
+        return self.format_dataset()
+
+    def set_input_metrics(self):
+        self.metrics.set_input(
+            vouchers=len(self.voucher_codes),
+            genes=len(self.gene_codes),
+            total_bp=sum(len(seq_obj.seq) for seq_obj in self.seq_objs),
+        )
+
+    def format_dataset(self):
+        """Writes ``self.seq_objs`` in the dataset format.
+
+        Without file format only the sequences are made, to be formatted by
+        ``create_variant``.
+        """
+        if self.file_format is None:
+            return ''
+        self.warnings_before_formatting = list(self.warnings)
+        self.errors_before_formatting = list(self.errors)
+
+        if is_archive_format(self.file_format):
+            return self.format_gene_archive()
+        if self.file_format == 'NPY':
+            return self.format_binary_matrix()
 
         supported_formats = [
             'NEXUS', 'GenBankFASTA', 'FASTA', 'MEGA', 'TNT', 'PHYLIP', 'Bankit'
         ]
         if self.file_format in supported_formats:
-            try:
-                dataset = Dataset(
-                    self.seq_objs,
-                    format=self.file_format,
-                    partitioning=self.partition_by_positions,
-                    codon_positions=self.codon_positions[0],
-                    aminoacids=self.aminoacids,
-                    degenerate=self.degen_translations,
-                    outgroup=self.outgroup,
-                )
-            except (MissingParameterError, ValueError, TranslationErrorMixedGappedSeq) as e:
-                self.errors.append(e)
-                dataset = None
-            except NexusError as e:
-                self.errors.append(e.__str__())
-                dataset = None
-
+            self.progress.start_stage('formatting dataset')
+            dataset = self.make_dataset(self.seq_objs, self.file_format)
             if not dataset:
                 return ""
 
             self.warnings += dataset.warnings
-            dataset_handler = DatasetHandler(dataset.dataset_str, self.file_format)
-            self.dataset_file = dataset_handler.dataset_file
+            self.dataset_handler = DatasetHandler(dataset.dataset_str, self.file_format)
+            self.dataset_file = self.dataset_handler.dataset_file
 
             if self.file_format == 'PHYLIP':
                 self.charset_block = dataset.extra_dataset_str
 
             return dataset.dataset_str
 
+    def make_dataset(self, seq_objs, file_format, error_prefix=''):
+        """Formats the sequences with ``dataset_creator``.
+
+        Translations and degenerated sequences are computed beforehand for
+        each gene, see ``prepare_translations``.
+
+        Returns:
+            ``dataset_creator.Dataset`` or None if there were errors, which
+            are added to ``self.errors``.
+        """
+        seq_objs, translation_errors = prepare_translations(
+            seq_objs, aminoacids=self.aminoacids, degenerate=self.degen_translations,
+        )
+        self.errors += translation_errors
+        try:
+            return Dataset(
+                seq_objs,
+                format=file_format,
+                partitioning=self.partition_by_positions,
+                codon_positions=self.codon_positions[0],
+                aminoacids=self.aminoacids,
+                degenerate=self.degen_translations,
+                outgroup=self.outgroup,
+            )
+        except (MissingParameterError, ValueError, TranslationErrorMixedGappedSeq) as e:
+            self.errors.append(error_prefix + str(e) if error_prefix else e)
+        except NexusError as e:
+            self.errors.append(error_prefix + e.__str__())
+        return None
+
+    def format_gene_archive(self):
+        """Prepares a zip archive with one file per gene.
+
+        Genes are formatted while the archive is written, see
+        ``GeneArchiveHandler``, so there is no dataset string.
+        """
+        self.progress.start_stage('formatting dataset')
+        seq_objs_by_gene = OrderedDict()
+        for seq_obj in self.seq_objs:
+            seq_objs_by_gene.setdefault(seq_obj.gene_code, []).append(seq_obj)
+
+        self.dataset_handler = GeneArchiveHandler(
+            list(seq_objs_by_gene.items()),
+            self.format_gene,
+            self.file_format,
+            progress=self.progress,
+        )
+        self.dataset_file = self.dataset_handler.dataset_file
+        return ''
+
+    def format_binary_matrix(self):
+        """Prepares a binary matrix bundle, see ``MatrixBundleHandler``.
+
+        Sequences are put in the matrix as they are, so there is no dataset
+        string.
+        """
+        if self.aminoacids or self.degen_translations is not None:
+            self.errors.append('Binary matrices can only have nucleotide sequences')
+            return ''
+
+        self.progress.start_stage('formatting dataset')
+        gene_lengths = {
+            gene_code: metadata['length']
+            for gene_code, metadata in self.gene_codes_metadata.items()
+        }
+        matrix = make_alignment_from_seq_objs(self.seq_objs, gene_lengths)
+        codon_positions = self.codon_positions[0]
+        try:
+            partitions = make_partitions(matrix, codon_positions, self.partition_by_positions)
+        except ValueError as e:
+            self.errors.append(e.__str__())
+            return ''
+
+        labels = {}
+        for seq_obj in self.seq_objs:
+            labels.setdefault(seq_obj.voucher_code, make_taxon_label(seq_obj))
+        self.dataset_handler = MatrixBundleHandler(
+            matrix.select_codon_positions(codon_positions),
+            labels,
+            partitions,
+            codon_positions,
+            self.partition_by_positions,
+        )
+        self.dataset_file = self.dataset_handler.dataset_file
+        return ''
+
+    def format_gene(self, gene_code, seq_objs, file_format):
+        dataset = self.make_dataset(seq_objs, file_format, error_prefix=f'{gene_code}: ')
+        if dataset:
+            self.warnings += dataset.warnings
+        return dataset
+
+    def create_aminoacid_dataset(self, dataset_obj_id=None) -> 'CreateDataset':
+        """Returns a copy of this dataset creator with its sequences
+        translated to aminoacids.
+
+        Used for GenBank submissions, which need both nucleotide and
+        aminoacid files. Sequences are not read from the database again.
+        """
+        return self.create_variant({'aminoacids': True}, dataset_obj_id, check_options=False)
+
+    def create_variant(self, options, dataset_obj_id=None, check_options=True) -> 'CreateDataset':
+        """Returns a copy of this dataset creator with other ``VARIANT_OPTIONS``,
+        formatted from the same sequences.
+
+        Options that change which sequences are read (vouchers, genes,
+        taxon names, number of genes...) cannot differ. GenBankFASTA datasets
+        skip sequences with accession numbers, so their variants have to be
+        GenBankFASTA too.
+        """
+        unknown_options = set(options) - set(VARIANT_OPTIONS)
+        if unknown_options:
+            raise ValueError(f'options {sorted(unknown_options)} cannot differ between variants')
+        file_format = options.get('file_format', self.file_format)
+        if (file_format == 'GenBankFASTA') != (self.file_format == 'GenBankFASTA'):
+            raise ValueError('GenBankFASTA datasets are made from other sequences')
+
+        variant = copy.copy(self)
+        variant.cleaned_data = dict(self.cleaned_data, **options)
+        variant.dataset_obj_id = dataset_obj_id
+        variant.metrics = JobMetrics()
+        variant.metrics.input = dict(self.metrics.input)
+        variant.progress = DatasetProgress(dataset_obj_id, metrics=variant.metrics)
+        if self.warnings_before_formatting is None:
+            variant.warnings = list(self.warnings)
+            variant.errors = list(self.errors)
+        else:
+            variant.warnings = list(self.warnings_before_formatting)
+            variant.errors = list(self.errors_before_formatting)
+
+        variant.aminoacids = variant.cleaned_data['aminoacids']
+        variant.file_format = variant.cleaned_data['file_format']
+        variant.partition_by_positions = variant.cleaned_data['partition_by_positions']
+        variant.outgroup = variant.cleaned_data['outgroup']
+        variant.clean_translations()
+        if 'positions' in options:
+            try:
+                variant.codon_positions = clean_positions(variant.cleaned_data['positions'])
+            except exceptions.InadequateCodonPositions as e:
+                variant.codon_positions = None
+                variant.errors.append(e)
+
+        variant.dataset_handler = None
+        variant.dataset_file = None
+        variant.charset_block = None
+        # translation trims the sequences, so they are not shared with this dataset
+        variant.seq_objs = [seq_obj_from_dict(seq_obj_to_dict(i)) for i in self.seq_objs]
+        variant.sequences_skipped = list(self.sequences_skipped)
+
+        variant.dataset_str = ''
+        if check_options and not variant.has_valid_options():
+            return variant
+        if variant.seq_objs:
+            with variant.metrics:
+                variant.dataset_str = variant.format_dataset()
+        return variant
+
     def create_seq_objs(self):
         """Generate a list of SeqRecord-expanded objects"""
+        self.progress.start_stage('loading sequences')
         our_taxon_names = self.get_taxon_names_for_taxa()
-        all_seqs = self.get_all_sequences()
-        try:
-            all_seqs_count = len(self.gene_codes) * len(self.voucher_codes)
-        except Exception:
-            all_seqs_count = '1000+'
+        matrix = self.get_all_sequences()
 
-        idx = 0
+        self.progress.start_stage(
+            'building sequences',
+            total=len(self.gene_codes) * len(self.voucher_codes),
+        )
         counter = {}  # count how many genes each voucher has
         for gene_code in self.gene_codes:
             for voucher_code in self.voucher_codes:
-                if idx % 100 == 0:
-                    if self.dataset_obj_id:
-                        DatasetModel.objects.filter(id=self.dataset_obj_id).update(
-                            progress=f"{idx}/{all_seqs_count}"
-                        )
-                    log.info(f'{idx}/{all_seqs_count} processing dataset')
-                idx += 1
-
-                sequence = all_seqs.filter(code_id=voucher_code, gene__gene_code=gene_code)
-                if not sequence.exists():
-                    seq_obj = self.build_seq_obj(
-                        voucher_code,
-                        gene_code,
-                        accession_number='',
-                        our_taxon_names=our_taxon_names,
-                        all_seqs=all_seqs,
-                    )
+                self.progress.step()
+                cell = matrix.get(voucher_code, gene_code)
+                if cell is None:
+                    accession_number = ''
                 else:
                     counter[voucher_code] = counter.get(voucher_code, 0) + 1
-                    sequence = sequence.first()
-                    seq_obj = self.build_seq_obj(
-                        sequence['code_id'],
-                        sequence['gene__gene_code'],
-                        sequence['accession'],
-                        our_taxon_names,
-                        all_seqs,
-                    )
+                    accession_number = cell.accession
+                seq_obj = self.build_seq_obj(
+                    voucher_code,
+                    gene_code,
+                    accession_number,
+                    our_taxon_names,
+                    matrix,
+                )
 
                 if seq_obj is None:
                     self.warnings += ['Could not find voucher {0}'.format(voucher_code)]
@@ -197,6 +403,7 @@ class CreateDataset(object):
                     })
                 else:
                     self.seq_objs.append(seq_obj)
+        self.genes_per_voucher = counter
         self.remove_vouchers_with_few_genes(counter)
 
     def remove_vouchers_with_few_genes(self, counter: Dict[str, int]) -> None:
@@ -213,20 +420,46 @@ class CreateDataset(object):
         self.seq_objs = clean_seq_objs
         print("")
 
-    def get_all_sequences(self):
-        """Return sequences as dict of lists containing sequence and related data.
+    def prefilter_vouchers_with_few_genes(self, gene_codes):
+        """Drops vouchers with fewer than the minimum number of genes before
+        their sequences are built.
+
+        Genes are counted with one grouped query. Vouchers without any of the
+        genes are kept, as ``remove_vouchers_with_few_genes`` does.
+
+        Returns:
+            tuple of voucher codes to keep.
         """
-        all_seqs = Sequences.objects.filter(
+        if not self.minimum_number_of_genes:
+            return self.voucher_codes
+
+        genes_per_voucher = Sequences.objects.filter(
             code__in=self.voucher_codes,
-            gene__gene_code__in=self.gene_codes,
-        ).values('code_id', 'gene__gene_code', 'sequences', 'accession').order_by('code_id')
-        return all_seqs
+            gene__gene_code__in=gene_codes,
+        ).values('code_id').annotate(
+            number_genes=Count('gene__gene_code', distinct=True),
+        ).filter(
+            number_genes__lt=self.minimum_number_of_genes,
+        ).values_list('code_id', flat=True)
+        vouchers_to_remove = set(genes_per_voucher)
+
+        if vouchers_to_remove:
+            self.warnings.append(
+                f'{len(vouchers_to_remove)} vouchers were discarded because they have '
+                f'fewer than {self.minimum_number_of_genes} genes'
+            )
+        return tuple(code for code in self.voucher_codes if code not in vouchers_to_remove)
+
+    def get_all_sequences(self):
+        """Return sequences for our vouchers and genes as a SequenceMatrix.
+        """
+        return SequenceMatrix(self.voucher_codes, self.gene_codes)
 
-    def build_seq_obj(self, code, gene_code, accession_number, our_taxon_names, all_seqs):
+    def build_seq_obj(self, code, gene_code, accession_number, our_taxon_names, matrix):
         """Builds a SeqRecordExpanded object. If cannot be built, returns None.
 
         """
-        this_voucher_seqs = self.extract_sequence_from_all_seqs_in_db(all_seqs, code, gene_code)
+        this_voucher_seqs = self.extract_sequence_from_all_seqs_in_db(matrix, code, gene_code)
 
         if this_voucher_seqs == '?':
             seq = '?' * self.gene_codes_metadata[gene_code]['length']
@@ -250,38 +483,33 @@ class CreateDataset(object):
             return None
 
     def get_lineage(self, code):
-        voucher = Vouchers.objects.get(code=code)
-        try:
-            lineage = LINEAGES[voucher.superfamily]
-        except KeyError:
-            lineage = ""
-
-        additional_lineage = ";".join([
-            voucher.family, voucher.subfamily, voucher.tribe, voucher.subtribe,
-            voucher.genus, voucher.species, voucher.subspecies,
-        ])
-        lineage += re.sub(";+", "; ", additional_lineage)
-        return lineage.strip()
-
-    def extract_sequence_from_all_seqs_in_db(self, all_seqs, code, gene_code):
-        try:
-            voucher_sequences = all_seqs.filter(code_id=code)
-        except KeyError:
-            self.warnings += [
-                'Could not find sequences for voucher {0} and gene_code {1}'.format(
-                    code, gene_code)]
-            return '?'
+        if self.lineages is None:
+            self.lineages = self.get_lineages()
+        return self.lineages.get(code, '')
 
-        try:
-            this_voucher_seqs = voucher_sequences.filter(
-                gene__gene_code=gene_code,
-            ).first()['sequences']
-        except (AttributeError, KeyError, TypeError):
+    def get_lineages(self):
+        """Returns dict {'CP100-10': 'Eukaryota; Metazoa; ... Aus; aus'}
+
+        The taxonomy of all our vouchers is fetched in one query and each
+        lineage string is built only once per voucher.
+
+        """
+        lineages = dict()
+        vouchers = Vouchers.objects.filter(
+            code__in=self.voucher_codes,
+        ).values('code', *LINEAGE_FIELDS)
+        for voucher in vouchers:
+            lineages[voucher['code']] = make_lineage(voucher)
+        return lineages
+
+    def extract_sequence_from_all_seqs_in_db(self, matrix, code, gene_code):
+        cell = matrix.get(code, gene_code)
+        if cell is None:
             self.warnings += [
                 'Could not find sequences for voucher {0} and gene_code {1}'.format(
                     code, gene_code)]
             return '?'
-        return this_voucher_seqs
+        return cell.sequence
 
     def create_seq_record(self, sequence_str, gene_code):
         """
@@ -337,3 +565,141 @@ class CreateDataset(object):
                 'genetic_code': i['genetic_code'],
             }
         return gene_codes_metadata
+
+
+class PreviewDatasetCreator(CreateDataset):
+    """Creates the dataset for its first vouchers only.
+
+    Used to check options such as outgroup, codon positions and partitions
+    before the whole dataset is queued. The outgroup is kept even if it is
+    not among the first vouchers. Nothing is written to disk.
+    """
+    def __init__(self, cleaned_data, max_taxa=None):
+        if max_taxa is None:
+            max_taxa = settings.DATASET_PREVIEW_TAXA
+        self.max_taxa = max_taxa
+        self.total_vouchers = 0
+        super(PreviewDatasetCreator, self).__init__(cleaned_data)
+
+    def prefilter_vouchers_with_few_genes(self, gene_codes):
+        voucher_codes = super(PreviewDatasetCreator, self).prefilter_vouchers_with_few_genes(
+            gene_codes,
+        )
+        self.total_vouchers = len(voucher_codes)
+        preview_codes = list(voucher_codes[:self.max_taxa])
+        if self.outgroup in voucher_codes and self.outgroup not in preview_codes:
+            preview_codes.append(self.outgroup)
+        return tuple(preview_codes)
+
+    def format_dataset(self):
+        """Per-gene archives are previewed with the file of their first gene.
+        Binary matrices cannot be previewed.
+        """
+        if self.file_format == 'NPY':
+            self.errors.append('Preview is not available for binary matrices')
+            return ''
+        if not is_archive_format(self.file_format):
+            return super(PreviewDatasetCreator, self).format_dataset()
+
+        gene_code = self.seq_objs[0].gene_code
+        seq_objs = [seq_obj for seq_obj in self.seq_objs if seq_obj.gene_code == gene_code]
+        dataset = self.format_gene(gene_code, seq_objs, ARCHIVE_FORMATS[self.file_format])
+        if not dataset:
+            return ''
+        if len(self.gene_codes) > 1:
+            self.warnings.append(
+                f'Preview shows only the file of gene {gene_code}, the archive has one '
+                f'file for each of the {len(self.gene_codes)} genes'
+            )
+        if ARCHIVE_FORMATS[self.file_format] == 'PHYLIP':
+            self.charset_block = dataset.extra_dataset_str
+        return dataset.dataset_str
+
+
+class GeneBlockCreator(CreateDataset):
+    """Builds the SeqRecordExpanded objects of a dataset for some genes only.
+
+    Used by parallel dataset jobs. Each block is built in its own task and
+    the blocks are put together by ``MergedDatasetCreator``, which also
+    formats the dataset.
+    """
+    def __init__(self, cleaned_data, gene_codes, dataset_obj_id=None):
+        self.block_gene_codes = tuple(gene_codes)
+        super(GeneBlockCreator, self).__init__(cleaned_data, dataset_obj_id)
+
+    def create_dataset(self):
+        if self.has_valid_options():
+            self.voucher_codes = get_voucher_codes(self.cleaned_data)
+            # genes are counted over the whole dataset, not only this block
+            self.voucher_codes = self.prefilter_vouchers_with_few_genes(
+                get_gene_codes(self.cleaned_data),
+            )
+            self.gene_codes = self.block_gene_codes
+            self.create_seq_objs()
+            self.set_input_metrics()
+        return ''
+
+    def remove_vouchers_with_few_genes(self, counter: Dict[str, int]) -> None:
+        """Needs the gene counts of all blocks, so it is done when merging."""
+        pass
+
+    def to_block(self) -> Dict[str, Any]:
+        """Returns the block as a dict that can be passed between tasks."""
+        return {
+            'gene_codes': self.block_gene_codes,
+            'seq_objs': [seq_obj_to_dict(seq_obj) for seq_obj in self.seq_objs],
+            'genes_per_voucher': self.genes_per_voucher,
+            'sequences_skipped': self.sequences_skipped,
+            'warnings': self.warnings,
+            'metrics': self.metrics.to_dict(),
+        }
+
+
+class MergedDatasetCreator(CreateDataset):
+    """Creates a dataset from blocks built by ``GeneBlockCreator``."""
+    def __init__(self, cleaned_data, blocks, dataset_obj_id=None):
+        self.blocks = blocks
+        super(MergedDatasetCreator, self).__init__(cleaned_data, dataset_obj_id)
+
+    def create_seq_objs(self):
+        # the blocks are already built
+        self.progress.start_stage(
+            'building sequences', total=len(self.blocks), done=len(self.blocks),
+        )
+        counter = {}
+        # chord results keep the order of the tasks, that is the order of genes
+        for block in self.blocks:
+            self.seq_objs += [seq_obj_from_dict(item) for item in block['seq_objs']]
+            self.sequences_skipped += block['sequences_skipped']
+            self.warnings += block['warnings']
+            for voucher_code, count in block['genes_per_voucher'].items():
+                counter[voucher_code] = counter.get(voucher_code, 0) + count
+        self.metrics.add_gene_blocks([block.get('metrics') for block in self.blocks])
+        self.genes_per_voucher = counter
+        self.remove_vouchers_with_few_genes(counter)
+
+
+def seq_obj_to_dict(seq_obj: SeqRecordExpanded) -> Dict[str, Any]:
+    return {
+        'seq': str(seq_obj.seq),
+        'voucher_code': seq_obj.voucher_code,
+        'taxonomy': seq_obj.taxonomy,
+        'gene_code': seq_obj.gene_code,
+        'reading_frame': seq_obj.reading_frame,
+        'table': seq_obj.table,
+        'lineage': seq_obj.lineage,
+        'accession_number': seq_obj.accession_number,
+    }
+
+
+def seq_obj_from_dict(item: Dict[str, Any]) -> SeqRecordExpanded:
+    return SeqRecordExpanded(
+        item['seq'],
+        voucher_code=item['voucher_code'],
+        taxonomy=item['taxonomy'],
+        gene_code=item['gene_code'],
+        reading_frame=item['reading_frame'],
+        table=item['table'],
+        lineage=item['lineage'],
+        accession_number=item['accession_number'],
+    )
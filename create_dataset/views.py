@@ -1,18 +1,32 @@
+import json
 import logging
+from typing import Dict, List
 
-from celery import chord, group, uuid
+from celery import chain, chord, group, uuid
 from celery.result import AsyncResult
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import HttpResponseRedirect, Http404
-from django.http import HttpResponse
+from django.http import JsonResponse
 from django.urls import reverse
+from django.views.decorators.http import require_POST
 
 from core.utils import get_context
-from public_interface.tasks import log_email_error, notify_user
+from public_interface.tasks import log_email_error, notify_user_of_batch
+from .cache import get_cached_dataset, make_cache_key
+from .downloads import make_download_response
 from .forms import CreateDatasetForm
+from .progress import DatasetProgress, get_progress
+from .singleflight import (
+    attach_user, get_in_flight_dataset, single_flight_lock, start_flight,
+)
 from create_dataset.models import Dataset
-from .tasks import create_dataset
+from .utils import VARIANT_OPTIONS, PreviewDatasetCreator
+from .tasks import (
+    create_dataset_batch, forget_flight, make_dataset_job, make_genbank_job,
+    notify_attached_users,
+)
 
 
 log = logging.getLogger(__name__)
@@ -45,6 +59,87 @@ def generate_results(request):
             return render(request, 'create_dataset/index.html', context)
 
 
+@login_required
+@require_POST
+def preview(request):
+    """Dataset for the first vouchers only, created while the user waits."""
+    form = CreateDatasetForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'form_errors': form.errors}, status=400)
+
+    dataset_creator = PreviewDatasetCreator(form.cleaned_data)
+    data = {
+        'dataset': dataset_creator.dataset_str or '',
+        'charset_block': dataset_creator.charset_block,
+        'number_taxa': len(dataset_creator.voucher_codes),
+        'total_taxa': dataset_creator.total_vouchers,
+        'errors': [str(error) for error in dataset_creator.errors],
+        'warnings': sorted(set(dataset_creator.warnings)),
+    }
+    return JsonResponse(data)
+
+
+@login_required
+@require_POST
+def batch(request):
+    """Schedules several datasets of the same vouchers and genes.
+
+    The body is a JSON object with the fields of the dataset form that are
+    common to all datasets, and ``variants``, a list of objects with the
+    fields that differ between them (see ``VARIANT_OPTIONS``). Sequences
+    are read once for all datasets.
+    """
+    try:
+        data = json.loads(request.body)
+        variants = data.pop('variants')
+    except (ValueError, KeyError, AttributeError):
+        return JsonResponse({'error': 'expected a JSON object with variants'}, status=400)
+    if not isinstance(variants, list) or not variants:
+        return JsonResponse({'error': 'variants should be a non empty list'}, status=400)
+    if len(variants) > settings.DATASET_BATCH_MAX_VARIANTS:
+        return JsonResponse(
+            {'error': f'at most {settings.DATASET_BATCH_MAX_VARIANTS} variants are allowed'},
+            status=400,
+        )
+
+    form_errors = {}
+    cleaned_data_list = []
+    for index, variant in enumerate(variants):
+        errors = validate_variant(data, variant)
+        form = CreateDatasetForm(dict(data, **variant))
+        if not errors and form.is_valid():
+            cleaned_data_list.append(form.cleaned_data)
+        else:
+            form_errors[index] = errors or form.errors
+    if form_errors:
+        return JsonResponse({'form_errors': form_errors}, status=400)
+
+    dataset_ids = schedule_dataset_batch(cleaned_data_list, request.user)
+    data = {
+        'datasets': [
+            {
+                'id': dataset_id,
+                'results_url': reverse('create-dataset-results', kwargs={'dataset_id': dataset_id}),
+            }
+            for dataset_id in dataset_ids
+        ],
+    }
+    return JsonResponse(data, status=202)
+
+
+def validate_variant(data, variant) -> Dict[str, List[str]]:
+    if not isinstance(variant, dict):
+        return {'__all__': ['variants should be JSON objects']}
+    errors = {}
+    for option in variant:
+        if option not in VARIANT_OPTIONS:
+            errors[option] = ['cannot differ between variants']
+    file_format = variant.get('file_format', data.get('file_format'))
+    if file_format in ('Bankit', 'GenBankFASTA'):
+        errors['file_format'] = [f'{file_format} datasets cannot be made in batches']
+    return errors
+
+
 @login_required
 def results(request, dataset_id):
     context = get_context(request)
@@ -71,6 +166,7 @@ def results(request, dataset_id):
             task_results = AsyncResult(aa_dataset.task_uuid)
             context['task_status'] = task_results.state
         context['aa_dataset'] = aa_dataset
+        context['progress'] = get_progress(nucleotide_dataset.id)
         context['nucleotide_dataset'] = nucleotide_dataset
         return render(request, 'create_dataset/results_bankit.html', context)
     else:
@@ -79,11 +175,30 @@ def results(request, dataset_id):
             task_results = AsyncResult(nucleotide_dataset.task_uuid)
             context['task_status'] = task_results.state
         context['dataset'] = nucleotide_dataset
+        context['progress'] = get_progress(nucleotide_dataset.id)
         return render(request, 'create_dataset/results.html', context)
 
 
 @login_required
-def serve_file(request, dataset_id):
+def progress(request, dataset_id):
+    """Progress of a dataset job as JSON, for polling from the results page."""
+    try:
+        dataset = Dataset.objects.get(id=dataset_id)
+    except Dataset.DoesNotExist:
+        raise Http404(f'such dataset {dataset_id} does not exist')
+
+    data = {
+        'completed': dataset.completed is not None,
+        'task_status': AsyncResult(dataset.task_uuid).state if dataset.task_uuid else '',
+        # aminoacid datasets of GenBank submissions are made by the job of
+        # their nucleotide dataset
+        'progress': get_progress(dataset.sister_dataset_id or dataset.id),
+    }
+    return JsonResponse(data)
+
+
+@login_required
+def serve_file(request, dataset_id, as_gzip=False):
     # final_name = guess_file_extension(file_name)
     final_name = f'dataset_{dataset_id}.txt'
     try:
@@ -92,15 +207,86 @@ def serve_file(request, dataset_id):
         raise Http404(f'such dataset {dataset_id} does not exist')
 
     if dataset.completed:
-        response = HttpResponse(dataset.content, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename={}'.format(final_name)
-        return response
+        return make_download_response(request, dataset, final_name, as_gzip=as_gzip)
     else:
         context = {'dataset_job_id': dataset_id}
         return render(request, 'create_dataset/results.html', context)
 
 
 def schedule_dataset(cleaned_data, user) -> int:
+    cache_key = make_cache_key(cleaned_data)
+    cached_dataset = get_cached_dataset(cache_key)
+    if cached_dataset:
+        return cached_dataset.id
+
+    # identical requests get the dataset that is already being created
+    with single_flight_lock(cache_key):
+        dataset_id = get_in_flight_dataset(cache_key)
+        if dataset_id is not None:
+            attach_user(cache_key, user.id)
+            return dataset_id
+        return start_dataset_job(cleaned_data, user, cache_key)
+
+
+def schedule_dataset_batch(cleaned_data_list, user) -> List[int]:
+    """Schedules one job for datasets that differ only in ``VARIANT_OPTIONS``.
+
+    Datasets found in the cache are not made again. Returns the ids of the
+    datasets, in the order of ``cleaned_data_list``.
+    """
+    dataset_ids = []
+    variants = []
+    task_id = uuid()
+    for cleaned_data in cleaned_data_list:
+        cache_key = make_cache_key(cleaned_data)
+        cached_dataset = get_cached_dataset(cache_key)
+        if cached_dataset:
+            dataset_ids.append(cached_dataset.id)
+            continue
+        dataset_obj = Dataset.objects.create(
+            user=user,
+            task_uuid=task_id,
+            cache_key=cache_key,
+        )
+        DatasetProgress(dataset_obj.id).start_stage('queued')
+        dataset_ids.append(dataset_obj.id)
+        variants.append((
+            dataset_obj.id,
+            {option: cleaned_data[option] for option in VARIANT_OPTIONS},
+        ))
+
+    if not variants:
+        return dataset_ids
+
+    cleaned_data = cleaned_data_list[0]
+    if cleaned_data['taxonset']:
+        taxonset_id = cleaned_data['taxonset'].id
+    else:
+        taxonset_id = None
+
+    if cleaned_data['geneset']:
+        geneset_id = cleaned_data['geneset'].id
+    else:
+        geneset_id = None
+
+    job = create_dataset_batch.si(
+        taxonset_id,
+        geneset_id,
+        list(cleaned_data['gene_codes'].values_list('id', flat=True)),
+        cleaned_data['voucher_codes'],
+        cleaned_data['special'],
+        cleaned_data['taxon_names'],
+        cleaned_data['number_genes'],
+        cleaned_data['introns'],
+        [variant for _, variant in variants],
+        [dataset_id for dataset_id, _ in variants],
+    ).on_error(log_email_error.s(user.id))
+    tasks = chain(job, notify_user_of_batch.si(dataset_ids, user.id))
+    tasks.apply_async(task_id=task_id)
+    return dataset_ids
+
+
+def start_dataset_job(cleaned_data, user, cache_key) -> int:
     if cleaned_data['taxonset']:
         taxonset_id = cleaned_data['taxonset'].id
     else:
@@ -126,68 +312,69 @@ def schedule_dataset(cleaned_data, user) -> int:
     introns = cleaned_data['introns']
 
     task_id = uuid()
+    # the dataset whose id is returned to the user is the one to cache
     nucleotide_dataset_obj = Dataset.objects.create(
-        user=user, task_uuid=task_id
+        user=user,
+        task_uuid=task_id,
+        cache_key=cache_key if file_format != "Bankit" else None,
     )
     if file_format == "Bankit":
         aa_dataset_obj = Dataset.objects.create(
             user=user,
             sister_dataset_id=nucleotide_dataset_obj.id,
             task_uuid=task_id,
+            cache_key=cache_key,
         )
 
-    dataset_tasks = [
-        create_dataset.si(
-            taxonset_id,
-            geneset_id,
-            gene_codes_ids,
-            voucher_codes,
-            file_format,
-            outgroup,
-            positions,
-            partition_by_positions,
-            translations,
-            aminoacids,
-            degen_translations,
-            special,
-            taxon_names,
-            number_genes,
-            introns,
-            nucleotide_dataset_obj.id,
-        ).on_error(log_email_error.s(user.id)),
-    ]
+    DatasetProgress(nucleotide_dataset_obj.id).start_stage('queued')
     if file_format == "Bankit":
-        dataset_tasks.append(
-            create_dataset.si(
-                taxonset_id,
-                geneset_id,
-                gene_codes_ids,
-                voucher_codes,
-                file_format,
-                outgroup,
-                positions,
-                partition_by_positions,
-                translations,
-                True,
-                degen_translations,
-                special,
-                taxon_names,
-                number_genes,
-                introns,
-                aa_dataset_obj.id,
-            ).on_error(log_email_error.s(user.id)),
-        )
-        tasks = chord(
-            header=group(dataset_tasks),
-            body=notify_user.si(nucleotide_dataset_obj.id, user.id)
+        DatasetProgress(aa_dataset_obj.id).start_stage('queued')
+
+    dataset_args = (
+        taxonset_id,
+        geneset_id,
+        gene_codes_ids,
+        voucher_codes,
+        file_format,
+        outgroup,
+        positions,
+        partition_by_positions,
+        translations,
+        aminoacids,
+        degen_translations,
+        special,
+        taxon_names,
+        number_genes,
+        introns,
+    )
+    if file_format == "Bankit":
+        # both datasets are made from the same sequences by one task
+        dataset_tasks = [
+            make_genbank_job(
+                *dataset_args, nucleotide_dataset_obj.id, aa_dataset_obj.id,
+            ).on_error(log_email_error.s(user.id)).on_error(forget_flight.si(cache_key)),
+        ]
+        dataset_id = aa_dataset_obj.id
+    else:
+        dataset_tasks = [
+            make_dataset_job(
+                *dataset_args, nucleotide_dataset_obj.id,
+            ).on_error(log_email_error.s(user.id)).on_error(forget_flight.si(cache_key)),
+        ]
+        dataset_id = nucleotide_dataset_obj.id
+
+    if any(task.task == 'celery.chord' for task in dataset_tasks):
+        # a chord inside the header of another chord is not supported by
+        # every result backend, so parallel jobs are run one after another
+        tasks = chain(
+            *dataset_tasks, notify_attached_users.si(nucleotide_dataset_obj.id, cache_key),
         )
-        tasks.apply_async(task_id=task_id)
-        return aa_dataset_obj.id
     else:
         tasks = chord(
             header=group(dataset_tasks),
-            body=notify_user.si(nucleotide_dataset_obj.id, user.id)
+            body=notify_attached_users.si(nucleotide_dataset_obj.id, cache_key)
         )
 
+    start_flight(cache_key, dataset_id, user.id)
     tasks.apply_async(task_id=task_id)
-    return nucleotide_dataset_obj.id
+    return dataset_id
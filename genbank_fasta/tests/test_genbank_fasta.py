@@ -1,3 +1,4 @@
+import gzip
 import re
 from unittest import skip
 
@@ -6,6 +7,9 @@ from django.contrib.auth.models import User
 from django.db import connection
 from django.test import TestCase, Client
 from django.conf import settings
+from django.utils import timezone
+
+from create_dataset.models import Dataset
 
 
 class TestGenBankFasta(TestCase):
@@ -104,3 +108,27 @@ class TestGenBankFasta(TestCase):
     def test_results_get(self):
         c = self.client.get('/genbank_fasta/results/')
         self.assertEqual(302, c.status_code)
+
+    def test_serve_file(self):
+        nucleotide_dataset = Dataset.objects.create(
+            content='>CP100_10\nACGT\n', completed=timezone.now(),
+        )
+        aa_dataset = Dataset.objects.create(
+            content='>CP100_10\nT\n', completed=timezone.now(),
+            sister_dataset_id=nucleotide_dataset.id,
+        )
+        self.client.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+
+        c = self.client.get(f'/genbank_fasta/download/{nucleotide_dataset.id}/')
+        self.assertEqual(b'>CP100_10\nACGT\n', c.content)
+        self.assertIn('voseq_genbank.fasta', c['Content-Disposition'])
+
+        c = self.client.get(f'/genbank_fasta/download/{aa_dataset.id}/gz/')
+        self.assertEqual(b'>CP100_10\nT\n', gzip.decompress(c.content))
+        self.assertIn('voseq_genbank_aa.fasta.gz', c['Content-Disposition'])
+
+    def test_serve_file__not_completed(self):
+        dataset = Dataset.objects.create()
+        self.client.post('/accounts/login/', {'username': 'admin', 'password': 'pass'})
+        c = self.client.get(f'/genbank_fasta/download/{dataset.id}/')
+        self.assertEqual(404, c.status_code)
@@ -9,4 +9,6 @@ urlpatterns = [
     path('results/', views.generate_results, name='generate-genbank-fasta-results'),
     path('results/<dataset_id>/', views.results, name='create-genbank-results'),
     path('download/<dataset_id>/', views.serve_file, name='download-genbank-fasta-results'),
+    path('download/<dataset_id>/gz/', views.serve_file, {'as_gzip': True},
+         name='download-genbank-fasta-results-gz'),
 ]
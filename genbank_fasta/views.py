@@ -1,17 +1,16 @@
 import logging
-import os
 
-from celery import chord, chain, uuid
+from celery import chain, uuid
 from celery.result import AsyncResult
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import HttpResponseRedirect, Http404
-from django.http import HttpResponse
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
-from create_dataset.tasks import create_dataset
+from create_dataset.downloads import make_download_response
+from create_dataset.tasks import make_genbank_job
 from core.utils import get_context
 from create_dataset.models import Dataset
 from public_interface.tasks import log_email_error, notify_user
@@ -84,47 +83,29 @@ def schedule_genbank_fasta(cleaned_data, user) -> int:
         sister_dataset_id=nucleotide_dataset_obj.id,
         task_uuid=task_id,
     )
-    dataset_tasks = chain(
-        create_dataset.si(
-            taxonset_id,
-            geneset_id,
-            gene_codes_ids,
-            voucher_codes,
-            file_format,
-            outgroup,
-            positions,
-            partition_by_positions,
-            translations,
-            aminoacids,
-            degen_translations,
-            special,
-            taxon_names,
-            number_genes,
-            introns,
-            nucleotide_dataset_obj.id,
-        ).on_error(log_email_error.s(user.id)),
-        create_dataset.si(
-            taxonset_id,
-            geneset_id,
-            gene_codes_ids,
-            voucher_codes,
-            file_format,
-            outgroup,
-            positions,
-            partition_by_positions,
-            translations,
-            True,
-            degen_translations,
-            special,
-            taxon_names,
-            number_genes,
-            introns,
-            aa_dataset_obj.id,
-        ).on_error(log_email_error.s(user.id)),
-    )
-    tasks = chord(
-        header=dataset_tasks,
-        body=notify_user.si(aa_dataset_obj.id, user.id)
+    # both datasets are made from the same sequences by one task
+    dataset_job = make_genbank_job(
+        taxonset_id,
+        geneset_id,
+        gene_codes_ids,
+        voucher_codes,
+        file_format,
+        outgroup,
+        positions,
+        partition_by_positions,
+        translations,
+        aminoacids,
+        degen_translations,
+        special,
+        taxon_names,
+        number_genes,
+        introns,
+        nucleotide_dataset_obj.id,
+        aa_dataset_obj.id,
+    ).on_error(log_email_error.s(user.id))
+    tasks = chain(
+        dataset_job,
+        notify_user.si(aa_dataset_obj.id, user.id),
     )
     tasks.apply_async(task_id=task_id)
     return aa_dataset_obj.id
@@ -159,18 +140,15 @@ def results(request, dataset_id):
 
 
 @login_required
-def serve_file(request, file_name):
+def serve_file(request, dataset_id, as_gzip=False):
     log.debug("Requested file by user: {0}".format(request.user))
-    cwd = os.path.dirname(__file__)
-    fasta_file = os.path.join(cwd,
-                              '..',
-                              'create_dataset',
-                              'dataset_files',
-                              file_name,
-                              )
-    response = HttpResponse(open(fasta_file, 'r').read(), content_type='application/text')
-    response['Content-Disposition'] = 'attachment; filename=voseq_genbank.fasta'
-
-    if os.path.isfile(fasta_file):
-        os.remove(fasta_file)
-    return response
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, completed__isnull=False)
+    except Dataset.DoesNotExist:
+        raise Http404(f'such dataset {dataset_id} does not exist')
+
+    if dataset.sister_dataset_id:
+        file_name = 'voseq_genbank_aa.fasta'
+    else:
+        file_name = 'voseq_genbank.fasta'
+    return make_download_response(request, dataset, file_name, as_gzip=as_gzip)
@@ -0,0 +1,135 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from public_interface.models import Genes, Sequences, Vouchers
+
+
+FAMILIES = {
+    'Nymphalidae': ['Melitaea', 'Junonia', 'Heliconius', 'Danaus'],
+    'Pieridae': ['Pieris', 'Colias', 'Anthocharis'],
+    'Lycaenidae': ['Lycaena', 'Polyommatus'],
+}
+SPECIES = ['diamina', 'athalia', 'orbifer', 'coenia', 'erato', 'plexippus', 'rapae']
+AMBIGUOUS_BASES = 'NRYKMSW?-'
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with synthetic vouchers, genes and sequences, ' \
+           'to measure how dataset creation scales. Missing sequences, ' \
+           'accession numbers and ambiguous bases are added at random.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vouchers', type=int, default=100)
+        parser.add_argument('--genes', type=int, default=10)
+        parser.add_argument('--prefix', default='SYN',
+                            help='Prefix of the voucher and gene codes.')
+        parser.add_argument('--missing', type=float, default=0.1,
+                            help='Fraction of missing sequences.')
+        parser.add_argument('--accessions', type=float, default=0.2,
+                            help='Fraction of sequences with accession number.')
+        parser.add_argument('--ambiguous', type=float, default=0.01,
+                            help='Fraction of ambiguous bases in sequences.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete synthetic data with this prefix and exit.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if not prefix:
+            raise CommandError('A prefix is needed to tell synthetic data apart.')
+
+        self.clear(prefix)
+        if options['clear']:
+            return
+
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            genes = self.create_genes(prefix, options['genes'])
+            voucher_codes = self.create_vouchers(prefix, options['vouchers'])
+            count = self.create_sequences(
+                voucher_codes, genes, options['missing'], options['accessions'],
+                options['ambiguous'],
+            )
+        if options['verbosity'] > 0:
+            self.stdout.write(
+                f'Created {len(voucher_codes)} vouchers, {len(genes)} genes and '
+                f'{count} sequences'
+            )
+
+    def clear(self, prefix):
+        Sequences.objects.filter(code__code__startswith=prefix + '-').delete()
+        Vouchers.objects.filter(code__startswith=prefix + '-').delete()
+        Genes.objects.filter(gene_code__startswith=prefix + '_').delete()
+
+    def create_genes(self, prefix, number_genes):
+        genes = []
+        for index in range(number_genes):
+            genes.append(Genes(
+                gene_code=f'{prefix}_gene{index + 1:03d}',
+                genetic_code=self.random.choice([1, 5]),
+                length=self.random.randrange(300, 1500, 3),
+                reading_frame=self.random.choice([1, 2, 3]),
+                description='Synthetic gene',
+                aligned='yes',
+                prot_code='yes',
+                gene_type='nuclear',
+            ))
+        Genes.objects.bulk_create(genes, batch_size=self.batch_size)
+        return list(Genes.objects.filter(gene_code__startswith=prefix + '_').order_by('gene_code'))
+
+    def create_vouchers(self, prefix, number_vouchers):
+        vouchers = []
+        for index in range(number_vouchers):
+            family = self.random.choice(list(FAMILIES))
+            vouchers.append(Vouchers(
+                code=f'{prefix}-{index + 1:06d}',
+                orden='Lepidoptera',
+                superfamily='Papilionoidea',
+                family=family,
+                genus=self.random.choice(FAMILIES[family]),
+                species=self.random.choice(SPECIES),
+                country='Finland',
+                type_species=Vouchers.DONT_KNOW,
+            ))
+        Vouchers.objects.bulk_create(vouchers, batch_size=self.batch_size)
+        return [voucher.code for voucher in vouchers]
+
+    def create_sequences(self, voucher_codes, genes, missing, accessions, ambiguous):
+        count = 0
+        batch = []
+        for voucher_code in voucher_codes:
+            for gene in genes:
+                if self.random.random() < missing:
+                    continue
+                sequence = self.make_sequence(gene.length, ambiguous)
+                accession = ''
+                if self.random.random() < accessions:
+                    accession = f'SY{self.random.randrange(100000, 999999)}'
+                # bulk_create does not call Sequences.save(), so counts are set here
+                batch.append(Sequences(
+                    code_id=voucher_code,
+                    gene=gene,
+                    sequences=sequence,
+                    accession=accession,
+                    total_number_bp=len(sequence),
+                    number_ambiguous_bp=sum(sequence.count(base) for base in '?-Nn'),
+                ))
+                if len(batch) >= self.batch_size:
+                    Sequences.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+        Sequences.objects.bulk_create(batch)
+        return count + len(batch)
+
+    def make_sequence(self, length, ambiguous):
+        # some sequences are shorter than the gene and will be padded
+        if self.random.random() < 0.2:
+            length = self.random.randint(length // 2, length)
+        bases = self.random.choices('ACGT', k=length)
+        for index in self.random.sample(range(length), int(length * ambiguous)):
+            bases[index] = self.random.choice(AMBIGUOUS_BASES)
+        return ''.join(bases)
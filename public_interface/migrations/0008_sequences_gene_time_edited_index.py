@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('public_interface', '0007_alter_sequences_genbank'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sequences',
+            index=models.Index(fields=['gene', 'time_edited'], name='public_inte_gene_id_469fa4_idx'),
+        ),
+    ]
@@ -277,6 +277,10 @@ class Sequences(models.Model):
     class Meta:
         verbose_name_plural = 'Sequences'
         app_label = 'public_interface'
+        indexes = [
+            # latest edit of the sequences of a gene, see BLAST.make_manifest
+            models.Index(fields=['gene', 'time_edited']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.gene:
@@ -51,4 +51,33 @@ def notify_user(dataset_obj_id, user_id) -> None:
             log.debug("sent dataset status email to " + str(to_emails))
     else:
         log.debug('Cannot send notification email. '
-                  'No user / email assigned to job ' + str(dataset_obj_id))
\ No newline at end of file
+                  'No user / email assigned to job ' + str(dataset_obj_id))
+
+
+@app.task
+def notify_user_of_batch(dataset_obj_ids, user_id) -> None:
+    """Send one email notification for all datasets of a batch."""
+    user = User.objects.get(id=user_id)
+    log.debug(f"notify_user_of_batch {dataset_obj_ids}")
+
+    subject = f"Dataset batch completed - {len(dataset_obj_ids)} datasets"
+    result_urls = [
+        "http://voseq.com" + reverse('create-dataset-results', kwargs={'dataset_id': dataset_obj_id})
+        for dataset_obj_id in dataset_obj_ids
+    ]
+    content = "Your datasets have successfully completed. " \
+              "Please verify and download the results from:\n\n" + \
+              "\n".join(result_urls)
+    from_email = 'noreply@voseq.com'
+
+    if user and user.email:
+        to_emails = [user.email] + [email for name, email in settings.ADMINS]
+        try:
+            send_mail(subject, content, from_email, to_emails)
+        except SMTPException:
+            log.exception("Failed to notify_user_of_batch for datasets " + str(dataset_obj_ids))
+        else:
+            log.debug("sent dataset batch status email to " + str(to_emails))
+    else:
+        log.debug('Cannot send notification email. '
+                  'No user / email assigned to datasets ' + str(dataset_obj_ids))
@@ -0,0 +1,33 @@
+from django.core.management import call_command
+from django.test import TestCase
+
+from public_interface.models import Genes, Sequences, Vouchers
+
+
+class TestCreateSyntheticDb(TestCase):
+    def test_create_synthetic_db(self):
+        call_command('create_synthetic_db', vouchers=20, genes=3, missing=0.2,
+                     accessions=0.5, ambiguous=0.05, verbosity=0)
+        self.assertEqual(20, Vouchers.objects.filter(code__startswith='SYN-').count())
+        self.assertEqual(3, Genes.objects.filter(gene_code__startswith='SYN_').count())
+
+        sequences = Sequences.objects.filter(code__code__startswith='SYN-')
+        self.assertLess(sequences.count(), 60)
+        self.assertTrue(sequences.exclude(accession='').exists())
+        self.assertTrue(sequences.filter(number_ambiguous_bp__gt=0).exists())
+        for sequence in sequences:
+            self.assertEqual(len(sequence.sequences), sequence.total_number_bp)
+            self.assertLessEqual(sequence.total_number_bp, sequence.gene.length)
+
+    def test_create_synthetic_db__same_seed(self):
+        call_command('create_synthetic_db', vouchers=5, genes=2, verbosity=0)
+        first = list(Sequences.objects.order_by('code', 'gene__gene_code').values_list('sequences', flat=True))
+        call_command('create_synthetic_db', vouchers=5, genes=2, verbosity=0)
+        second = list(Sequences.objects.order_by('code', 'gene__gene_code').values_list('sequences', flat=True))
+        self.assertEqual(first, second)
+
+    def test_create_synthetic_db__clear(self):
+        call_command('create_synthetic_db', vouchers=5, genes=2, verbosity=0)
+        call_command('create_synthetic_db', clear=True, verbosity=0)
+        self.assertFalse(Vouchers.objects.filter(code__startswith='SYN-').exists())
+        self.assertFalse(Genes.objects.filter(gene_code__startswith='SYN_').exists())
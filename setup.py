@@ -12,6 +12,7 @@ version = voseq.__version__
 requirements = [
     'amas==0.2',
     'biopython==1.83',
+    'numpy',
     'Django==5.0.3'
     'Pillow==10.3.0',
     'pyprind==2.9.3',
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/1.7/ref/settings/
 import os
 import platform
 
+from celery.schedules import crontab
 from kombu import Exchange, Queue
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -314,6 +315,14 @@ else:
 BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 
+# shared by the web and celery processes, used to publish progress of jobs
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
+    }
+}
+
 default_exchange = Exchange('default', type='direct')
 CELERY_QUEUES = (
     Queue('default', default_exchange, routing_key='default'),
@@ -322,4 +331,66 @@ CELERY_DEFAULT_QUEUE = 'default'
 CELERY_DEFAULT_EXCHANGE = 'default'
 CELERY_DEFAULT_ROUTING_KEY = 'default'
 
+CELERYBEAT_SCHEDULE = {
+    'expire-datasets': {
+        'task': 'create_dataset.tasks.expire_datasets',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'rebuild-blast-databases': {
+        'task': 'blast_local.tasks.rebuild_blast_databases',
+        'schedule': crontab(minute='*/30'),
+    },
+}
+
 ASYNC_MODE = True
+
+# Finished datasets are written to this folder and served from it
+DATASET_FILES_ROOT = os.path.join(BASE_DIR, '..', 'create_dataset', 'dataset_files')
+
+# Total size in bytes of finished datasets kept for reuse by identical requests
+DATASET_CACHE_MAX_SIZE = 500 * 1024 * 1024
+
+# Datasets with more genes than this are built by parallel tasks, one per
+# batch of genes
+DATASET_GENES_PER_TASK = 5
+
+# Jobs with more genes than DATASET_GENES_PER_TASK, and parallel tasks, build
+# them in blocks of this many genes, kept as checkpoints. Tasks that reach their
+# soft time limit after saving a block are queued again, at most
+# DATASET_MAX_CONTINUATIONS times, and skip the genes already built. Smaller
+# datasets are built in one pass, which is faster.
+DATASET_CHECKPOINT_GENES = 2
+DATASET_MAX_CONTINUATIONS = 3
+
+# Number of vouchers in dataset previews
+DATASET_PREVIEW_TAXA = 20
+
+# Most datasets that can be requested in one batch
+DATASET_BATCH_MAX_VARIANTS = 50
+
+# Seconds between an edit of sequences and the rebuild of the BLAST databases
+# of their genes, edits made meanwhile are rebuilt together
+BLAST_DB_REBUILD_DELAY = 60
+
+# Seconds during which results of blasts against NCBI are shown again for the
+# same query sequence
+BLAST_NCBI_RESULTS_MAX_AGE = 7 * 24 * 60 * 60
+
+# Threads of each local blastn, batch blasts of many vouchers use them best
+BLAST_NUM_THREADS = 2
+
+# Threads formatting genes of per-gene archives while earlier genes are
+# compressed. 1 formats them in the job's thread.
+DATASET_ARCHIVE_WORKERS = 1
+
+# Trace Python memory of dataset jobs with tracemalloc. It is slow, so only
+# the peak resident memory of the worker is recorded by default
+DATASET_TRACE_MEMORY = False
+
+# Datasets are deleted when they are older than this, or when nobody
+# downloaded them for DATASET_IDLE_DAYS. If files of all datasets take more
+# than DATASET_STORAGE_MAX_SIZE bytes, the least recently used are deleted.
+DATASET_MAX_AGE_DAYS = 90
+DATASET_IDLE_DAYS = 30
+DATASET_STORAGE_MAX_SIZE = 5 * 1024 * 1024 * 1024
+DATASET_RETENTION_BATCH_SIZE = 500
@@ -11,6 +11,12 @@ TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
 DB_NAME = "test"
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 HAYSTACK_CONNECTIONS = {
     'default': {
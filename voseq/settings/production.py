@@ -8,3 +8,6 @@ DEBUG = False
 DATABASES['default']['HOST'] = 'db'
 DATABASES['default']['USER'] = 'postgres'
 DATABASES['default']['NAME'] = get_secret('DB_NAME')
+
+# on the volume shared by the app and celery containers
+DATASET_FILES_ROOT = '/data/dataset_files'